@@ -45,7 +45,8 @@ cycles_exists = False
 
 def check_cycles_exists():
     global cycles_exists
-    cycles_exists = ('cycles' in dir(bpy.types.Scene))    return cycles_exists
+    cycles_exists = ('cycles' in dir(bpy.types.Scene))
+    return cycles_exists
 
 
 check_cycles_exists()
@@ -104,6 +105,48 @@ class AmaranthToolsetPreferences(AddonPreferences):
             default=True,
             )
 
+    use_render_log = BoolProperty(
+            name="Render Log",
+            description="Log the time and memory of every rendered frame",
+            default=True,
+            )
+
+    render_log_path = StringProperty(
+            name="Render Log File",
+            description="JSON Lines file the renders are logged to, "
+                        "leave empty to use the Blender config folder",
+            subtype='FILE_PATH',
+            default="",
+            )
+
+    render_queue_path = StringProperty(
+            name="Render Queue Folder",
+            description="Spool folder of the local render queue, "
+                        "leave empty to use the temporary folder",
+            subtype='DIR_PATH',
+            default="",
+            )
+
+    render_queue_threads = IntProperty(
+            name="Threads",
+            description="Threads the render queue uses at most, "
+                        "0 for all the CPU cores",
+            default=0, min=0, max=1024,
+            )
+
+    render_memory_limit = FloatProperty(
+            name="Render Node Memory (GB)",
+            description="Warn when the memory estimated for a render, shown "
+                        "under Dimensions, goes over this. 0 to not warn",
+            default=0.0, min=0.0,
+            )
+
+    render_queue_memory = FloatProperty(
+            name="Memory (GB)",
+            description="Memory the jobs rendering at once can add up to, "
+                        "0 for no limit",
+            default=0.0, min=0.0,
+            )
 
     def draw(self, context):
         layout = self.layout
@@ -128,6 +171,7 @@ class AmaranthToolsetPreferences(AddonPreferences):
         sub.prop(self, "use_scene_stats")
         sub.prop(self, "use_layers_for_render")
         sub.prop(self, "use_framerate")
+        sub.prop(self, "use_render_log")
 
         sub.separator()
 
@@ -153,13 +197,23 @@ class AmaranthToolsetPreferences(AddonPreferences):
             text="Display extra statistics for Scenes, Cameras, and Meshlights (Cycles)")
         sub.label(text="Save the set of layers that should be activated for a final render")
         sub.label(text="Jump the amount of frames forward/backward that you've set as your framerate")
-        
+        sub.prop(self, "render_log_path", text="")
+
         sub.separator()
         sub.label(text="") # Nodes
         sub.label(
             text="When selecting an Image node, display it on the Image editor "
                  "(if any)")
 
+        layout.separator()
+        row = layout.row()
+        row.label(text="Render Queue", icon="SEQ_SEQUENCER")
+        row.prop(self, "render_queue_path", text="")
+        row.prop(self, "render_queue_threads")
+        row.prop(self, "render_queue_memory")
+
+        layout.prop(self, "render_memory_limit")
+
 # Properties
 def init_properties():
 
@@ -173,6 +227,116 @@ def init_properties():
         description="Disable Simplify during render")
     scene.simplify_status = BoolProperty(default=False)
 
+    scene.use_simplify_shaders = BoolProperty(
+        default=False,
+        name="Simplify Shaders",
+        description="Use flat colour versions of heavy materials, "
+                    "full materials on final renders",
+        update=shader_lod_toggle)
+
+    scene.simplify_shaders_threshold = FloatProperty(
+        default=30.0,
+        min=0.0,
+        name="Above Cost",
+        description="Simplify materials with a shading cost above this, "
+                    "as ranked in Scene Debug")
+
+    scene.amaranth_mesh_lod_screen_size = FloatProperty(
+        default=0.25,
+        min=0.0, max=1.0,
+        subtype='FACTOR',
+        name="Screen Size",
+        description="Objects covering less than this of the camera frame "
+                    "use the first LOD, each level down a quarter of that")
+
+    scene.use_frustum_culling = BoolProperty(
+        default=False,
+        name="Frustum Culling",
+        description="Leave objects that never come into view out of final "
+                    "renders, as found by Find Objects out of View")
+
+    scene.amaranth_frustum_margin = FloatProperty(
+        default=0.1,
+        min=0.0, max=2.0,
+        subtype='FACTOR',
+        name="Margin",
+        description="Room around the camera view objects are still kept in, "
+                    "as a fraction of the frame size")
+
+    scene.amaranth_render_profile = StringProperty(
+        default="",
+        name="Render Profile",
+        description="Render profile applied to final renders")
+
+    scene.amaranth_parallel_workers = IntProperty(
+        default=4,
+        min=1, max=64,
+        name="Workers",
+        description="Blender processes rendering at the same time")
+
+    scene.amaranth_parallel_threads = IntProperty(
+        default=0,
+        min=0, max=256,
+        name="Threads",
+        description="Threads of each worker, 0 to share the CPU cores evenly")
+
+    scene.amaranth_parallel_chunk = IntProperty(
+        default=0,
+        min=0,
+        name="Chunk",
+        description="Frames given to a worker at a time, "
+                    "0 to split the range evenly between workers")
+
+    scene.amaranth_tiles_x = IntProperty(
+        default=2,
+        min=1, max=64,
+        name="Tiles X",
+        description="Columns of tiles a still is split in")
+
+    scene.amaranth_tiles_y = IntProperty(
+        default=2,
+        min=1, max=64,
+        name="Tiles Y",
+        description="Rows of tiles a still is split in")
+
+    scene.amaranth_tiles_overlap = IntProperty(
+        default=8,
+        min=0, max=1024,
+        subtype='PIXEL',
+        name="Overlap",
+        description="Pixels rendered past the edges of each tile and thrown "
+                    "away, wide enough for pixel and compositing filters "
+                    "not to leave seams")
+
+    scene.amaranth_tiles_priority = EnumProperty(
+        items=(('NORMAL', "Normal Priority", "Tiles render at normal priority"),
+               ('LOW', "Low Priority", "Tiles render at a lower priority, "
+                                       "to keep working meanwhile")),
+        default='NORMAL',
+        name="Priority",
+        description="Process priority of the Blender instances rendering tiles")
+
+    scene.amaranth_tiles_format = EnumProperty(
+        items=(('EXR', "OpenEXR", "Half float EXR, linear"),
+               ('PNG', "PNG", "8-bit PNG, sRGB")),
+        default='EXR',
+        name="Format",
+        description="File format of the stitched image")
+
+    scene.amaranth_patch_padding = IntProperty(
+        default=16,
+        min=0, max=1024,
+        subtype='PIXEL',
+        name="Padding",
+        description="Pixels added around the objects in patch renders, "
+                    "for glows, shadows and filters reaching past them")
+
+    scene.amaranth_render_profile_path = StringProperty(
+        default="",
+        name="Data Path",
+        description="Property to override, relative to the scene, "
+                    "e.g. render.resolution_percentage")
+
     node.use_matching_indices = BoolProperty(
         default=True,
         description="If disabled, display all available indices")
@@ -222,6 +386,14 @@ def init_properties():
             default=False,
             name="Samples Per:")
 
+        scene.amaranth_cycles_noise_target = FloatProperty(
+            default=0.02,
+            min=0.001, max=0.5,
+            precision=3,
+            name="Noise",
+            description="Noise to reach when calibrating samples, "
+                        "relative to the brightness of the image")
+
         bpy.types.CyclesRenderSettings.use_samples_final = BoolProperty(
             name="Use Final Render Samples",
             description="Use current shader samples as final render samples",
@@ -237,11 +409,76 @@ def init_properties():
         name="List Missing Images",
         description="Display a list of all the missing images")
 
+    scene.amaranth_debug_scene_list_orphan_data = BoolProperty(
+        default=False,
+        name="List Orphan Data",
+        description="Display a list of all datablocks not used by any scene")
+
+    scene.amaranth_debug_scene_list_duplicate_materials = BoolProperty(
+        default=False,
+        name="List Duplicate Materials",
+        description="Display a list of all identical materials")
+
+    scene.amaranth_debug_scene_list_duplicate_images = BoolProperty(
+        default=False,
+        name="List Duplicate Images",
+        description="Display a list of all images loaded more than once")
+
+    scene.amaranth_debug_scene_list_duplicate_object_data = BoolProperty(
+        default=False,
+        name="List Duplicate Object Data",
+        description="Display a list of all identical mesh and lamp data")
+
+    scene.amaranth_debug_scene_list_node_groups = BoolProperty(
+        default=False,
+        name="List Node Groups",
+        description="Display a list of all node groups, most costly first")
+
+    scene.amaranth_debug_scene_list_material_complexity = BoolProperty(
+        default=False,
+        name="List Materials Cost",
+        description="Display the most costly materials to render")
+
+    scene.amaranth_debug_scene_list_mesh_health = BoolProperty(
+        default=False,
+        name="List Mesh Problems",
+        description="Display a list of all meshes with problematic geometry")
+
+    scene.amaranth_debug_scene_list_evaluated_geometry = BoolProperty(
+        default=False,
+        name="List Heaviest Objects",
+        description="Display the objects with the most faces at render time")
+
+    scene.amaranth_debug_scene_list_texture_memory = BoolProperty(
+        default=False,
+        name="List Texture Memory",
+        description="Display the memory taken by images, per material")
+
+    scene.amaranth_debug_mesh_distance = FloatProperty(
+        default=0.0001,
+        min=0.0000001, max=1.0,
+        precision=6,
+        name="Distance",
+        description="Vertices closer than this are doubles, "
+                    "edges shorter than this are collapsed")
+
+    scene.amaranth_debug_mesh_ngon_limit = IntProperty(
+        default=32,
+        min=5,
+        name="N-gon Sides",
+        description="Faces with more sides than this are reported")
+
     bpy.types.ShaderNodeNormal.normal_vector = prop_normal_vector
     bpy.types.CompositorNodeNormal.normal_vector = prop_normal_vector
 
     bpy.types.Object.is_keyframe = is_keyframe
 
+    bpy.types.Object.amaranth_frustum_keep = BoolProperty(
+        default=False,
+        name="Keep in Renders",
+        description="Never leave this object out of renders by frustum "
+                    "culling, for objects seen in shadows or reflections")
+
     scene.amth_wire_toggle_scene_all = BoolProperty(
         default=False,
         name="All Scenes",
@@ -264,6 +501,22 @@ def clear_properties():
     props = (
         "use_unsimplify_render",
         "simplify_status",
+        "use_simplify_shaders",
+        "simplify_shaders_threshold",
+        "amaranth_mesh_lod_screen_size",
+        "use_frustum_culling",
+        "amaranth_frustum_margin",
+        "amaranth_render_profile",
+        "amaranth_render_profile_path",
+        "amaranth_parallel_workers",
+        "amaranth_parallel_threads",
+        "amaranth_parallel_chunk",
+        "amaranth_tiles_x",
+        "amaranth_tiles_y",
+        "amaranth_tiles_overlap",
+        "amaranth_tiles_priority",
+        "amaranth_tiles_format",
+        "amaranth_patch_padding",
         "use_matching_indices",
         "use_simplify_nodes_vector",
         "status",
@@ -272,7 +525,19 @@ def clear_properties():
         "amaranth_cycles_node_types",
         "amaranth_lighterscorner_list_meshlights",
         "amaranth_debug_scene_list_missing_images",
+        "amaranth_debug_scene_list_orphan_data",
+        "amaranth_debug_scene_list_duplicate_materials",
+        "amaranth_debug_scene_list_duplicate_images",
+        "amaranth_debug_scene_list_duplicate_object_data",
+        "amaranth_debug_scene_list_node_groups",
+        "amaranth_debug_scene_list_material_complexity",
+        "amaranth_debug_scene_list_mesh_health",
+        "amaranth_debug_mesh_distance",
+        "amaranth_debug_mesh_ngon_limit",
+        "amaranth_debug_scene_list_evaluated_geometry",
+        "amaranth_debug_scene_list_texture_memory",
         "amarath_cycles_list_sampling",
+        "amaranth_cycles_noise_target",
         "normal_vector",
         "use_samples_final",
         'amth_wire_toggle_is_selected',
@@ -348,6 +613,851 @@ def is_keyframe(ob, frame):
                 return True
     return False
 
+# FUNCTION: Image resolution read from the file header, without loading it
+def image_file_resolution(filepath):
+    import struct
+
+    try:
+        with open(filepath, 'rb') as f:
+            head = f.read(32)
+
+            # PNG
+            if head[:8] == b'\x89PNG\r\n\x1a\n':
+                return struct.unpack('>II', head[16:24])
+
+            # BMP
+            if head[:2] == b'BM':
+                width, height = struct.unpack('<ii', head[18:26])
+                return width, abs(height)
+
+            # OpenEXR, look for the dataWindow attribute
+            if head[:4] == b'\x76\x2f\x31\x01':
+                f.seek(8)
+                while True:
+                    name = b''.join(iter(lambda: f.read(1), b'\x00'))
+                    if not name:
+                        return None
+                    b''.join(iter(lambda: f.read(1), b'\x00'))
+                    size = struct.unpack('<i', f.read(4))[0]
+                    value = f.read(size)
+                    if name == b'dataWindow':
+                        xmin, ymin, xmax, ymax = struct.unpack('<iiii', value)
+                        return xmax - xmin + 1, ymax - ymin + 1
+
+            # JPEG, walk the markers until the start of frame
+            if head[:2] == b'\xff\xd8':
+                f.seek(2)
+                while True:
+                    marker = f.read(2)
+                    if len(marker) < 2 or marker[0] != 0xff:
+                        return None
+                    if 0xc0 <= marker[1] <= 0xcf and \
+                       marker[1] not in {0xc4, 0xc8, 0xcc}:
+                        f.read(3)
+                        height, width = struct.unpack('>HH', f.read(4))
+                        return width, height
+                    length = struct.unpack('>H', f.read(2))[0]
+                    f.seek(length - 2, 1)
+
+            # Radiance HDR, the resolution line comes after the header
+            if head[:2] == b'#?':
+                f.seek(0)
+                for line in f:
+                    line = line.split()
+                    if len(line) == 4 and line[0] in {b'-Y', b'+Y'}:
+                        return int(line[3]), int(line[1])
+    except (IOError, OSError, ValueError, struct.error):
+        return None
+
+    return None
+
+# FUNCTION: Scanline OpenEXR files with NumPy, uncompressed or ZIP, enough
+# to read renders back and write the images we stitch ourselves
+exr_pixel_types = {0: '<u4', 1: '<f2', 2: '<f4'}
+
+def exr_zip_decode(data):
+    import numpy as np
+    import zlib
+
+    # Bytes were stored as deltas, with odd and even bytes in two halves
+    deltas = np.frombuffer(zlib.decompress(data), dtype=np.uint8).astype(np.int64)
+    deltas[1:] -= 128
+    split = np.cumsum(deltas).astype(np.uint8)
+    raw = np.empty_like(split)
+    half = (len(split) + 1) // 2
+    raw[0::2] = split[:half]
+    raw[1::2] = split[half:]
+    return raw.tobytes()
+
+def exr_zip_encode(raw):
+    import numpy as np
+    import zlib
+
+    raw = np.frombuffer(raw, dtype=np.uint8)
+    split = np.concatenate((raw[0::2], raw[1::2])).astype(np.int64)
+    deltas = split.copy()
+    deltas[1:] = (split[1:] - split[:-1] + 128) & 0xff
+    return zlib.compress(deltas.astype(np.uint8).tobytes())
+
+def exr_read(filepath):
+    """RGBA pixels of a scanline EXR as a float32 (height, width, 4) array,
+    bottom row first like Blender images"""
+    import numpy as np
+    import struct
+
+    with open(filepath, 'rb') as f:
+        data = f.read()
+
+    if data[:4] != b'\x76\x2f\x31\x01':
+        raise ValueError("%s is not an EXR file" % filepath)
+
+    # Header attributes: name, type, size, value
+    header = {}
+    offset = 8
+    while data[offset:offset + 1] != b'\x00':
+        name_end = data.index(b'\x00', offset)
+        type_end = data.index(b'\x00', name_end + 1)
+        size = struct.unpack_from('<i', data, type_end + 1)[0]
+        value_start = type_end + 5
+        header[data[offset:name_end].decode()] = data[value_start:value_start + size]
+        offset = value_start + size
+    offset += 1
+
+    channels = []
+    chlist = header['channels']
+    position = 0
+    while chlist[position:position + 1] != b'\x00':
+        name_end = chlist.index(b'\x00', position)
+        pixel_type = struct.unpack_from('<i', chlist, name_end + 1)[0]
+        channels.append((chlist[position:name_end].decode(), exr_pixel_types[pixel_type]))
+        position = name_end + 17
+
+    compression = header['compression'][0]
+    if compression not in {0, 2, 3}:
+        raise ValueError("%s uses an unsupported EXR compression" % filepath)
+
+    xmin, ymin, xmax, ymax = struct.unpack('<4i', header['dataWindow'])
+    width = xmax - xmin + 1
+    height = ymax - ymin + 1
+    lines_per_block = 16 if compression == 3 else 1
+    blocks = (height + lines_per_block - 1) // lines_per_block
+
+    line = np.dtype([(name, dtype, width) for name, dtype in channels])
+    pixels = np.zeros((height, width, 4), dtype=np.float32)
+    pixels[..., 3] = 1.0
+
+    for offset in struct.unpack_from('<%dQ' % blocks, data, offset):
+        y, size = struct.unpack_from('<2i', data, offset)
+        block = data[offset + 8:offset + 8 + size]
+        lines = min(lines_per_block, ymax + 1 - y)
+        if size < lines * line.itemsize:
+            block = exr_zip_decode(block)
+        values = np.frombuffer(block, dtype=line, count=lines)
+        row = y - ymin
+        for index, name in enumerate("RGBA"):
+            if name in values.dtype.names:
+                pixels[row:row + lines, :, index] = values[name]
+
+    return pixels[::-1]
+
+def exr_write(filepath, pixels):
+    """Write (height, width, 4) RGBA pixels, bottom row first, as a half
+    float ZIP compressed EXR"""
+    import numpy as np
+    import struct
+
+    height, width = pixels.shape[:2]
+    pixels = pixels[::-1]
+
+    def attribute(name, kind, value):
+        return name.encode() + b'\x00' + kind.encode() + b'\x00' + \
+               struct.pack('<i', len(value)) + value
+
+    # Channels are stored in alphabetical order
+    order = (('A', 3), ('B', 2), ('G', 1), ('R', 0))
+    chlist = b''.join(name.encode() + b'\x00' + struct.pack('<iB3xii', 1, 0, 1, 1)
+                      for name, index in order) + b'\x00'
+    window = struct.pack('<4i', 0, 0, width - 1, height - 1)
+
+    header = b'\x76\x2f\x31\x01' + struct.pack('<i', 2) + \
+        attribute("channels", "chlist", chlist) + \
+        attribute("compression", "compression", b'\x03') + \
+        attribute("dataWindow", "box2i", window) + \
+        attribute("displayWindow", "box2i", window) + \
+        attribute("lineOrder", "lineOrder", b'\x00') + \
+        attribute("pixelAspectRatio", "float", struct.pack('<f', 1.0)) + \
+        attribute("screenWindowCenter", "v2f", struct.pack('<2f', 0.0, 0.0)) + \
+        attribute("screenWindowWidth", "float", struct.pack('<f', 1.0)) + b'\x00'
+
+    chunks = []
+    for y in range(0, height, 16):
+        lines = pixels[y:y + 16]
+        raw = np.stack([lines[..., index] for name, index in order], axis=1)
+        raw = raw.astype('<f2').tobytes()
+        compressed = exr_zip_encode(raw)
+        if len(compressed) < len(raw):
+            raw = compressed
+        chunks.append(struct.pack('<2i', y, len(raw)) + raw)
+
+    offset = len(header) + 8 * len(chunks)
+    offsets = []
+    for chunk in chunks:
+        offsets.append(offset)
+        offset += len(chunk)
+
+    with open(filepath, 'wb') as f:
+        f.write(header)
+        f.write(struct.pack('<%dQ' % len(offsets), *offsets))
+        for chunk in chunks:
+            f.write(chunk)
+
+def png_write(filepath, pixels):
+    """Write (height, width, 4) uint8 RGBA pixels, bottom row first, as PNG"""
+    import numpy as np
+    import struct
+    import zlib
+
+    height, width = pixels.shape[:2]
+    rows = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    rows[:, 1:] = pixels[::-1].reshape(height, width * 4)
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + \
+               struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    with open(filepath, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>2I5B', width, height, 8, 6, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(rows.tobytes(), 6)))
+        f.write(chunk(b'IEND', b''))
+
+# FUNCTION: Image resolution, avoid loading images just to know their size
+def image_resolution(im):
+    if im.has_data:
+        return tuple(im.size)
+    if im.source == 'GENERATED':
+        return im.generated_width, im.generated_height
+    if im.source in {'FILE', 'SEQUENCE'} and not im.packed_file:
+        resolution = image_file_resolution(
+            bpy.path.abspath(im.filepath, library=im.library))
+        if resolution:
+            return resolution
+    return 0, 0
+
+def image_is_float(im):
+    if im.has_data:
+        return im.is_float
+    if im.source == 'GENERATED':
+        return im.use_generated_float
+    import os.path
+    return os.path.splitext(im.filepath)[1].lower() in {'.exr', '.hdr'}
+
+# FUNCTION: Estimated memory of an image once loaded (RGBA buffer)
+def image_memory_size(im):
+    width, height = image_resolution(im)
+    return width * height * 4 * (4 if image_is_float(im) else 1)
+
+# FUNCTION: Estimated memory of mesh data (vertices, edges, loops, faces)
+def mesh_memory_size(me):
+    loop_size = 8 + (12 * len(me.uv_layers)) + (4 * len(me.vertex_colors))
+    return (len(me.vertices) * 20 +
+            len(me.edges) * 12 +
+            len(me.loops) * loop_size +
+            len(me.polygons) * 12)
+
+def bytes_to_human(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024.0:
+            return "%.1f %s" % (size, unit)
+        size /= 1024.0
+    return "%.1f TB" % size
+
+# FUNCTION: Run a Python script in background Blender processes, in parallel
+# The script finds its batch of jobs in a JSON file, passed after '--'
+def background_blender(script, jobs, workers=None, filepath=None):
+    """Split jobs across background Blender processes running script,
+    on the blend file at filepath if given.
+
+    Returns the exit code of each process.
+    """
+    import json
+    import os
+    import shutil
+    import subprocess
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    if not jobs:
+        return []
+
+    workers = min(len(jobs), workers or os.cpu_count() or 1)
+    tempdir = tempfile.mkdtemp(prefix="amaranth_")
+    script_path = os.path.join(tempdir, "script.py")
+    with open(script_path, 'w') as f:
+        f.write(script)
+
+    def run(index):
+        batch_path = os.path.join(tempdir, "jobs_%d.json" % index)
+        with open(batch_path, 'w') as f:
+            json.dump(jobs[index::workers], f)
+        return subprocess.call(
+            background_blender_command(script_path, batch_path, filepath))
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(run, range(workers)))
+    finally:
+        shutil.rmtree(tempdir, ignore_errors=True)
+
+def background_blender_command(script_path, batch_path, filepath=None):
+    return ([bpy.app.binary_path, "-b", "--factory-startup"] +
+            ([filepath] if filepath else []) +
+            ["--python", script_path, "--", batch_path])
+
+def background_blender_thread(script, jobs, workers=None, filepath=None):
+    """Same as background_blender() in a thread, for modal operators to poll.
+    The exit codes end up in thread.codes"""
+    import threading
+
+    def run():
+        thread.codes = background_blender(script, jobs, workers, filepath)
+
+    thread = threading.Thread(target=run)
+    thread.codes = None
+    thread.start()
+    return thread
+
+def blend_file_copy(filepath=None):
+    """Save a copy of the current file for background processes to read,
+    in a temporary folder unless filepath is given, returns its path.
+    Relative paths are remapped to keep working."""
+    import os
+    import tempfile
+
+    if not filepath:
+        filepath = os.path.join(tempfile.mkdtemp(prefix="amaranth_"),
+                                bpy.path.basename(bpy.data.filepath) or "untitled.blend")
+    bpy.ops.wm.save_as_mainfile(filepath=filepath, copy=True)
+    return filepath
+
+# Renders a list of jobs: {"scene", "frame", "border", "layer", "settings",
+# "output", "keep_format", "patch"}, settings being {data path: value}
+# relative to the scene. Renders are saved as 32-bit EXR unless keep_format
+# is set. With patch {"into": path, "rect": (xmin, ymin, xmax, ymax)}, the
+# render is pasted over a copy of that image, saved as output + ".patched".
+# Render time of each job, and the error if patching failed, go in its
+# output path + ".json"
+render_jobs_script = '''
+import bpy, json, sys, time
+
+def path_set(scene, data_path, value):
+    index = data_path.rfind(".")
+    owner = scene.path_resolve(data_path[:index]) if index > 0 else scene
+    setattr(owner, data_path[index + 1:], value)
+
+for job in json.load(open(sys.argv[sys.argv.index("--") + 1])):
+    scene = bpy.data.scenes.get(job.get("scene", ""), bpy.context.scene)
+    render = scene.render
+
+    if job.get("border"):
+        render.use_border = True
+        render.use_crop_to_border = True
+        (render.border_min_x, render.border_min_y,
+         render.border_max_x, render.border_max_y) = job["border"]
+    if job.get("layer"):
+        for layer in render.layers:
+            layer.use = layer.name == job["layer"]
+    for data_path, value in job.get("settings", {}).items():
+        path_set(scene, data_path, value)
+
+    render.filepath = job["output"]
+    render.use_file_extension = False
+    if not job.get("keep_format"):
+        render.image_settings.file_format = "OPEN_EXR"
+        render.image_settings.color_mode = "RGBA"
+        render.image_settings.color_depth = "32"
+        render.image_settings.exr_codec = "ZIP"
+    scene.frame_set(job.get("frame", scene.frame_current))
+
+    start = time.time()
+    bpy.ops.render.render(write_still=True, scene=scene.name)
+    result = {"seconds": time.time() - start}
+
+    if job.get("patch"):
+        xmin, ymin, xmax, ymax = job["patch"]["rect"]
+        try:
+            import numpy as np
+            base = bpy.data.images.load(job["patch"]["into"])
+            piece = bpy.data.images.load(job["output"])
+            width, height = base.size
+            if tuple(piece.size) != (xmax - xmin, ymax - ymin):
+                raise ValueError("the render is not the size of its patch")
+            pixels = np.array(base.pixels[:], dtype=np.float32).reshape(height, width, 4)
+            pixels[ymin:ymax, xmin:xmax] = np.array(
+                piece.pixels[:], dtype=np.float32).reshape(ymax - ymin, xmax - xmin, 4)
+            base.pixels[:] = pixels.ravel().tolist()
+            base.filepath_raw = job["output"] + ".patched"
+            base.save()
+        except (RuntimeError, ValueError) as e:
+            result["error"] = str(e)
+
+    with open(job["output"] + ".json", "w") as f:
+        json.dump(result, f)
+'''
+
+def render_border_pixels(rect, width, height):
+    """Render border fields for a rectangle (xmin, ymin, xmax, ymax) in
+    pixels. Blender truncates border * resolution, nudge them to land on
+    the pixel"""
+    return [min(1.0, (rect[0] + 0.25) / width),
+            min(1.0, (rect[1] + 0.25) / height),
+            min(1.0, (rect[2] + 0.25) / width),
+            min(1.0, (rect[3] + 0.25) / height)]
+
+def render_job_result(job):
+    """(pixels, seconds) of a job rendered by render_jobs_script, pixels as
+    a (height, width, 4) NumPy array, None if the job failed"""
+    import json
+    import os
+    import numpy as np
+
+    if not os.path.isfile(job["output"] + ".json"):
+        return None
+    with open(job["output"] + ".json") as f:
+        seconds = json.load(f)["seconds"]
+
+    im = bpy.data.images.load(job["output"])
+    width, height = im.size
+    pixels = np.array(im.pixels[:], dtype=np.float32).reshape(height, width, 4)
+    bpy.data.images.remove(im)
+    return pixels, seconds
+
+# FUNCTION: Datablocks used by another datablock, one entry per user it adds
+# Pointers and collections we follow, anything else is caught by comparing
+# the references we found against the datablock's user count
+datablock_pointers = ("data", "world", "camera", "dupli_group", "dupli_object",
+                      "image", "texture", "mask_texture", "parent", "proxy")
+
+def node_tree_references(tree):
+    refs = []
+
+    if tree.animation_data and tree.animation_data.action:
+        refs.append(tree.animation_data.action)
+
+    for no in tree.nodes:
+        for attr in ("node_tree", "image", "texture", "material"):
+            ref = getattr(no, attr, None)
+            if isinstance(ref, bpy.types.ID):
+                refs.append(ref)
+    return refs
+
+def datablock_references(idblock):
+    refs = []
+
+    anim = getattr(idblock, "animation_data", None)
+    if anim and anim.action:
+        refs.append(anim.action)
+
+    for attr in datablock_pointers:
+        ref = getattr(idblock, attr, None)
+        if isinstance(ref, bpy.types.ID):
+            refs.append(ref)
+
+    # Scenes and groups link objects, mesh/curve data link materials
+    for attr in ("objects", "materials"):
+        for ref in getattr(idblock, attr, ()):
+            if ref:
+                refs.append(ref)
+
+    for slot in getattr(idblock, "material_slots", ()):
+        if slot.link == 'OBJECT' and slot.material:
+            refs.append(slot.material)
+
+    for slot in getattr(idblock, "texture_slots", ()):
+        if slot and slot.texture:
+            refs.append(slot.texture)
+
+    for psys in getattr(idblock, "particle_systems", ()):
+        if psys.settings:
+            refs.append(psys.settings)
+
+    for mo in getattr(idblock, "modifiers", ()):
+        if getattr(mo, "texture", None):
+            refs.append(mo.texture)
+
+    shape_keys = getattr(idblock, "shape_keys", None)
+    if shape_keys and shape_keys.animation_data and shape_keys.animation_data.action:
+        refs.append(shape_keys.animation_data.action)
+
+    # Node groups are trees themselves, materials/lamps/etc. embed one
+    if isinstance(idblock, bpy.types.NodeTree):
+        refs.extend(node_tree_references(idblock))
+    elif getattr(idblock, "node_tree", None):
+        refs.extend(node_tree_references(idblock.node_tree))
+
+    return refs
+
+def datablocks_users_graph():
+    data = bpy.data
+    graph = {}
+
+    for collection in (data.scenes, data.objects, data.groups,
+                       data.meshes, data.curves, data.metaballs,
+                       data.materials, data.textures, data.images,
+                       data.lamps, data.cameras, data.worlds,
+                       data.node_groups, data.particles, data.brushes,
+                       data.actions):
+        for idblock in collection:
+            graph[idblock] = datablock_references(idblock)
+    return graph
+
+def datablocks_reachable(graph, roots):
+    reachable = set()
+    stack = list(roots)
+
+    while stack:
+        idblock = stack.pop()
+        if idblock in reachable:
+            continue
+        reachable.add(idblock)
+        stack.extend(graph.get(idblock, ()))
+    return reachable
+
+# FUNCTION: Nodes that actually contribute to a node tree's outputs
+# Cycles features each shader node type needs to be rendered
+shader_node_features = {
+    'BSDF_DIFFUSE': {'DIFFUSE'},
+    'BSDF_TRANSLUCENT': {'DIFFUSE'},
+    'BSDF_VELVET': {'DIFFUSE'},
+    'BSDF_TOON': {'DIFFUSE', 'GLOSSY'},
+    'BSDF_GLOSSY': {'GLOSSY'},
+    'BSDF_ANISOTROPIC': {'GLOSSY'},
+    'BSDF_HAIR': {'GLOSSY'},
+    'BSDF_GLASS': {'GLOSSY', 'TRANSMISSION'},
+    'BSDF_REFRACTION': {'TRANSMISSION'},
+    'BSDF_TRANSPARENT': {'TRANSPARENT'},
+    'SUBSURFACE_SCATTERING': {'SUBSURFACE'},
+    'VOLUME_ABSORPTION': {'VOLUME'},
+    'VOLUME_SCATTER': {'VOLUME'},
+    'EMISSION': {'EMISSION'},
+    'AMBIENT_OCCLUSION': {'AO'},
+    'HOLDOUT': {'HOLDOUT'},
+    }
+
+# Shader nodes that only pass on the features of the nodes linked into them
+shader_node_passthrough = {'MIX_SHADER', 'ADD_SHADER', 'GROUP', 'GROUP_INPUT',
+                           'GROUP_OUTPUT', 'REROUTE'}
+
+def shader_node_type_features(no):
+    """Features a node needs to render. Shader nodes not in the table, like
+    OSL scripts or nodes of newer versions, could need any of them"""
+    if no.type in shader_node_features:
+        return shader_node_features[no.type]
+    if no.type not in shader_node_passthrough and \
+       any(socket.type == 'SHADER' for socket in no.outputs):
+        return set.union(*shader_node_features.values())
+    return set()
+
+def nodes_upstream(tree, starts):
+    """Nodes linked into starts (included), starts being a list of nodes
+    or (node, input name) pairs to only follow some of their inputs"""
+    links = {}
+    for link in tree.links:
+        links.setdefault(link.to_node, []).append(
+            (link.to_socket.name, link.from_node))
+
+    upstream = set()
+    stack = []
+    for start in starts:
+        if isinstance(start, tuple):
+            node, name = start
+            upstream.add(node)
+            stack.extend(from_node for to_socket, from_node in links.get(node, ())
+                         if to_socket == name)
+        else:
+            stack.append(start)
+
+    while stack:
+        node = stack.pop()
+        if node in upstream:
+            continue
+        upstream.add(node)
+        stack.extend(from_node for to_socket, from_node in links.get(node, ()))
+
+    return upstream
+
+def node_tree_outputs(tree):
+    """Output nodes of a node tree, the active ones when there are several"""
+    outputs = [no for no in tree.nodes
+               if no.type in {'OUTPUT_MATERIAL', 'OUTPUT_LAMP',
+                              'OUTPUT_WORLD', 'GROUP_OUTPUT'}]
+    active = [no for no in outputs if getattr(no, "is_active_output", False)]
+    return active or outputs
+
+def node_tree_features(tree, groups=None):
+    """Cycles features used by the nodes reaching a tree's active outputs"""
+    if groups is None:
+        groups = {}
+
+    features = set()
+    starts = node_tree_outputs(tree)
+
+    for no in nodes_upstream(tree, starts):
+        features |= shader_node_type_features(no)
+
+        if no.type in {'OUTPUT_MATERIAL', 'OUTPUT_WORLD'} and \
+           no.inputs['Volume'].is_linked:
+            features.add('VOLUME')
+
+        elif no.type == 'GROUP' and no.node_tree:
+            if no.node_tree not in groups:
+                # Guard against groups nested in themselves
+                groups[no.node_tree] = set()
+                groups[no.node_tree] = node_tree_features(no.node_tree, groups)
+            features |= groups[no.node_tree]
+
+    return features
+
+# FUNCTION: Structural hashing of datablocks, node trees and materials
+# Node properties that only affect the editor, not the result. Groups are
+# hashed by the content of their node tree, not its name
+node_hash_ignore = ({p.identifier for p in bpy.types.Node.bl_rna.properties} - {"mute"}) | \
+                   {"node_tree"}
+
+# Material properties that don't change how it renders
+material_hash_ignore = {p.identifier for p in bpy.types.ID.bl_rna.properties} | {
+    "node_tree", "animation_data", "preview", "active_texture",
+    "active_texture_index", "active_node_material", "paint_active_slot",
+    "texture_paint_images", "texture_paint_slots"}
+
+def rna_round(value):
+    if isinstance(value, str):
+        return value
+    if hasattr(value, "__len__"):
+        return tuple(rna_round(v) for v in value)
+    if isinstance(value, float):
+        return round(value, 6)
+    return value
+
+def rna_signature(struct, ignore=(), depth=2):
+    """Tuple of the property values of an RNA struct, for hashing.
+
+    Datablocks are referenced by name and library, nested structs and
+    collections are followed up to depth levels.
+    """
+    values = []
+
+    for prop in struct.bl_rna.properties:
+        identifier = prop.identifier
+        if identifier in ignore or identifier == "rna_type":
+            continue
+
+        try:
+            value = getattr(struct, identifier)
+        except AttributeError:
+            continue
+
+        if prop.type == 'POINTER':
+            if isinstance(value, bpy.types.ID):
+                value = (value.name,
+                         value.library.filepath if value.library else '')
+            elif value is not None and depth > 0:
+                value = rna_signature(value, depth=depth - 1)
+            else:
+                continue
+        elif prop.type == 'COLLECTION':
+            if depth > 0:
+                value = tuple(rna_signature(item, depth=depth - 1)
+                              for item in value if item is not None)
+            else:
+                continue
+        elif getattr(prop, "is_enum_flag", False):
+            value = tuple(sorted(value))
+        else:
+            value = rna_round(value)
+
+        values.append((identifier, value))
+
+    return tuple(values)
+
+def idblock_fcurves(idblock):
+    """Drivers and action F-Curves animating a datablock"""
+    anim = getattr(idblock, "animation_data", None)
+    if not anim:
+        return []
+    fcurves = list(anim.drivers)
+    if anim.action:
+        fcurves += list(anim.action.fcurves)
+    return fcurves
+
+def signature_hash(signature):
+    import hashlib
+    return hashlib.md5(repr(signature).encode('utf-8')).hexdigest()
+
+def node_socket_values(sockets):
+    values = []
+    for sock in sockets:
+        if not sock.is_linked and hasattr(sock, "default_value"):
+            values.append((sock.identifier, rna_round(sock.default_value)))
+    return tuple(values)
+
+def node_tree_hash(tree, cache=None):
+    """Structural hash of a node tree, independent of node names and layout.
+
+    Nodes are labelled by their type, settings and unlinked socket values,
+    then labels are refined a few times with the labels of their linked
+    neighbours, so identical setups hash the same however they were built.
+    Node groups are hashed by content, pass the same cache dict to reuse
+    the hashes of groups shared by many trees.
+    """
+    if cache is None:
+        cache = {}
+    if tree in cache:
+        return cache[tree]
+
+    # Guard against groups nested in themselves
+    cache[tree] = None
+
+    labels = {}
+    for no in tree.nodes:
+        if no.type == 'FRAME':
+            continue
+        group = node_tree_hash(no.node_tree, cache) \
+                if no.type == 'GROUP' and no.node_tree else None
+        labels[no] = signature_hash((
+            no.bl_idname, group,
+            rna_signature(no, node_hash_ignore, depth=3),
+            node_socket_values(no.inputs),
+            node_socket_values(no.outputs)))
+
+    links = [(link.from_node, link.from_socket.identifier,
+              link.to_node, link.to_socket.identifier)
+             for link in tree.links
+             if link.from_node in labels and link.to_node in labels]
+
+    for i in range(3):
+        neighbours = {no: [] for no in labels}
+        for from_node, from_socket, to_node, to_socket in links:
+            neighbours[to_node].append(
+                ('IN', labels[from_node], from_socket, to_socket))
+            neighbours[from_node].append(
+                ('OUT', labels[to_node], from_socket, to_socket))
+        labels = {no: signature_hash((label, sorted(neighbours[no])))
+                  for no, label in labels.items()}
+
+    cache[tree] = signature_hash((
+        tree.bl_idname,
+        sorted(labels.values()),
+        sorted((labels[f], fs, labels[t], ts) for f, fs, t, ts in links)))
+
+    return cache[tree]
+
+# Lamp properties that don't change how it renders
+lamp_hash_ignore = {p.identifier for p in bpy.types.ID.bl_rna.properties} | {
+    "node_tree", "animation_data", "active_texture", "active_texture_index"}
+
+def mesh_hash(me):
+    """Hash of the mesh geometry, edge flags, UVs, vertex colors, custom
+    normals, shape keys and materials, read in bulk"""
+    import array
+    import hashlib
+
+    sha1 = hashlib.sha1()
+
+    for collection, attr, typecode, size in (
+            (me.vertices, "co", 'f', 3),
+            (me.edges, "vertices", 'i', 2),
+            (me.edges, "crease", 'f', 1),
+            (me.edges, "use_edge_sharp", 'i', 1),
+            (me.edges, "use_seam", 'i', 1),
+            (me.loops, "vertex_index", 'i', 1),
+            (me.polygons, "loop_total", 'i', 1),
+            (me.polygons, "material_index", 'i', 1),
+            (me.polygons, "use_smooth", 'i', 1)):
+        values = array.array(typecode, [0]) * (len(collection) * size)
+        collection.foreach_get(attr, values)
+        sha1.update(values.tobytes())
+
+    for uv_layer in me.uv_layers:
+        values = array.array('f', [0.0]) * (len(uv_layer.data) * 2)
+        uv_layer.data.foreach_get("uv", values)
+        sha1.update(values.tobytes())
+
+    for color_layer in me.vertex_colors:
+        values = array.array('f', [0.0]) * (len(color_layer.data) * 3)
+        color_layer.data.foreach_get("color", values)
+        sha1.update(values.tobytes())
+
+    if me.shape_keys:
+        for key_block in me.shape_keys.key_blocks:
+            sha1.update(repr((key_block.name, key_block.relative_key.name,
+                              key_block.vertex_group)).encode('utf-8'))
+            values = array.array('f', [0.0]) * (len(key_block.data) * 3)
+            key_block.data.foreach_get("co", values)
+            sha1.update(values.tobytes())
+
+    # Custom split normals, in Blender versions that have them
+    if getattr(me, "has_custom_normals", False):
+        me.calc_normals_split()
+        values = array.array('f', [0.0]) * (len(me.loops) * 3)
+        me.loops.foreach_get("normal", values)
+        sha1.update(values.tobytes())
+
+    sha1.update(repr((
+        [(ma.name if ma else None) for ma in me.materials],
+        me.use_auto_smooth, round(me.auto_smooth_angle, 6),
+        me.show_double_sided)).encode('utf-8'))
+
+    return sha1.hexdigest()
+
+def lamp_hash(lamp, cache=None):
+    return signature_hash((
+        rna_signature(lamp, lamp_hash_ignore, depth=1),
+        node_tree_hash(lamp.node_tree, cache)
+            if lamp.use_nodes and lamp.node_tree else None,
+        lamp.animation_data.action.name
+            if lamp.animation_data and lamp.animation_data.action else None))
+
+def curve_hash(cu):
+    """Hash of the curve settings and of its spline points, read in bulk"""
+    import array
+    import hashlib
+
+    sha1 = hashlib.sha1()
+
+    for spline in cu.splines:
+        sha1.update(repr(rna_signature(spline, depth=0)).encode('utf-8'))
+        for collection, attr, size in (
+                (spline.bezier_points, "co", 3),
+                (spline.bezier_points, "handle_left", 3),
+                (spline.bezier_points, "handle_right", 3),
+                (spline.bezier_points, "radius", 1),
+                (spline.bezier_points, "tilt", 1),
+                (spline.points, "co", 4),
+                (spline.points, "radius", 1),
+                (spline.points, "tilt", 1)):
+            values = array.array('f', [0.0]) * (len(collection) * size)
+            collection.foreach_get(attr, values)
+            sha1.update(values.tobytes())
+
+    return signature_hash((rna_signature(cu, depth=1), sha1.hexdigest()))
+
+def datablock_canonical_key(idblock):
+    """Sort key to pick the datablock to keep out of identical ones:
+    local first, then the one without a .001 suffix, then the most used"""
+    import re
+    base = re.sub(r'\.\d{3,}$', '', idblock.name)
+    return (idblock.library is not None, idblock.name != base,
+            -idblock.users, idblock.name)
+
+def material_hash(ma, cache=None):
+    return signature_hash((
+        rna_signature(ma, material_hash_ignore, depth=1),
+        node_tree_hash(ma.node_tree, cache)
+            if ma.use_nodes and ma.node_tree else None,
+        ma.animation_data.action.name
+            if ma.animation_data and ma.animation_data.action else None))
+
 # FEATURE: Refresh Scene!
 class AMTH_SCENE_OT_refresh(Operator):
     """Refresh the current scene"""
@@ -929,6 +2039,1087 @@ def unsimplify_ui(self,context):
     self.layout.prop(scene, 'use_unsimplify_render')
 # //FEATURE: Unsimplify on render
 
+# FEATURE: Simplify Shaders
+# Texture nodes replaced by flat values in simplified materials
+shader_lod_textures = {
+    'TEX_IMAGE', 'TEX_ENVIRONMENT', 'TEX_NOISE', 'TEX_MUSGRAVE',
+    'TEX_VORONOI', 'TEX_WAVE', 'TEX_MAGIC', 'TEX_CHECKER', 'TEX_BRICK',
+    'TEX_GRADIENT', 'TEX_SKY'}
+
+# Average colour of images, keyed by datablock_key() and file path, dropped
+# when the image is reloaded
+shader_lod_colors = {}
+
+# Scenes with their full materials back for a final render
+shader_lod_rendering = []
+
+# Hashes of node groups, keyed by datablock_key(), until they are edited
+shader_lod_group_hashes = {}
+
+def srgb_to_linear(value):
+    if value <= 0.04045:
+        return value / 12.92
+    return ((value + 0.055) / 1.055) ** 2.4
+
+def image_average_color(im):
+    """Average scene linear colour of an image, for an RGB node"""
+    key = datablock_key("images", im) + (im.filepath,)
+    if key not in shader_lod_colors:
+        color = (0.5, 0.5, 0.5, 1.0)
+        copy = im.copy()
+        try:
+            copy.scale(4, 4)
+            pixels = list(copy.pixels[:])
+            # Byte images give the display encoded values
+            if im.colorspace_settings.name == 'sRGB' and not copy.is_float:
+                for i in range(len(pixels)):
+                    if i % 4 != 3:
+                        pixels[i] = srgb_to_linear(pixels[i])
+            if pixels:
+                color = tuple(sum(pixels[i::4]) / (len(pixels) // 4)
+                              for i in range(4))
+        except RuntimeError:
+            # Missing or unreadable file
+            pass
+        bpy.data.images.remove(copy)
+        shader_lod_colors[key] = color
+    return shader_lod_colors[key]
+
+def texture_node_average_color(no):
+    if no.type in {'TEX_IMAGE', 'TEX_ENVIRONMENT'} and no.image:
+        return image_average_color(no.image)
+
+    colors = [sock.default_value for sock in no.inputs
+              if sock.type == 'RGBA' and not sock.is_linked]
+    if colors:
+        return tuple(sum(color[i] for color in colors) / len(colors)
+                     for i in range(4))
+    return (0.5, 0.5, 0.5, 1.0)
+
+def node_tree_has_textures(tree, visiting=()):
+    for no in tree.nodes:
+        if no.type in shader_lod_textures:
+            return True
+        if no.type == 'GROUP' and no.node_tree and \
+           no.node_tree not in visiting and \
+           node_tree_has_textures(no.node_tree, visiting + (tree,)):
+            return True
+    return False
+
+def node_tree_simplify(tree, cache):
+    """Replace textures by flat values and drop displacement, in place"""
+    for no in list(tree.nodes):
+        if no.type == 'GROUP' and no.node_tree:
+            no.node_tree = shader_lod_copy(no.node_tree, cache)
+
+        elif no.type in shader_lod_textures:
+            color = texture_node_average_color(no)
+            for output in no.outputs:
+                links = [link for link in tree.links
+                         if link.from_socket == output]
+                if not links:
+                    continue
+                if output.type == 'RGBA':
+                    flat = tree.nodes.new(type='ShaderNodeRGB')
+                    flat.outputs[0].default_value = color
+                else:
+                    flat = tree.nodes.new(type='ShaderNodeValue')
+                    flat.outputs[0].default_value = color[3] \
+                        if output.name == 'Alpha' else \
+                        0.2126 * color[0] + 0.7152 * color[1] + 0.0722 * color[2]
+                flat.location = no.location
+                flat.label = no.label or no.name
+                for link in links:
+                    tree.links.new(flat.outputs[0], link.to_socket)
+            tree.nodes.remove(no)
+
+        elif no.type == 'OUTPUT_MATERIAL':
+            for link in [link for link in tree.links
+                         if link.to_socket == no.inputs['Displacement']]:
+                tree.links.remove(link)
+
+def shader_lod_source(lod, collection):
+    """Material or node group a simplified copy was made from, found by
+    name and library so linked blocks with the same name don't mix"""
+    name = lod.get("amth_lod_source")
+    library = lod.get("amth_lod_library", "")
+    if name is None:
+        return None
+    for idblock in collection:
+        if idblock.name == name and \
+           (idblock.library.filepath if idblock.library else "") == library:
+            return idblock
+    return None
+
+def node_tree_uses(tree, groups, visiting=()):
+    """Whether the node tree contains any of the groups, nested or not"""
+    for no in tree.nodes:
+        if no.type == 'GROUP' and no.node_tree and \
+           no.node_tree not in visiting and \
+           (no.node_tree in groups or
+            node_tree_uses(no.node_tree, groups, visiting + (tree,))):
+            return True
+    return False
+
+def shader_lod_cache():
+    """Hash cache for node_tree_hash(), with the groups not edited since
+    the last swap already hashed"""
+    return {ng: shader_lod_group_hashes[datablock_key("node_groups", ng)]
+            for ng in bpy.data.node_groups
+            if datablock_key("node_groups", ng) in shader_lod_group_hashes}
+
+def shader_lod_cache_store(cache):
+    for ng in bpy.data.node_groups:
+        if cache.get(ng) is not None and "amth_lod_source" not in ng:
+            shader_lod_group_hashes[datablock_key("node_groups", ng)] = cache[ng]
+
+def shader_lod_copy(idblock, cache):
+    """Simplified copy of a material or node group, reused while its source
+    hashes the same. Node groups without textures are used as they are."""
+    is_material = isinstance(idblock, bpy.types.Material)
+    if not is_material and not node_tree_has_textures(idblock):
+        return idblock
+
+    if is_material:
+        collection = bpy.data.materials
+        source_hash = material_hash(idblock, cache)
+    else:
+        collection = bpy.data.node_groups
+        source_hash = node_tree_hash(idblock, cache)
+
+    library = idblock.library.filepath if idblock.library else ""
+    for lod in [lod for lod in collection
+                if lod.get("amth_lod_source") == idblock.name and
+                   lod.get("amth_lod_library", "") == library and
+                   not lod.library]:
+        if lod.get("amth_lod_hash") == source_hash:
+            return lod
+        if not lod.users:
+            collection.remove(lod)
+
+    lod = idblock.copy()
+    lod.name = "%s.LOD" % idblock.name
+    lod.use_fake_user = False
+    lod.pop("amth_lod_fake_user", None)
+    lod["amth_lod_source"] = idblock.name
+    lod["amth_lod_library"] = library
+    lod["amth_lod_hash"] = source_hash
+    node_tree_simplify(lod.node_tree if is_material else lod, cache)
+    return lod
+
+def shader_lod_slots(scene):
+    """Material slots of the scene we are allowed to change"""
+    for ob in scene.objects:
+        for slot in ob.material_slots:
+            owner = ob if slot.link == 'OBJECT' else ob.data
+            if slot.material and not owner.library:
+                yield slot
+
+def shader_lod_swap(scene, simplified, sources=None):
+    """Use the simplified version of heavy materials, or the full ones back.
+    Pass sources to only refresh the copies of those materials."""
+    if not simplified:
+        for slot in shader_lod_slots(scene):
+            source = shader_lod_source(slot.material, bpy.data.materials)
+            if source:
+                slot.material = source
+        for ma in bpy.data.materials:
+            if "amth_lod_fake_user" in ma:
+                ma.use_fake_user = ma["amth_lod_fake_user"]
+                del ma["amth_lod_fake_user"]
+        return
+
+    threshold = scene.simplify_shaders_threshold
+    groups = {}
+    resolutions = {}
+    cache = shader_lod_cache()
+    lods = {}
+
+    for slot in shader_lod_slots(scene):
+        ma = slot.material
+        if ma not in lods:
+            source = shader_lod_source(ma, bpy.data.materials)
+            if sources is not None and (source or ma) not in sources:
+                lods[ma] = ma
+            elif source:
+                # Already simplified, refresh it if the source changed
+                lods[ma] = shader_lod_copy(source, cache)
+            elif ma.use_nodes and ma.node_tree and \
+                 material_complexity_score(ma, groups, resolutions)["score"] >= threshold:
+                lods[ma] = shader_lod_copy(ma, cache)
+            else:
+                lods[ma] = ma
+
+        if lods[ma] != ma:
+            source = shader_lod_source(lods[ma], bpy.data.materials)
+            # Keep the full material when saving while simplified
+            if "amth_lod_fake_user" not in source:
+                source["amth_lod_fake_user"] = source.use_fake_user
+                source.use_fake_user = True
+            slot.material = lods[ma]
+
+    shader_lod_cache_store(cache)
+
+def shader_lod_toggle(self, context):
+    # Groups edited while simplification was off were not tracked
+    shader_lod_group_hashes.clear()
+    shader_lod_swap(context.scene, self.use_simplify_shaders)
+
+@persistent
+def shader_lod_scene_update(scene):
+    # Reloaded images may have new colours
+    if shader_lod_colors and bpy.data.images.is_updated:
+        for im in bpy.data.images:
+            if im.is_updated:
+                key = datablock_key("images", im)
+                for cached in [cached for cached in shader_lod_colors
+                               if cached[:3] == key]:
+                    del shader_lod_colors[cached]
+
+    # Keep simplified materials in sync when their sources change
+    if not scene.use_simplify_shaders or shader_lod_rendering:
+        return
+
+    groups = set()
+    if bpy.data.node_groups.is_updated:
+        groups = {ng for ng in bpy.data.node_groups
+                  if ng.is_updated and "amth_lod_source" not in ng}
+    sources = set()
+    if bpy.data.materials.is_updated:
+        sources = {ma for ma in bpy.data.materials
+                   if ma.is_updated and "amth_lod_fake_user" in ma}
+
+    if groups:
+        # Groups using the edited ones hash differently too
+        groups |= {ng for ng in bpy.data.node_groups
+                   if "amth_lod_source" not in ng and node_tree_uses(ng, groups)}
+        for ng in groups:
+            shader_lod_group_hashes.pop(datablock_key("node_groups", ng), None)
+        sources |= {ma for ma in bpy.data.materials
+                    if "amth_lod_fake_user" in ma and ma.use_nodes and
+                       ma.node_tree and node_tree_uses(ma.node_tree, groups)}
+
+    if sources:
+        shader_lod_swap(scene, True, sources)
+
+@persistent
+def shader_lod_render_pre(scene):
+    if scene.use_simplify_shaders and scene.name not in shader_lod_rendering:
+        shader_lod_rendering.append(scene.name)
+        shader_lod_swap(scene, False)
+
+@persistent
+def shader_lod_render_post(scene):
+    if scene.name in shader_lod_rendering:
+        shader_lod_rendering.remove(scene.name)
+        shader_lod_swap(scene, True)
+
+def shader_lod_ui(self, context):
+    scene = context.scene
+    row = self.layout.row(align=True)
+    row.prop(scene, 'use_simplify_shaders')
+    sub = row.row(align=True)
+    sub.active = scene.use_simplify_shaders
+    sub.prop(scene, 'simplify_shaders_threshold')
+# //FEATURE: Simplify Shaders
+
+# FEATURE: Mesh LOD
+# Objects back on their full mesh for a final render (object, LOD mesh)
+mesh_lod_rendering = []
+
+def mesh_lod_source(ob):
+    """Full resolution mesh of an object, whatever LOD it shows"""
+    return bpy.data.meshes.get(ob.get("amth_lod_source", ""), ob.data)
+
+def mesh_lod_levels(source):
+    """Decimated meshes made from source, first level first"""
+    return sorted((me for me in bpy.data.meshes
+                   if me.get("amth_lod_source") == source.name and not me.library),
+                  key=lambda me: me["amth_lod_level"])
+
+def mesh_lod_make(scene, source, ratio, levels):
+    """Decimate source into levels meshes, each ratio times the faces of the
+    previous one. Levels still matching the source are reused."""
+    source_hash = mesh_hash(source)
+    existing = {me["amth_lod_level"]: me for me in mesh_lod_levels(source)}
+
+    for level in range(1, levels + 1):
+        level_ratio = ratio ** level
+        old = existing.pop(level, None)
+        if old and old.get("amth_lod_hash") == source_hash and \
+           abs(old["amth_lod_ratio"] - level_ratio) < 1e-6:
+            continue
+
+        # Decimate the mesh alone, ignoring the object modifiers
+        temp = bpy.data.objects.new("amth_lod", source)
+        decimate = temp.modifiers.new("Decimate", 'DECIMATE')
+        decimate.ratio = level_ratio
+        lod = temp.to_mesh(scene, True, 'PREVIEW')
+        bpy.data.objects.remove(temp)
+
+        lod.name = "%s.LOD%d" % (source.name, level)
+        lod["amth_lod_source"] = source.name
+        lod["amth_lod_level"] = level
+        lod["amth_lod_ratio"] = level_ratio
+        lod["amth_lod_hash"] = source_hash
+
+        if old:
+            for ob in bpy.data.objects:
+                if ob.data == old:
+                    ob.data = lod
+            bpy.data.meshes.remove(old)
+
+    # Levels we don't want anymore
+    for old in existing.values():
+        for ob in bpy.data.objects:
+            if ob.data == old:
+                ob.data = source
+        bpy.data.meshes.remove(old)
+
+def mesh_lod_set(ob, level):
+    """Show a LOD level on an object, 0 for the full mesh"""
+    source = mesh_lod_source(ob)
+    levels = mesh_lod_levels(source)
+    level = min(level, len(levels))
+
+    if level:
+        # Keep the full mesh when saving while no object uses it
+        if "amth_lod_fake_user" not in source:
+            source["amth_lod_fake_user"] = source.use_fake_user
+            source.use_fake_user = True
+        ob["amth_lod_source"] = source.name
+        ob.data = levels[level - 1]
+        return
+
+    ob.data = source
+    ob.pop("amth_lod_source", None)
+    if "amth_lod_fake_user" in source and not any(
+            other.get("amth_lod_source") == source.name
+            for other in bpy.data.objects):
+        source.use_fake_user = source["amth_lod_fake_user"]
+        del source["amth_lod_fake_user"]
+
+def object_screen_size(scene, ob):
+    """Fraction of the camera frame height the object covers, roughly"""
+    from mathutils import Vector
+
+    camera = scene.camera
+    corners = [ob.matrix_world * Vector(corner) for corner in ob.bound_box]
+    center = sum(corners, Vector()) / len(corners)
+    radius = max((corner - center).length for corner in corners)
+
+    if camera.data.type == 'ORTHO':
+        return 2.0 * radius / camera.data.ortho_scale
+
+    import math
+    depth = -(camera.matrix_world.inverted() * center).z
+    if depth <= radius:
+        # Camera inside or right in front of it
+        return 1.0
+    return radius / (depth * math.tan(camera.data.angle / 2.0))
+
+def mesh_lod_level_from_camera(scene, ob, levels):
+    """One more level each time the object gets four times smaller on screen"""
+    size = object_screen_size(scene, ob)
+    thresholds = [scene.amaranth_mesh_lod_screen_size * 0.25 ** i
+                  for i in range(levels)]
+    return sum(1 for threshold in thresholds if size < threshold)
+
+class AMTH_OBJECT_OT_mesh_lod_make(Operator):
+    '''Make decimated versions of the selected meshes, shown in the viewport while final renders use the full mesh'''
+    bl_idname = "object.amaranth_mesh_lod_make"
+    bl_label = "Make LODs"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    ratio = FloatProperty(
+        name="Ratio",
+        description="Faces kept from one level to the next",
+        default=0.25, min=0.01, max=0.9)
+    levels = IntProperty(
+        name="Levels",
+        default=2, min=1, max=5)
+
+    @classmethod
+    def poll(cls, context):
+        return any(ob.type == 'MESH' for ob in context.selected_objects)
+
+    def execute(self, context):
+        sources = {mesh_lod_source(ob) for ob in context.selected_objects
+                   if ob.type == 'MESH'}
+        sources = [me for me in sources if not me.library]
+
+        for source in sources:
+            mesh_lod_make(context.scene, source, self.ratio, self.levels)
+
+        for ob in context.selected_objects:
+            if ob.type == 'MESH' and mesh_lod_source(ob) in sources:
+                mesh_lod_set(ob, 1)
+
+        self.report({"INFO"}, "%d %s with LODs" % (
+            len(sources), "mesh" if len(sources) == 1 else "meshes"))
+        return {'FINISHED'}
+
+class AMTH_OBJECT_OT_mesh_lod_set(Operator):
+    '''Show this LOD level on the selected objects'''
+    bl_idname = "object.amaranth_mesh_lod_set"
+    bl_label = "Set LOD"
+    bl_options = {'UNDO'}
+
+    level = IntProperty(name="Level", min=0)
+    use_camera = BoolProperty(
+        name="From Camera",
+        description="Pick the level from the size of each object "
+                    "as seen from the scene camera",
+        default=False)
+
+    def execute(self, context):
+        scene = context.scene
+        if self.use_camera and not scene.camera:
+            self.report({'WARNING'}, "The scene has no camera")
+            return {'CANCELLED'}
+
+        for ob in context.selected_objects:
+            if ob.type != 'MESH':
+                continue
+            level = self.level
+            if self.use_camera:
+                level = mesh_lod_level_from_camera(
+                    scene, ob, len(mesh_lod_levels(mesh_lod_source(ob))))
+            mesh_lod_set(ob, level)
+
+        return {'FINISHED'}
+
+class AMTH_OBJECT_OT_mesh_lod_remove(Operator):
+    '''Use the full mesh again on the selected objects, and delete LODs no longer used'''
+    bl_idname = "object.amaranth_mesh_lod_remove"
+    bl_label = "Remove LODs"
+    bl_options = {'UNDO'}
+
+    def execute(self, context):
+        sources = set()
+        for ob in context.selected_objects:
+            if ob.type == 'MESH':
+                sources.add(mesh_lod_source(ob))
+                mesh_lod_set(ob, 0)
+
+        for source in sources:
+            for lod in mesh_lod_levels(source):
+                if not lod.users:
+                    bpy.data.meshes.remove(lod)
+
+        return {'FINISHED'}
+
+class AMTH_OBJECT_PT_mesh_lod(Panel):
+    '''Mesh LOD Panel'''
+    bl_space_type = 'PROPERTIES'
+    bl_region_type = 'WINDOW'
+    bl_context = "object"
+    bl_label = "Level of Detail"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    @classmethod
+    def poll(cls, context):
+        return context.object and context.object.type == 'MESH'
+
+    def draw(self, context):
+        layout = self.layout
+        ob = context.object
+        levels = mesh_lod_levels(mesh_lod_source(ob))
+
+        row = layout.row(align=True)
+        row.operator(AMTH_OBJECT_OT_mesh_lod_make.bl_idname, icon="MOD_DECIM")
+        row.operator(AMTH_OBJECT_OT_mesh_lod_remove.bl_idname, icon="X")
+
+        if not levels:
+            return
+
+        row = layout.row(align=True)
+        props = row.operator(AMTH_OBJECT_OT_mesh_lod_set.bl_idname, text="Full",
+                             icon="RADIOBUT_ON" if ob.data not in levels else "RADIOBUT_OFF")
+        props.level = 0
+        for lod in levels:
+            props = row.operator(AMTH_OBJECT_OT_mesh_lod_set.bl_idname,
+                                 text="LOD%d" % lod["amth_lod_level"],
+                                 icon="RADIOBUT_ON" if ob.data == lod else "RADIOBUT_OFF")
+            props.level = lod["amth_lod_level"]
+
+        row = layout.row(align=True)
+        row.prop(context.scene, "amaranth_mesh_lod_screen_size")
+        props = row.operator(AMTH_OBJECT_OT_mesh_lod_set.bl_idname,
+                             text="From Camera", icon="CAMERA_DATA")
+        props.use_camera = True
+
+        layout.label(text="%s faces shown, %s on final renders" % (
+            len(ob.data.polygons), len(mesh_lod_source(ob).polygons)),
+            icon="INFO")
+
+@persistent
+def mesh_lod_render_pre(scene):
+    if mesh_lod_rendering:
+        return
+
+    for ob in scene.objects:
+        if "amth_lod_source" in ob and ob.type == 'MESH':
+            source = mesh_lod_source(ob)
+            if ob.data != source:
+                mesh_lod_rendering.append((ob.name, ob.data.name))
+                ob.data = source
+
+@persistent
+def mesh_lod_render_post(scene):
+    for name, lod in mesh_lod_rendering:
+        ob = bpy.data.objects.get(name)
+        if ob and lod in bpy.data.meshes:
+            ob.data = bpy.data.meshes[lod]
+    mesh_lod_rendering[:] = []
+# //FEATURE: Mesh LOD
+
+# FEATURE: Frustum Culling
+# Objects hidden from a final render for being out of view, by name
+frustum_culling_rendering = []
+
+def frustum_cull_candidates(scene):
+    """[(object, local bounds min, max)] of the objects that can be culled.
+    Instancers get the bounds of their group. Objects other objects depend
+    on to render (group members, dupli parents, particle emitters and
+    instances) are left out"""
+    import numpy as np
+
+    instanced = set()
+    for ob in scene.objects:
+        if ob.dupli_type == 'GROUP' and ob.dupli_group:
+            instanced.update(ob.dupli_group.objects)
+        for psys in ob.particle_systems:
+            settings = psys.settings
+            if settings.dupli_object:
+                instanced.add(settings.dupli_object)
+            if settings.dupli_group:
+                instanced.update(settings.dupli_group.objects)
+
+    candidates = []
+    for ob in scene.objects:
+        if ob in instanced or ob.amaranth_frustum_keep or ob.particle_systems or \
+           ob.dupli_type in {'VERTS', 'FACES'} or \
+           (ob.parent and ob.parent.dupli_type in {'VERTS', 'FACES'}):
+            continue
+        if ob.type not in patch_render_types and \
+           not (ob.dupli_type == 'GROUP' and ob.dupli_group):
+            continue
+
+        # Corners of everything it renders, in its own space
+        inverse = np.array(ob.matrix_world.inverted(), dtype=np.float64)
+        corners = []
+        for instance, matrix in objects_bounds_instances([ob]):
+            matrix = np.dot(inverse, np.array(matrix, dtype=np.float64))
+            corners.append(np.dot(np.array(instance.bound_box, dtype=np.float64),
+                                  matrix[:3, :3].T) + matrix[:3, 3])
+        if corners:
+            corners = np.concatenate(corners)
+            candidates.append((ob, corners.min(axis=0), corners.max(axis=0)))
+    return candidates
+
+def frustum_visible(scene, matrices, low, high, margin):
+    """Which boxes are in the camera frustum at the current frame, grown by
+    margin of the frame size on each side. Boxes are given by their world
+    matrices (n, 4, 4) and local bounds (n, 3). Conservative, a box is only
+    out if all its corners are outside the same frustum plane"""
+    import numpy as np
+
+    camera = scene.camera
+    corners = np.stack([np.where(np.array(bits, dtype=bool), high, low)
+                        for bits in ((0, 0, 0), (0, 0, 1), (0, 1, 0), (0, 1, 1),
+                                     (1, 0, 0), (1, 0, 1), (1, 1, 0), (1, 1, 1))], axis=1)
+
+    # World, then camera space, the camera looks down -Z
+    view = np.einsum('ij,njk->nik', np.array(
+        camera.matrix_world.normalized().inverted(), dtype=np.float64), matrices)
+    points = np.einsum('nij,nkj->nki', view[:, :3, :3], corners) + \
+             view[:, np.newaxis, :3, 3]
+    x, y, depth = points[..., 0], points[..., 1], -points[..., 2]
+
+    frame = np.array([tuple(v) for v in camera.data.view_frame(scene=scene)])
+    low_x, low_y = frame[:, :2].min(axis=0)
+    high_x, high_y = frame[:, :2].max(axis=0)
+    grow_x = (high_x - low_x) * margin
+    grow_y = (high_y - low_y) * margin
+    low_x, high_x = low_x - grow_x, high_x + grow_x
+    low_y, high_y = low_y - grow_y, high_y + grow_y
+
+    # Planes through the camera, scaled by depth instead of dividing by it
+    if camera.data.type == 'ORTHO':
+        planes = (x - low_x, high_x - x, y - low_y, high_y - y)
+    else:
+        distance = -frame[0, 2]
+        planes = (x * distance - low_x * depth, high_x * depth - x * distance,
+                  y * distance - low_y * depth, high_y * depth - y * distance)
+    planes += (depth - camera.data.clip_start, camera.data.clip_end - depth)
+
+    visible = np.ones(len(matrices), dtype=bool)
+    for plane in planes:
+        visible &= (plane >= 0.0).any(axis=1)
+    return visible
+
+# Object properties following from others or from the current frame, that
+# don't move anything, or that culling sets itself
+frustum_culling_ignore = {p.identifier for p in bpy.types.ID.bl_rna.properties} | {
+    "matrix_world", "matrix_local", "matrix_basis", "dimensions", "bound_box",
+    "select", "hide", "hide_select", "mode", "active_material_index",
+    "hide_render", "amaranth_frustum_keep"}
+
+def frustum_culling_hash(scene, culled):
+    """Hash of the frame range and of what moves the camera view and the
+    culled objects over it: the camera and its lens, the objects, the
+    objects of the groups they instance, their parents and constraint
+    targets, with the keys and drivers animating them. Transforms are
+    hashed by their values when not animated"""
+    import array
+
+    camera = scene.camera
+    if not camera:
+        return None
+
+    rd = scene.render
+    signature = [scene.frame_start, scene.frame_end, scene.frame_step,
+                 rd.resolution_x, rd.resolution_y,
+                 rd.pixel_aspect_x, rd.pixel_aspect_y]
+
+    stack = [camera, camera.data] + \
+            [scene.objects[name] for name in culled if name in scene.objects]
+    seen = set()
+    while stack:
+        idblock = stack.pop()
+        if idblock is None or idblock in seen:
+            continue
+        seen.add(idblock)
+
+        fcurves = idblock_fcurves(idblock)
+
+        # Animated values are those of the current frame, the keys say more
+        animated = {fcu.data_path for fcu in fcurves}
+        signature.append((idblock.name, rna_signature(
+            idblock, frustum_culling_ignore | animated, depth=0)))
+        for fcu in fcurves:
+            keys = []
+            for attr in ("co", "handle_left", "handle_right"):
+                values = array.array('f', [0.0]) * (len(fcu.keyframe_points) * 2)
+                fcu.keyframe_points.foreach_get(attr, values)
+                keys.append(values.tolist())
+            signature.append((fcu.data_path, fcu.array_index, keys,
+                              fcu.driver.expression if fcu.driver else None))
+
+        if isinstance(idblock, bpy.types.Object):
+            stack.append(idblock.parent)
+            if idblock.dupli_type == 'GROUP' and idblock.dupli_group:
+                stack.extend(idblock.dupli_group.objects)
+            for con in idblock.constraints:
+                signature.append(rna_signature(con, depth=0))
+                stack.append(getattr(con, "target", None))
+
+    return signature_hash(tuple(signature))
+
+def frustum_culled(scene):
+    import json
+    return json.loads(scene.get("amth_frustum_culled", "[]"))
+
+class AMTH_RENDER_OT_frustum_cull_analyse(Operator):
+    '''Find the objects that never come into the camera view over the frame range, to leave them out of final renders'''
+    bl_idname = "render.amaranth_frustum_cull_analyse"
+    bl_label = "Find Objects out of View"
+
+    @classmethod
+    def poll(cls, context):
+        return context.scene.camera
+
+    def execute(self, context):
+        import json
+        import time
+        import numpy as np
+
+        scene = context.scene
+        start = time.time()
+        candidates = frustum_cull_candidates(scene)
+        low = np.array([entry[1] for entry in candidates]).reshape(-1, 3)
+        high = np.array([entry[2] for entry in candidates]).reshape(-1, 3)
+        visible = np.zeros(len(candidates), dtype=bool)
+
+        # Every frame, anything between two samples could come into view
+        frames = range(scene.frame_start, scene.frame_end + 1, scene.frame_step)
+
+        frame_current = scene.frame_current
+        for frame in frames:
+            scene.frame_set(frame)
+            matrices = np.array([ob.matrix_world for ob, low_corner, high_corner
+                                 in candidates], dtype=np.float64).reshape(-1, 4, 4)
+            visible |= frustum_visible(scene, matrices, low, high,
+                                       scene.amaranth_frustum_margin)
+        scene.frame_set(frame_current)
+
+        culled = [ob.name for (ob, low_corner, high_corner), seen
+                  in zip(candidates, visible) if not seen]
+        scene["amth_frustum_culled"] = json.dumps(culled)
+        scene["amth_frustum_hash"] = frustum_culling_hash(scene, culled)
+
+        print("\n* %d of %d objects out of view over %d frames (%.2f seconds)\n" % (
+            len(culled), len(scene.objects), len(frames), time.time() - start))
+        for count, name in enumerate(culled[:100], 1):
+            print('%02d. %s' % (count, name))
+        print("\n")
+
+        self.report({'INFO'}, "%d objects out of view" % len(culled))
+        return {'FINISHED'}
+
+@persistent
+def frustum_culling_render_pre(scene):
+    if frustum_culling_rendering or not scene.use_frustum_culling:
+        return
+
+    if "amth_frustum_culled" in scene and \
+       scene.get("amth_frustum_hash") != frustum_culling_hash(
+           scene, frustum_culled(scene)):
+        print("Frustum Culling: the camera, the frame range or the objects "
+              "left out changed since they were found, none left out. "
+              "Find them again")
+        return
+
+    for name in frustum_culled(scene):
+        ob = scene.objects.get(name)
+        if ob and not ob.hide_render and not ob.amaranth_frustum_keep:
+            frustum_culling_rendering.append(name)
+            ob.hide_render = True
+
+@persistent
+def frustum_culling_render_post(scene):
+    for name in frustum_culling_rendering:
+        ob = bpy.data.objects.get(name)
+        if ob:
+            ob.hide_render = False
+    frustum_culling_rendering[:] = []
+
+def frustum_culling_ui(self, context):
+    scene = context.scene
+    layout = self.layout
+
+    row = layout.row(align=True)
+    row.prop(scene, 'use_frustum_culling')
+    sub = row.row(align=True)
+    sub.active = scene.use_frustum_culling
+    sub.prop(scene, 'amaranth_frustum_margin')
+
+    if scene.use_frustum_culling:
+        row = layout.row(align=True)
+        row.operator(AMTH_RENDER_OT_frustum_cull_analyse.bl_idname, icon="CAMERA_DATA")
+        # Checked against what changed when rendering, hashing the culled
+        # objects on every redraw would slow the panel down
+        if "amth_frustum_culled" in scene:
+            row.label(text="%d objects left out" % len(frustum_culled(scene)))
+
+def frustum_culling_object_ui(self, context):
+    self.layout.prop(context.object, "amaranth_frustum_keep")
+# //FEATURE: Frustum Culling
+
+# FEATURE: Render Profiles
+# Named sets of {data path: value} relative to the scene, stored as JSON in
+# scene['amth_render_profiles'], and applied only while rendering
+render_profile_templates = {
+    'PREVIEW': {
+        "render.use_simplify": True,
+        "render.simplify_subdivision": 1,
+        "render.simplify_child_particles": 0.2,
+        "render.use_motion_blur": False,
+        "cycles.samples": 32,
+        },
+    'LIGHTING': {
+        "render.use_simplify": True,
+        "render.simplify_subdivision": 2,
+        "render.simplify_child_particles": 0.5,
+        "render.use_motion_blur": False,
+        "cycles.samples": 128,
+        },
+    }
+
+# The render result is already sized when render_pre runs, overriding these
+# from there would not change the output size
+render_profile_refused = ("render.resolution_", "render.border_",
+                          "render.use_border", "render.use_crop_to_border",
+                          "render.pixel_aspect_")
+
+def render_profiles(scene):
+    import json
+    return {name: json.loads(profile) for name, profile in
+            scene.get("amth_render_profiles", {}).items()}
+
+def render_profiles_store(scene, profiles):
+    import json
+    scene["amth_render_profiles"] = {name: json.dumps(overrides)
+                                     for name, overrides in profiles.items()}
+
+def scene_path_split(scene, data_path):
+    """Owner and attribute name of a data path relative to the scene"""
+    index = data_path.rfind(".")
+    if index < data_path.rfind("]"):
+        raise ValueError("%s is not a property" % data_path)
+    owner = scene.path_resolve(data_path[:index]) if index > 0 else scene
+    return owner, data_path[index + 1:]
+
+def rna_value_plain(value):
+    """Property value as something JSON can store, vectors and matrices as
+    (nested) lists. Pointers to datablocks or structs can't be stored."""
+    if isinstance(value, bpy.types.bpy_struct):
+        raise TypeError("pointer properties can't be overridden")
+    if isinstance(value, set):
+        return sorted(value)
+    if hasattr(value, "__len__") and not isinstance(value, str):
+        return [rna_value_plain(item) for item in value]
+    return value
+
+def rna_value_set(owner, attr, value):
+    # Enum flags only take sets
+    if isinstance(getattr(owner, attr), set):
+        value = set(value)
+    setattr(owner, attr, value)
+
+def render_profile_previous(scene, overrides):
+    """(path, value) pairs the overrides would replace"""
+    previous = []
+    for data_path in sorted(overrides):
+        owner, attr = scene_path_split(scene, data_path)
+        previous.append((data_path, rna_value_plain(getattr(owner, attr))))
+    return previous
+
+def render_profile_apply(scene, overrides, previous):
+    """Set all overrides or none"""
+    applied = []
+    try:
+        for data_path, old in previous:
+            owner, attr = scene_path_split(scene, data_path)
+            rna_value_set(owner, attr, overrides[data_path])
+            applied.append((data_path, old))
+    except (AttributeError, TypeError, ValueError):
+        render_profile_restore(scene, applied)
+        raise
+
+def render_profile_restore(scene, previous):
+    for data_path, value in reversed(previous):
+        try:
+            owner, attr = scene_path_split(scene, data_path)
+            rna_value_set(owner, attr, value)
+        except (AttributeError, TypeError, ValueError) as e:
+            print("Render Profile: could not restore %s (%s)" % (data_path, e))
+
+@persistent
+def render_profile_render_pre(scene):
+    import json
+
+    name = scene.amaranth_render_profile
+    if not name or "amth_render_profile_diff" in scene:
+        return
+
+    overrides = render_profiles(scene).get(name)
+    if overrides is None:
+        return
+    # Stored before they were refused
+    overrides = {data_path: value for data_path, value in overrides.items()
+                 if not data_path.startswith(render_profile_refused)}
+
+    try:
+        previous = render_profile_previous(scene, overrides)
+        # Kept in the file before anything changes, so a crash mid-render
+        # can still be undone on load
+        scene["amth_render_profile_diff"] = json.dumps(previous)
+        render_profile_apply(scene, overrides, previous)
+    except (AttributeError, TypeError, ValueError) as e:
+        if "amth_render_profile_diff" in scene:
+            del scene["amth_render_profile_diff"]
+        print("Render Profile: %s not applied (%s)" % (name, e))
+
+@persistent
+def render_profile_render_post(scene):
+    import json
+
+    if "amth_render_profile_diff" in scene:
+        render_profile_restore(scene, json.loads(scene["amth_render_profile_diff"]))
+        del scene["amth_render_profile_diff"]
+
+@persistent
+def render_profile_load_post(dummy):
+    for scene in bpy.data.scenes:
+        render_profile_render_post(scene)
+
+class AMTH_RENDER_OT_profile_add(Operator):
+    '''Add a render profile, applied to final renders while active'''
+    bl_idname = "render.amaranth_profile_add"
+    bl_label = "Add Render Profile"
+
+    name = StringProperty(name="Name", default="Preview")
+    template = EnumProperty(
+        items=(('EMPTY', "Empty", "No overrides"),
+               ('PREVIEW', "Preview", "Simplified, no motion blur, few samples"),
+               ('LIGHTING', "Lighting Check", "Simplified, no motion blur")),
+        name="Template",
+        default='EMPTY')
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def execute(self, context):
+        scene = context.scene
+        profiles = render_profiles(scene)
+
+        if not self.name or self.name in profiles:
+            self.report({'WARNING'}, "Pick a name not used by another profile")
+            return {'CANCELLED'}
+
+        overrides = {}
+        for data_path, value in render_profile_templates.get(self.template, {}).items():
+            try:
+                owner, attr = scene_path_split(scene, data_path)
+            except ValueError:
+                # Render engine not available
+                continue
+            if not hasattr(owner, attr):
+                continue
+            overrides[data_path] = value
+
+        profiles[self.name] = overrides
+        render_profiles_store(scene, profiles)
+        return {'FINISHED'}
+
+class AMTH_RENDER_OT_profile_remove(Operator):
+    '''Remove this render profile'''
+    bl_idname = "render.amaranth_profile_remove"
+    bl_label = "Remove Render Profile"
+
+    name = StringProperty()
+
+    def execute(self, context):
+        scene = context.scene
+        profiles = render_profiles(scene)
+        profiles.pop(self.name, None)
+        render_profiles_store(scene, profiles)
+
+        if scene.amaranth_render_profile == self.name:
+            scene.amaranth_render_profile = ""
+        return {'FINISHED'}
+
+class AMTH_RENDER_OT_profile_activate(Operator):
+    '''Use this profile on final renders'''
+    bl_idname = "render.amaranth_profile_activate"
+    bl_label = "Use Render Profile"
+
+    name = StringProperty()
+
+    def execute(self, context):
+        context.scene.amaranth_render_profile = self.name
+        return {'FINISHED'}
+
+class AMTH_RENDER_OT_profile_override_add(Operator):
+    '''Override a property in this profile, with the value it has now unless one is given'''
+    bl_idname = "render.amaranth_profile_override_add"
+    bl_label = "Add Override"
+
+    name = StringProperty()
+    data_path = StringProperty(
+        name="Data Path",
+        description="Relative to the scene, e.g. cycles.samples or "
+                    "objects[\"Tree\"].modifiers[\"Subsurf\"].render_levels")
+    value = StringProperty(
+        name="Value",
+        description="As JSON, e.g. true, 2 or [1, 0, 0], "
+                    "leave empty to use the current value")
+
+    def execute(self, context):
+        import json
+
+        scene = context.scene
+        profiles = render_profiles(scene)
+        if self.name not in profiles:
+            return {'CANCELLED'}
+
+        if self.data_path.startswith(render_profile_refused):
+            self.report({'WARNING'}, "Resolution and border can't be overridden, "
+                        "the render size is set before profiles apply")
+            return {'CANCELLED'}
+
+        try:
+            owner, attr = scene_path_split(scene, self.data_path)
+            current = rna_value_plain(getattr(owner, attr))
+            value = json.loads(self.value) if self.value else current
+        except (AttributeError, TypeError, ValueError) as e:
+            self.report({'WARNING'}, "Not a valid override: %s" % e)
+            return {'CANCELLED'}
+
+        profiles[self.name][self.data_path] = value
+        render_profiles_store(scene, profiles)
+        return {'FINISHED'}
+
+class AMTH_RENDER_OT_profile_override_remove(Operator):
+    '''Remove this override'''
+    bl_idname = "render.amaranth_profile_override_remove"
+    bl_label = "Remove Override"
+
+    name = StringProperty()
+    data_path = StringProperty()
+
+    def execute(self, context):
+        scene = context.scene
+        profiles = render_profiles(scene)
+        profiles.get(self.name, {}).pop(self.data_path, None)
+        render_profiles_store(scene, profiles)
+        return {'FINISHED'}
+
+class AMTH_RENDER_PT_profiles(Panel):
+    '''Render Profiles Panel'''
+    bl_space_type = 'PROPERTIES'
+    bl_region_type = 'WINDOW'
+    bl_context = "render"
+    bl_label = "Render Profiles"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        layout = self.layout
+        scene = context.scene
+        profiles = render_profiles(scene)
+        active = scene.amaranth_render_profile
+
+        row = layout.row(align=True)
+        props = row.operator(AMTH_RENDER_OT_profile_activate.bl_idname,
+                             text="Scene Settings",
+                             icon="RADIOBUT_ON" if not active else "RADIOBUT_OFF")
+        props.name = ""
+        row.operator(AMTH_RENDER_OT_profile_add.bl_idname, icon="ZOOMIN", text="")
+
+        for name in sorted(profiles):
+            box = layout.box()
+            row = box.row(align=True)
+            props = row.operator(AMTH_RENDER_OT_profile_activate.bl_idname,
+                                 text=name,
+                                 icon="RADIOBUT_ON" if name == active else "RADIOBUT_OFF",
+                                 emboss=False)
+            props.name = name
+            row.operator(AMTH_RENDER_OT_profile_remove.bl_idname,
+                         icon="X", text="", emboss=False).name = name
+
+            col = box.column(align=True)
+            for data_path, value in sorted(profiles[name].items()):
+                row = col.row(align=True)
+                row.label(text="%s = %s" % (data_path, value))
+                props = row.operator(AMTH_RENDER_OT_profile_override_remove.bl_idname,
+                                     icon="ZOOMOUT", text="", emboss=False)
+                props.name = name
+                props.data_path = data_path
+
+            row = box.row(align=True)
+            row.prop(scene, "amaranth_render_profile_path", text="")
+            props = row.operator(AMTH_RENDER_OT_profile_override_add.bl_idname,
+                                 icon="ZOOMIN", text="")
+            props.name = name
+            props.data_path = scene.amaranth_render_profile_path
+
+        if "amth_render_profile_diff" in scene:
+            layout.label(text="Profile applied, restored when rendering ends",
+                         icon="INFO")
+# //FEATURE: Render Profiles
+
 # FEATURE: Extra Info Stats
 def stats_scene(self, context):
 
@@ -952,11 +3143,17 @@ def stats_scene(self, context):
                     cameras_selected += 1
     
         meshlights_string = '| Meshlights:{}/{}'.format(meshlights_visible, meshlights)
+
+        # Only once Scene Debug has looked for duplicate data
+        duplicate_data = AMTH_SCENE_OT_list_duplicate_object_data.duplicates
+        instancing_string = '| Shareable Data:{} ({} objects)'.format(
+            duplicate_data, AMTH_SCENE_OT_list_duplicate_object_data.objects)
     
         row = self.layout.row(align=True)
-        row.label(text="Scenes:{} | Cameras:{}/{} {}".format(
+        row.label(text="Scenes:{} | Cameras:{}/{} {} {}".format(
                    scenes_count, cameras_selected, cameras_count,
-                   meshlights_string if context.scene.render.engine == 'CYCLES' else ''))
+                   meshlights_string if context.scene.render.engine == 'CYCLES' else '',
+                   instancing_string if duplicate_data else ''))
 
 # //FEATURE: Extra Info Stats
 
@@ -1251,6 +3448,44 @@ def render_cycles_scene_samples(self, context):
             AMTH_RENDER_OT_cycles_samples_percentage.bl_idname,
             text="25%").percent=25
 
+        # Shader Features Audit
+        audit = AMTH_RENDER_OT_cycles_shader_features_audit
+        row = layout.row(align=True)
+        row.operator(audit.bl_idname, icon="VIEWZOOM")
+        sub = row.row(align=True)
+        sub.enabled = bool(audit.samples_unused)
+        sub.operator(AMTH_RENDER_OT_cycles_samples_unused_zero.bl_idname,
+                     icon="CANCEL")
+
+        if audit.features or audit.samples_unused or audit.bounces_wasted:
+            col = layout.column(align=True)
+            col.label(text="Features in use: %s" % (
+                ', '.join(f.title() for f in audit.features) or "None"),
+                icon="INFO")
+            if audit.samples_unused:
+                col.label(text="Unused samples: %s" % ', '.join(
+                    cscene.bl_rna.properties[attr].name
+                    for attr in audit.samples_unused), icon="ERROR")
+            for wasted in audit.bounces_wasted:
+                col.label(text=wasted, icon="ERROR")
+
+    # Samples Calibration
+    if cycles_exists:
+        calibrate = AMTH_RENDER_OT_cycles_samples_calibrate
+        row = layout.row(align=True)
+        row.prop(scene, "amaranth_cycles_noise_target")
+        row.operator(calibrate.bl_idname,
+                     text="Calibrating..." if calibrate.running else "Calibrate Samples",
+                     icon="SEQ_HISTOGRAM")
+
+        if calibrate.results:
+            col = layout.column(align=True)
+            for layer, recommended, noise in calibrate.results:
+                col.label(text="%s: %d samples (%.1f%% noise now)" % (
+                    layer, recommended, noise * 100.0), icon="RENDERLAYERS")
+            col.operator(AMTH_RENDER_OT_cycles_samples_calibrated_set.bl_idname,
+                         icon="FILE_TICK")
+
     # List Samples
     if (len(scene.render.layers) > 1) or \
         (len(bpy.data.scenes) > 1):
@@ -1421,389 +3656,4393 @@ def render_final_resolution_ui(self, context):
     else:
         layout.label(text="Final Resolution: {} x {}".format(
              str(final_res_x)[:-2], str(final_res_y)[:-2]))
-# // FEATURE: Final Render Resolution Display
 
-# FEATURE: Shader Nodes Extra Info
-def node_shader_extra(self, context):
+    render_memory_ui(layout, context.scene)
 
-    if context.space_data.tree_type == 'ShaderNodeTree':
-        ob = context.active_object
-        snode = context.space_data
-        layout = self.layout
+    if context.scene.render.engine == 'CYCLES':
+        scene = context.scene
+        estimate = scene.get("amth_render_estimate")
+        row = layout.row(align=True)
 
-        if ob and snode.shader_type != 'WORLD':
-            if ob.type == 'LAMP':
-                layout.label(text="%s" % ob.name,
-                             icon="LAMP_%s" % ob.data.type)        
-            else:
-                layout.label(text="%s" % ob.name,
-                             icon="OUTLINER_DATA_%s" % ob.type)
-             
+        if estimate and estimate["hash"] == render_estimate_hash(scene):
+            row.label(text="Estimated: {} per frame, {} for {} frames".format(
+                seconds_to_human(estimate["frame"]),
+                seconds_to_human(estimate["total"]), estimate["frames"]),
+                icon="TIME")
+        elif estimate:
+            row.label(text="Estimate outdated", icon="TIME")
+
+        row.operator(AMTH_RENDER_OT_render_time_estimate.bl_idname,
+            text="Estimating..." if AMTH_RENDER_OT_render_time_estimate.running
+                 else "Estimate Render Time" if not estimate else "",
+            icon="FILE_REFRESH")
+# // FEATURE: Final Render Resolution Display
 
-# // FEATURE: Shader Nodes Extra Info
+# FEATURE: Render Time Estimate
+# Scene hashes, cleared whenever one of their parts changes
+render_estimate_hashes = {}
+
+# Parts of the scene hashes by datablock_key(), to tell edits changing the
+# render time from transforms and frame changes, which tag datablocks too
+render_estimate_parts = {}
+render_estimate_collections = ("scenes", "objects", "meshes", "materials")
+
+def seconds_to_human(seconds):
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return "%ds" % seconds
+    if seconds < 3600:
+        return "%dm %02ds" % (seconds // 60, seconds % 60)
+    return "%dh %02dm" % (seconds // 3600, seconds % 3600 // 60)
+
+def render_estimate_part(attr, idblock):
+    """Part of render_estimate_hash() read from one datablock"""
+    if attr == "scenes":
+        return signature_hash((
+            rna_signature(idblock.render, depth=1),
+            rna_signature(idblock.cycles, depth=0),
+            idblock.frame_start, idblock.frame_end, idblock.frame_step,
+            idblock.camera.name if idblock.camera else None,
+            idblock.world.name if idblock.world else None,
+            len(idblock.objects)))
+    if attr == "objects":
+        return (idblock.hide_render,
+                idblock.data.name if idblock.data else None,
+                [rna_signature(md, depth=0) for md in idblock.modifiers],
+                [slot.material.name for slot in idblock.material_slots
+                 if slot.material])
+    if attr == "meshes":
+        return len(idblock.polygons)
+    return len(idblock.node_tree.nodes) if idblock.node_tree else 0
+
+def render_estimate_part_store(attr, idblock):
+    part = render_estimate_part(attr, idblock)
+    render_estimate_parts[datablock_key(attr, idblock)] = part
+    return part
+
+def render_estimate_hash(scene):
+    """Hash of what changes the render time of a scene, cached until one of
+    its parts changes"""
+    if scene.name not in render_estimate_hashes:
+        objects = []
+        for ob in scene.objects:
+            part = render_estimate_part_store("objects", ob)
+            if ob.hide_render:
+                continue
+            objects.append((
+                ob.name, part,
+                render_estimate_part_store("meshes", ob.data)
+                    if ob.type == 'MESH' else None,
+                [render_estimate_part_store("materials", slot.material)
+                 for slot in ob.material_slots if slot.material]))
+
+        render_estimate_hashes[scene.name] = signature_hash((
+            render_estimate_part_store("scenes", scene), objects))
+    return render_estimate_hashes[scene.name]
+
+def render_final_pixels(scene):
+    """Pixels of a final render, border included"""
+    rd = scene.render
+    width = rd.resolution_x * rd.resolution_percentage / 100.0
+    height = rd.resolution_y * rd.resolution_percentage / 100.0
+    if rd.use_border:
+        width *= rd.border_max_x - rd.border_min_x
+        height *= rd.border_max_y - rd.border_min_y
+    return max(1.0, width * height)
 
-# FEATURE: Scene Debug
-class AMTH_SCENE_OT_cycles_shader_list_nodes(Operator):
-    """List Cycles materials containing a specific shader"""
-    bl_idname = "scene.cycles_list_nodes"
-    bl_label = "List Materials"
-    materials = []
+def render_estimate_frames(scene):
+    return max(1, (scene.frame_end - scene.frame_start) // scene.frame_step + 1)
+
+@persistent
+def render_estimate_scene_update(scene):
+    if not render_estimate_hashes:
+        return
+
+    for attr in render_estimate_collections:
+        collection = getattr(bpy.data, attr)
+        if not collection.is_updated:
+            continue
+        for idblock in collection:
+            if not (idblock.is_updated or idblock.is_updated_data):
+                continue
+            key = datablock_key(attr, idblock)
+            if key in render_estimate_parts and \
+               render_estimate_part(attr, idblock) != render_estimate_parts[key]:
+                render_estimate_hashes.clear()
+                render_estimate_parts.clear()
+                return
+
+class AMTH_RENDER_OT_render_time_estimate(Operator):
+    '''Render a few crops of a few frames at low samples in the background, and extrapolate the render time of the whole shot'''
+    bl_idname = "render.amaranth_render_time_estimate"
+    bl_label = "Estimate Render Time"
+
+    running = False
+
+    _timer = None
 
     @classmethod
     def poll(cls, context):
-        return cycles_exists and context.scene.render.engine == 'CYCLES'
+        return not cls.running and context.scene.render.engine == 'CYCLES'
+
+    def invoke(self, context, event):
+        import os
+        import tempfile
+
+        scene = context.scene
+        attr = cycles_samples_attr(scene)
+        samples = getattr(scene.cycles, attr)
+        if getattr(scene.cycles, "use_square_samples", False):
+            samples *= samples
+
+        # Two sample counts, telling apart per-sample and fixed costs
+        self.samples = (max(1, samples // 32), max(2, samples // 16))
+        self.final_samples = samples
+        self.frames = sorted({scene.frame_start,
+                              (scene.frame_start + scene.frame_end) // 2,
+                              scene.frame_end})
+        self.borders = render_crop_borders(scene, 3, 64)
+
+        workers = 2
+        settings = {
+            "render.threads_mode": 'FIXED',
+            "render.threads": max(1, (os.cpu_count() or 1) // workers),
+            }
+        if getattr(scene.cycles, "use_square_samples", False):
+            settings["cycles.use_square_samples"] = False
+
+        self.tempdir = tempfile.mkdtemp(prefix="amaranth_")
+        self.jobs = {}
+        for frame in self.frames:
+            for crop, border in enumerate(self.borders):
+                for level in self.samples:
+                    job_settings = dict(settings)
+                    job_settings["cycles." + attr] = level
+                    self.jobs[frame, crop, level] = {
+                        "scene": scene.name,
+                        "frame": frame,
+                        "border": border,
+                        "settings": job_settings,
+                        "output": os.path.join(self.tempdir, "%d_%d_%d.exr" % (
+                            frame, crop, level))}
+
+        self.hash = render_estimate_hash(scene)
+        self.filepath = blend_file_copy()
+        self.thread = background_blender_thread(
+            render_jobs_script, list(self.jobs.values()), workers, self.filepath)
+
+        self.__class__.running = True
+        print("\n* Estimating render time: %d crops rendered in the background\n" %
+              len(self.jobs))
+
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(0.5, context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+        if self.thread.is_alive():
+            return {'RUNNING_MODAL'}
+
+        import os
+        import shutil
+
+        context.window_manager.event_timer_remove(self._timer)
+        self.__class__.running = False
+
+        scene = context.scene
+        pixels = render_final_pixels(scene)
+        low, high = self.samples
+        frame_times = []
+
+        for frame in self.frames:
+            fixed = []
+            per_pixel = []
+            for crop, border in enumerate(self.borders):
+                results = [render_job_result(self.jobs[frame, crop, level])
+                           for level in self.samples]
+                if None in results:
+                    continue
+                (pixels_low, time_low), (pixels_high, time_high) = results
+                crop_pixels = pixels_low.shape[0] * pixels_low.shape[1]
+
+                # time = fixed + per pixel sample * pixels * samples
+                per_sample = (time_high - time_low) / float(high - low)
+                if per_sample <= 0.0:
+                    per_sample = time_high / float(high)
+                fixed.append(max(0.0, time_low - per_sample * low))
+                per_pixel.append(per_sample / crop_pixels)
+
+            if per_pixel:
+                frame_times.append(
+                    sum(fixed) / len(fixed) +
+                    sum(per_pixel) / len(per_pixel) * pixels * self.final_samples)
+
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+        shutil.rmtree(os.path.dirname(self.filepath), ignore_errors=True)
+
+        if not frame_times:
+            self.report({'WARNING'}, "Estimate renders failed, see the console")
+            return {'CANCELLED'}
+
+        frame_time = sum(frame_times) / len(frame_times)
+        frames = render_estimate_frames(scene)
+        scene["amth_render_estimate"] = {
+            "hash": self.hash,
+            "frame": frame_time,
+            "total": frame_time * frames,
+            "frames": frames}
+
+        print("* Estimated render time: %s per frame, %s for %d frames\n" % (
+            seconds_to_human(frame_time), seconds_to_human(frame_time * frames),
+            frames))
+
+        for area in context.screen.areas:
+            if area.type == 'PROPERTIES':
+                area.tag_redraw()
+
+        return {'FINISHED'}
+# // FEATURE: Render Time Estimate
+
+# FEATURE: Render Memory Estimate
+# Estimates by scene name: {part: bytes}, cleared when one of their parts
+# changes, or any material, node group or image
+render_memory_estimates = {}
+
+# Parts of the estimates by datablock_key(), to tell edits changing memory
+# use from transforms and frame changes, which tag datablocks too
+render_memory_parts = {}
+render_memory_collections = ("scenes", "objects", "meshes")
+
+# Channels of each render pass, the rest are RGB
+render_pass_channels = {"use_pass_combined": 4, "use_pass_z": 1, "use_pass_mist": 1,
+                        "use_pass_vector": 4, "use_pass_object_index": 1,
+                        "use_pass_material_index": 1}
+
+# Rough bytes per triangle of the acceleration structure, nodes and
+# triangle copies, about two triangles per polygon
+render_memory_bvh_triangle = 128
+
+def render_layer_passes(layer):
+    """use_pass_* properties turned on in a render layer"""
+    return [prop.identifier for prop in layer.bl_rna.properties
+            if prop.identifier.startswith("use_pass_") and
+               getattr(layer, prop.identifier) is True]
+
+def render_buffers_size(scene):
+    """Float buffers of the passes of each render layer, plus the display
+    and composite results"""
+    rd = scene.render
+    pixels = render_final_pixels(scene)
+
+    channels = 0
+    for layer in rd.layers:
+        if not layer.use:
+            continue
+        for identifier in render_layer_passes(layer):
+            channels += render_pass_channels.get(identifier, 3)
+
+    size = pixels * channels * 4 + pixels * 4
+    if rd.use_compositing:
+        size += pixels * 16
+    return int(size)
+
+def render_memory_part(attr, idblock):
+    """What the estimate reads from one datablock: output size and passes,
+    counts of polygons, modifiers and particles, and materials"""
+    if attr == "scenes":
+        rd = idblock.render
+        return (rd.resolution_x, rd.resolution_y, rd.resolution_percentage,
+                rd.use_border, rd.border_min_x, rd.border_min_y,
+                rd.border_max_x, rd.border_max_y, rd.use_compositing,
+                [(layer.name, layer.use, render_layer_passes(layer))
+                 for layer in rd.layers],
+                len(idblock.objects))
+    if attr == "objects":
+        return (idblock.hide_render,
+                idblock.data.name if idblock.data else None,
+                [(md.type, md.show_render, getattr(md, "render_levels", None))
+                 for md in idblock.modifiers],
+                [(psys.settings.count, psys.settings.render_type)
+                 for psys in idblock.particle_systems],
+                [slot.material.name for slot in idblock.material_slots
+                 if slot.material],
+                idblock.dupli_group.name if idblock.dupli_group else None)
+    return (len(idblock.vertices), len(idblock.polygons))
+
+def render_memory_part_store(attr, idblock):
+    render_memory_parts[datablock_key(attr, idblock)] = \
+        render_memory_part(attr, idblock)
+
+@persistent
+def render_memory_scene_update(scene):
+    if not render_memory_estimates:
+        return
+
+    # Images swapped in materials, reloaded or resized
+    changed = bpy.data.materials.is_updated or \
+              bpy.data.node_groups.is_updated or bpy.data.images.is_updated
+
+    for attr in render_memory_collections:
+        collection = getattr(bpy.data, attr)
+        if changed or not collection.is_updated:
+            continue
+        for idblock in collection:
+            if not (idblock.is_updated or idblock.is_updated_data):
+                continue
+            key = datablock_key(attr, idblock)
+            if key in render_memory_parts and \
+               render_memory_part(attr, idblock) != render_memory_parts[key]:
+                changed = True
+                break
+
+    if changed:
+        render_memory_estimates.clear()
+        render_memory_parts.clear()
+
+def render_memory_estimate(scene):
+    """{part: bytes} a final render of the scene needs, recomputed only when
+    render_memory_scene_update() finds something it depends on changed"""
+    if scene.name in render_memory_estimates:
+        return render_memory_estimates[scene.name]
+
+    render_memory_part_store("scenes", scene)
+    polys = 0
+    meshes = set()
+    for ob in scene.objects:
+        render_memory_part_store("objects", ob)
+        if ob.hide_render:
+            continue
+        polys += object_polygons(ob)
+        if ob.type == 'MESH':
+            meshes.add(ob.data)
+    for me in meshes:
+        render_memory_part_store("meshes", me)
+
+    # Bytes per polygon of the meshes as they are, for what modifiers
+    # and instancing add
+    mesh_polys = sum(len(me.polygons) for me in meshes)
+    per_polygon = sum(mesh_memory_size(me) for me in meshes) / mesh_polys \
+                  if mesh_polys else 0
+
+    estimate = {
+        "buffers": render_buffers_size(scene),
+        "geometry": int(polys * per_polygon),
+        "bvh": polys * 2 * render_memory_bvh_triangle,
+        "textures": texture_memory_report(scene)[1],
+        }
+    render_memory_estimates[scene.name] = estimate
+    return estimate
+
+def render_memory_ui(layout, scene):
+    preferences = bpy.context.user_preferences.addons[__name__].preferences
+    estimate = render_memory_estimate(scene)
+    total = sum(estimate.values())
+    limit = preferences.render_memory_limit * 1024 ** 3
+
+    col = layout.column(align=True)
+    col.label(text="Memory: ~{} (Buffers {}, Geometry {}, BVH {}, Textures {})".format(
+        bytes_to_human(total), bytes_to_human(estimate["buffers"]),
+        bytes_to_human(estimate["geometry"]), bytes_to_human(estimate["bvh"]),
+        bytes_to_human(estimate["textures"])))
+    if limit and total > limit:
+        col.label(text="Over the {} of memory of the render nodes".format(
+            bytes_to_human(limit)), icon="ERROR")
+# // FEATURE: Render Memory Estimate
+
+# FEATURE: Render Log
+# Frame being rendered per scene: {"start", "frame", "peak"}
+render_log_current = {}
+
+# Records read from the log, until the file changes
+render_log_cache = {"stamp": None, "records": []}
+
+def render_log_path():
+    import os
+    preferences = bpy.context.user_preferences.addons[__name__].preferences
+    if preferences.render_log_path:
+        return bpy.path.abspath(preferences.render_log_path)
+    return os.path.join(bpy.utils.user_resource('CONFIG'), "amaranth_render_log.jsonl")
+
+def render_log_enabled():
+    return bpy.context.user_preferences.addons[__name__].preferences.use_render_log
+
+def render_log_write(record):
+    import json
+    import os
+
+    path = render_log_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as f:
+        f.write(json.dumps(record, sort_keys=True) + "\n")
+
+def render_log_records():
+    import json
+    import os
+
+    path = render_log_path()
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return []
+
+    stamp = (path, stat.st_mtime, stat.st_size)
+    if render_log_cache["stamp"] != stamp:
+        records = []
+        with open(path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+        render_log_cache["stamp"] = stamp
+        render_log_cache["records"] = records
+    return render_log_cache["records"]
+
+def render_log_samples(scene):
+    if scene.render.engine == 'CYCLES':
+        samples = getattr(scene.cycles, cycles_samples_attr(scene))
+        if getattr(scene.cycles, "use_square_samples", False):
+            samples *= samples
+        return samples
+    return int(scene.render.antialiasing_samples) \
+           if scene.render.use_antialiasing else 1
+
+def render_log_record(scene, status):
+    import time
+
+    current = render_log_current.pop(scene.name, None)
+    if not current:
+        return
+
+    rd = scene.render
+    render_log_write({
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "file": bpy.data.filepath,
+        "scene": scene.name,
+        "frame": current["frame"],
+        "seconds": round(time.time() - current["start"], 2),
+        "peak_memory": current["peak"],
+        "samples": render_log_samples(scene),
+        "resolution": [int(rd.resolution_x * rd.resolution_percentage / 100),
+                       int(rd.resolution_y * rd.resolution_percentage / 100)],
+        "engine": rd.engine,
+        "status": status,
+        })
+
+@persistent
+def render_log_render_pre(scene):
+    import time
+    if render_log_enabled():
+        render_log_current[scene.name] = {
+            "start": time.time(), "frame": scene.frame_current, "peak": 0.0}
+
+@persistent
+def render_log_render_post(scene):
+    if render_log_enabled():
+        render_log_record(scene, 'DONE')
+
+@persistent
+def render_log_render_cancel(scene):
+    if render_log_enabled():
+        render_log_record(scene, 'CANCELLED')
+
+@persistent
+def render_log_render_stats(stats):
+    # e.g. "Fra:1 Mem:15.43M (0.00M, Peak 15.51M) | Mem:3.80M, Peak:3.80M | ..."
+    import re
+
+    peaks = [float(peak) for peak in re.findall(r"Peak[: ]\s*([\d.]+)M", stats)]
+    if peaks:
+        for current in render_log_current.values():
+            current["peak"] = max(current["peak"], max(peaks))
+
+def render_log_shot(records, filepath, scene):
+    """{frame: [record of each render, oldest first]} of a file and scene"""
+    frames = {}
+    for record in records:
+        if record.get("file") == filepath and record.get("scene") == scene and \
+           record.get("status") == 'DONE':
+            frames.setdefault(record["frame"], []).append(record)
+    return frames
+
+class AMTH_RENDER_PT_render_log(Panel):
+    '''Render Log Panel'''
+    bl_space_type = 'PROPERTIES'
+    bl_region_type = 'WINDOW'
+    bl_context = "render"
+    bl_label = "Render Log"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        layout = self.layout
+        scene = context.scene
+
+        if not render_log_enabled():
+            layout.label(text="Render Log is disabled in the Add-on preferences",
+                         icon="INFO")
+            return
+
+        frames = render_log_shot(render_log_records(), bpy.data.filepath, scene.name)
+        if not frames:
+            layout.label(text="No renders logged for this scene yet", icon="INFO")
+            return
+
+        latest = {frame: runs[-1] for frame, runs in frames.items()}
+        times = sorted(record["seconds"] for record in latest.values())
+        median = times[len(times) // 2]
+        longest = times[-1] or 1.0
+
+        row = layout.row()
+        row.label(text="%d frames, median %s, total %s" % (
+            len(latest), seconds_to_human(median),
+            seconds_to_human(sum(times))), icon="TIME")
+        peak = max(record.get("peak_memory", 0.0) for record in latest.values())
+        if peak:
+            row.label(text="Peak %s" % bytes_to_human(peak * 1024 * 1024))
+
+        col = layout.column(align=True)
+        for frame in sorted(latest)[-40:]:
+            record = latest[frame]
+            runs = frames[frame]
+            previous = runs[-2]["seconds"] if len(runs) > 1 else None
+
+            # Way above the shot median, or than this frame used to take
+            outlier = record["seconds"] > 2.0 * median or \
+                      previous and record["seconds"] > 2.0 * previous
+
+            row = col.row(align=True)
+            split = row.split(percentage=0.15)
+            split.label(text="%d" % frame,
+                        icon="ERROR" if outlier else "BLANK1")
+            split = split.split(percentage=0.7)
+            split.label(text="█" * max(1, int(round(record["seconds"] / longest * 30))))
+            split.label(text="%s%s" % (seconds_to_human(record["seconds"]),
+                " (%.1fx)" % (record["seconds"] / previous)
+                if previous else ""))
+
+        layout.label(text=render_log_path(), icon="FILE_TEXT")
+# // FEATURE: Render Log
+
+# FEATURE: Parallel Render
+def render_chunk_arguments(frames):
+    """Command line arguments rendering a list of frames"""
+    if len(frames) == 1:
+        return ["-f", str(frames[0])]
+
+    step = frames[1] - frames[0]
+    if all(b - a == step for a, b in zip(frames, frames[1:])):
+        return ["-s", str(frames[0]), "-e", str(frames[-1]),
+                "-j", str(step), "-a"]
+
+    arguments = []
+    for frame in frames:
+        arguments += ["-f", str(frame)]
+    return arguments
+
+def background_blender_output(process, lines):
+    """Collect the output of a process, to run in a thread"""
+    for line in iter(process.stdout.readline, b''):
+        lines.append(line.decode('utf-8', 'replace'))
+
+class AMTH_RENDER_OT_render_parallel(Operator):
+    '''Render the animation in chunks of frames, in several background Blender processes at once'''
+    bl_idname = "render.amaranth_render_parallel"
+    bl_label = "Render in Parallel"
+
+    retry = BoolProperty(
+        name="Retry",
+        description="Render only the frames that failed last time",
+        default=False)
+
+    # One entry per worker: None or
+    # {"frames", "saved", "frame", "process", "lines", "reader"}
+    workers = []
+    queue = []
+    failed = []
+    running = False
+    stop = False
+
+    _timer = None
+
+    @classmethod
+    def poll(cls, context):
+        return not cls.running
+
+    def invoke(self, context, event):
+        import math
+        import os
+
+        cls = self.__class__
+        scene = context.scene
+
+        if self.retry:
+            frames = sorted(cls.failed)
+        else:
+            frames = list(range(scene.frame_start, scene.frame_end + 1,
+                                scene.frame_step))
+        if not frames:
+            self.report({'INFO'}, "No frames to render")
+            return {'CANCELLED'}
+
+        count = scene.amaranth_parallel_workers
+        size = scene.amaranth_parallel_chunk or int(math.ceil(len(frames) / float(count)))
+
+        cls.queue = [frames[i:i + size] for i in range(0, len(frames), size)]
+        cls.workers = [None] * min(count, len(cls.queue))
+        cls.failed = []
+        cls.running = True
+        cls.stop = False
+
+        self.threads = scene.amaranth_parallel_threads or \
+                       max(1, (os.cpu_count() or 1) // len(cls.workers))
+        self.scene = scene.name
+        self.output = bpy.path.abspath(scene.render.filepath)
+        self.filepath = blend_file_copy()
+
+        print("\n* Rendering %d frames in %d chunks, %d workers with %d threads each\n" % (
+            len(frames), len(cls.queue), len(cls.workers), self.threads))
+
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(0.5, context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def start(self, frames):
+        import collections
+        import subprocess
+        import threading
+
+        process = subprocess.Popen(
+            [bpy.app.binary_path, "-b", self.filepath, "-S", self.scene,
+             "-o", self.output, "-t", str(self.threads)] +
+            render_chunk_arguments(frames),
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+
+        lines = collections.deque()
+        reader = threading.Thread(target=background_blender_output,
+                                  args=(process, lines), daemon=True)
+        reader.start()
+
+        return {"frames": frames, "saved": set(), "frame": None,
+                "process": process, "lines": lines, "reader": reader}
+
+    def modal(self, context, event):
+        import re
+
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        cls = self.__class__
+
+        for index, worker in enumerate(cls.workers):
+            if worker:
+                done = worker["process"].poll() is not None
+                if done:
+                    # The reader may not have queued the last lines yet
+                    worker["reader"].join()
+
+                # "Fra:12 Mem:..." while rendering, "Saved: '...'" once written
+                while worker["lines"]:
+                    line = worker["lines"].popleft()
+                    match = re.match(r"Fra:(\d+)", line)
+                    if match:
+                        worker["frame"] = int(match.group(1))
+                    elif line.startswith("Saved:") and worker["frame"] is not None:
+                        worker["saved"].add(worker["frame"])
+
+                if cls.stop and not done:
+                    worker["process"].terminate()
+
+                if done:
+                    failed = [f for f in worker["frames"] if f not in worker["saved"]]
+                    if failed:
+                        print("Worker %d failed frames: %s" % (
+                            index + 1, ', '.join(str(f) for f in failed)))
+                    cls.failed.extend(failed)
+                    cls.workers[index] = None
+
+            if cls.workers[index] is None and cls.queue and not cls.stop:
+                cls.workers[index] = self.start(cls.queue.pop(0))
+
+        for area in context.screen.areas:
+            if area.type == 'PROPERTIES':
+                area.tag_redraw()
+
+        if any(cls.workers) or (cls.queue and not cls.stop):
+            return {'RUNNING_MODAL'}
+
+        import os
+        import shutil
+
+        context.window_manager.event_timer_remove(self._timer)
+        shutil.rmtree(os.path.dirname(self.filepath), ignore_errors=True)
+        cls.running = False
+        # Chunks never started when stopped
+        for frames in cls.queue:
+            cls.failed.extend(frames)
+        cls.queue = []
+        cls.failed.sort()
+
+        if cls.failed:
+            self.report({'WARNING'}, "%d frames failed" % len(cls.failed))
+        else:
+            self.report({'INFO'}, "Parallel render finished")
+        return {'FINISHED'}
+
+class AMTH_RENDER_OT_render_parallel_stop(Operator):
+    '''Stop all the render workers, unfinished frames are counted as failed'''
+    bl_idname = "render.amaranth_render_parallel_stop"
+    bl_label = "Stop"
+
+    @classmethod
+    def poll(cls, context):
+        return AMTH_RENDER_OT_render_parallel.running
 
     def execute(self, context):
-        node_type = context.scene.amaranth_cycles_node_types
-        roughness = False
-        self.__class__.materials = []
-        shaders_roughness = ['BSDF_GLOSSY','BSDF_DIFFUSE','BSDF_GLASS']
+        AMTH_RENDER_OT_render_parallel.stop = True
+        return {'FINISHED'}
 
-        print("\n=== Cycles Shader Type: %s === \n" % node_type)
+def render_parallel_ui(self, context):
+    layout = self.layout
+    scene = context.scene
+    parallel = AMTH_RENDER_OT_render_parallel
 
-        for ma in bpy.data.materials:
-            if ma.node_tree:
-                nodes = ma.node_tree.nodes
-                
-                print_unconnected = ('Note: \nOutput from "%s" node' % node_type,
-                                        'in material "%s"' % ma.name, 'not connected\n')
+    row = layout.row(align=True)
+    row.prop(scene, "amaranth_parallel_workers")
+    row.prop(scene, "amaranth_parallel_threads")
+    row.prop(scene, "amaranth_parallel_chunk")
 
-                for no in nodes:
-                    if no.type == node_type:
-                        for ou in no.outputs:
-                            if ou.links:
-                                connected = True
-                                if no.type in shaders_roughness:
-                                    roughness = 'R: %.4f' % no.inputs['Roughness'].default_value
-                                else:
-                                    roughness = False
-                            else:
-                                connected = False
-                                print(print_unconnected)
+    row = layout.row(align=True)
+    if parallel.running:
+        row.operator(AMTH_RENDER_OT_render_parallel_stop.bl_idname, icon="CANCEL")
+    else:
+        row.operator(parallel.bl_idname, icon="RENDER_ANIMATION").retry = False
+        if parallel.failed:
+            row.operator(parallel.bl_idname, icon="FILE_REFRESH",
+                         text="Retry %d Failed" % len(parallel.failed)).retry = True
+
+    if parallel.running:
+        col = layout.column(align=True)
+        for index, worker in enumerate(parallel.workers):
+            if worker:
+                col.label(text="Worker %d: frames %d-%d, %d/%d done%s" % (
+                    index + 1, worker["frames"][0], worker["frames"][-1],
+                    len(worker["saved"]), len(worker["frames"]),
+                    ", rendering %d" % worker["frame"] if worker["frame"] is not None else ""),
+                    icon="RENDER_RESULT")
+            else:
+                col.label(text="Worker %d: idle" % (index + 1), icon="BLANK1")
+        if parallel.queue:
+            col.label(text="%d chunks waiting" % len(parallel.queue), icon="TIME")
+
+    if parallel.failed:
+        layout.label(text="Failed frames: %s" % ', '.join(
+            str(frame) for frame in parallel.failed[:20]) +
+            (" ..." if len(parallel.failed) > 20 else ""), icon="ERROR")
+# // FEATURE: Parallel Render
+
+# FEATURE: Render Tiles
+def render_tiles_layout(scene, tiles_x, tiles_y, overlap):
+    """Canvas and tiles of a still split in tiles_x * tiles_y, within the
+    render border if any. Rectangles are (xmin, ymin, xmax, ymax) in pixels
+    of the frame, each tile gives its core and the rectangle rendered for it,
+    grown by overlap pixels"""
+    rd = scene.render
+    width = int(rd.resolution_x * rd.resolution_percentage / 100)
+    height = int(rd.resolution_y * rd.resolution_percentage / 100)
 
-                            if ma.name not in self.__class__.materials:
-                                self.__class__.materials.append('%s%s [%s] %s%s%s' % (
-                                    '[L] ' if ma.library else '',
-                                    ma.name, ma.users,
-                                    '[F]' if ma.use_fake_user else '',
-                                    ' - [%s]' % roughness if roughness else '',
-                                    ' * Output not connected' if not connected else ''))
+    if rd.use_border:
+        region = (int(rd.border_min_x * width), int(rd.border_min_y * height),
+                  int(rd.border_max_x * width), int(rd.border_max_y * height))
+    else:
+        region = (0, 0, width, height)
+    canvas = region if rd.use_border and rd.use_crop_to_border else \
+             (0, 0, width, height)
+
+    tiles_x = max(1, min(tiles_x, region[2] - region[0]))
+    tiles_y = max(1, min(tiles_y, region[3] - region[1]))
+    xs = [region[0] + (region[2] - region[0]) * i // tiles_x for i in range(tiles_x + 1)]
+    ys = [region[1] + (region[3] - region[1]) * j // tiles_y for j in range(tiles_y + 1)]
+
+    tiles = []
+    for j in range(tiles_y):
+        for i in range(tiles_x):
+            core = (xs[i], ys[j], xs[i + 1], ys[j + 1])
+            rect = (max(0, core[0] - overlap), max(0, core[1] - overlap),
+                    min(width, core[2] + overlap), min(height, core[3] + overlap))
+            tiles.append((core, rect, render_border_pixels(rect, width, height)))
+
+    return canvas, tiles_x, tiles
+
+def render_display_bytes(pixels, scene):
+    """Linear, premultiplied RGBA to 8-bit sRGB with straight alpha, using
+    the exposure and gamma of the scene view settings"""
+    import numpy as np
+
+    view = scene.view_settings
+    rgb = pixels[..., :3].astype(np.float32)
+    alpha = np.clip(pixels[..., 3:].astype(np.float32), 0.0, 1.0)
+
+    np.divide(rgb, alpha, out=rgb, where=alpha > 0.0)
+    rgb *= 2.0 ** view.exposure
+    np.clip(rgb, 0.0, 1.0, out=rgb)
+    rgb = np.where(rgb <= 0.0031308, rgb * 12.92, 1.055 * rgb ** (1.0 / 2.4) - 0.055)
+    if view.gamma != 1.0:
+        rgb **= 1.0 / view.gamma
+
+    display = np.empty(pixels.shape, dtype=np.uint8)
+    display[..., :3] = rgb * 255.0 + 0.5
+    display[..., 3:] = alpha * 255.0 + 0.5
+    return display
+
+def render_tiles_stitch(scene, tiles, canvas, output):
+    """Put the core of each rendered tile together in one image"""
+    import numpy as np
+
+    png = output.endswith(".png")
+    xmin, ymin, xmax, ymax = canvas
+    image = np.zeros((ymax - ymin, xmax - xmin, 4),
+                     dtype=np.uint8 if png else np.float16)
+
+    for tile in tiles:
+        pixels = exr_read(tile["job"]["output"])
+        rect = tile["rect"]
+        if pixels.shape[:2] != (rect[3] - rect[1], rect[2] - rect[0]):
+            raise ValueError("%s is not the size of its tile" % tile["job"]["output"])
+
+        x0, y0, x1, y1 = tile["core"]
+        core = pixels[y0 - rect[1]:y1 - rect[1], x0 - rect[0]:x1 - rect[0]]
+        image[y0 - ymin:y1 - ymin, x0 - xmin:x1 - xmin] = \
+            render_display_bytes(core, scene) if png else core
+
+    if png:
+        png_write(output, image)
+    else:
+        exr_write(output, image)
 
-                    elif no.type == 'GROUP':
-                        if no.node_tree:
-                            for nog in no.node_tree.nodes:
-                                if nog.type == node_type:
-                                    for ou in nog.outputs:
-                                        if ou.links:
-                                            connected = True
-                                            if nog.type in shaders_roughness:
-                                                roughness = 'R: %.4f' % nog.inputs['Roughness'].default_value
-                                            else:
-                                                roughness = False
-                                        else:
-                                            connected = False
-                                            print(print_unconnected)
+class AMTH_RENDER_OT_render_tiles(Operator):
+    '''Render the current frame in tiles, in several background Blender processes at once, then stitch them together'''
+    bl_idname = "render.amaranth_render_tiles"
+    bl_label = "Render Tiles"
 
-                                        if ma.name not in self.__class__.materials:
-                                            self.__class__.materials.append('%s%s%s [%s] %s%s%s' % (
-                                                '[L] ' if ma.library else '',
-                                                'Node Group:  %s%s  ->  ' % (
-                                                    '[L] ' if no.node_tree.library else '',
-                                                    no.node_tree.name),
-                                                ma.name, ma.users,
-                                                '[F]' if ma.use_fake_user else '',
-                                                ' - [%s]' % roughness if roughness else '',
-                                                ' * Output not connected' if not connected else ''))
+    tile = IntProperty(
+        name="Tile",
+        description="Render only this tile again, -1 to render all of them",
+        default=-1, min=-1)
 
-                    self.__class__.materials = sorted(list(set(self.__class__.materials)))
+    # One entry per tile: {"core", "rect", "job", "status", "process", "log"}
+    tiles = []
+    columns = 1
+    canvas = (0, 0, 0, 0)
+    output = ""
+    running = False
+    stop = False
 
-        if len(self.__class__.materials) == 0:
-            self.report({"INFO"}, "No materials with nodes type %s found" % node_type)
+    _timer = None
+
+    @classmethod
+    def poll(cls, context):
+        return not cls.running
+
+    def invoke(self, context, event):
+        import os
+
+        cls = self.__class__
+        scene = context.scene
+
+        if self.tile >= 0:
+            if self.tile >= len(cls.tiles):
+                self.report({'WARNING'}, "No such tile, render all tiles first")
+                return {'CANCELLED'}
+            cls.tiles[self.tile]["status"] = 'WAITING'
         else:
-            print("* A total of %d %s using %s was found \n" % (
-                    len(self.__class__.materials),
-                    "material" if len(self.__class__.materials) == 1 else "materials",
-                    node_type))
+            output = os.path.splitext(bpy.path.abspath(
+                scene.render.frame_path(frame=scene.frame_current)))[0]
+            tiledir = output + "_tiles"
+            if not os.path.isdir(tiledir):
+                os.makedirs(tiledir)
+
+            cls.output = output + (".png" if scene.amaranth_tiles_format == 'PNG' else ".exr")
+            cls.canvas, cls.columns, layout = render_tiles_layout(
+                scene, scene.amaranth_tiles_x, scene.amaranth_tiles_y,
+                scene.amaranth_tiles_overlap)
+            cls.tiles = []
+
+            for index, (core, rect, border) in enumerate(layout):
+                cls.tiles.append({
+                    "core": core, "rect": rect,
+                    "status": 'WAITING', "process": None, "log": None,
+                    "job": {
+                        "scene": scene.name,
+                        "frame": scene.frame_current,
+                        "border": border,
+                        "settings": {"render.use_sequencer": False},
+                        "output": os.path.join(tiledir, "tile_%03d.exr" % index),
+                        }})
+
+        self.workers = scene.amaranth_parallel_workers
+        threads = scene.amaranth_parallel_threads or \
+                  max(1, (os.cpu_count() or 1) // min(self.workers, len(cls.tiles)))
+        for tile in cls.tiles:
+            tile["job"]["settings"].update({"render.threads_mode": 'FIXED',
+                                            "render.threads": threads})
+        self.low_priority = scene.amaranth_tiles_priority == 'LOW'
+
+        self.filepath = blend_file_copy()
+        self.script = os.path.join(os.path.dirname(self.filepath), "render.py")
+        with open(self.script, 'w') as f:
+            f.write(render_jobs_script)
+
+        cls.running = True
+        cls.stop = False
+
+        print("\n* Rendering %d tiles, %d at a time with %d threads each\n" % (
+            sum(tile["status"] == 'WAITING' for tile in cls.tiles),
+            self.workers, threads))
+
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(0.5, context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def start(self, tile):
+        import json
+        import os
+        import subprocess
+
+        job = tile["job"]
+        for path in (job["output"], job["output"] + ".json"):
+            if os.path.isfile(path):
+                os.remove(path)
+
+        batch_path = job["output"] + ".job.json"
+        with open(batch_path, 'w') as f:
+            json.dump([job], f)
+
+        options = {}
+        if self.low_priority:
+            if os.name == 'nt':
+                options["creationflags"] = 0x00004000  # BELOW_NORMAL_PRIORITY_CLASS
+            else:
+                options["preexec_fn"] = lambda: os.nice(10)
 
-            count = 0
+        # Keep the output around, to find out why a tile failed
+        tile["log"] = open(job["output"] + ".log", 'w')
+        tile["process"] = subprocess.Popen(
+            background_blender_command(self.script, batch_path, self.filepath),
+            stdout=tile["log"], stderr=subprocess.STDOUT, **options)
+        tile["status"] = 'RENDERING'
 
-            for mat in self.__class__.materials:
-                print('%02d. %s' % (count+1, self.__class__.materials[count]))
-                count += 1
-            print("\n")
+    def modal(self, context, event):
+        import os
+
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        cls = self.__class__
+
+        for index, tile in enumerate(cls.tiles):
+            process = tile["process"]
+            if not process:
+                continue
+
+            if cls.stop and process.poll() is None:
+                process.terminate()
+
+            if process.poll() is not None:
+                tile["log"].close()
+                tile["process"] = tile["log"] = None
+                if process.returncode == 0 and \
+                   os.path.isfile(tile["job"]["output"] + ".json"):
+                    tile["status"] = 'DONE'
+                else:
+                    tile["status"] = 'FAILED'
+                    print("Tile %d failed, see %s" % (
+                        index, tile["job"]["output"] + ".log"))
+
+        rendering = sum(1 for tile in cls.tiles if tile["process"])
+        for tile in cls.tiles:
+            if rendering >= self.workers or cls.stop:
+                break
+            if tile["status"] == 'WAITING':
+                self.start(tile)
+                rendering += 1
+
+        for area in context.screen.areas:
+            if area.type == 'PROPERTIES':
+                area.tag_redraw()
+
+        if rendering:
+            return {'RUNNING_MODAL'}
+
+        import shutil
+
+        context.window_manager.event_timer_remove(self._timer)
+        shutil.rmtree(os.path.dirname(self.filepath), ignore_errors=True)
+        cls.running = False
+
+        for tile in cls.tiles:
+            if tile["status"] == 'WAITING':
+                tile["status"] = 'FAILED'
+
+        failed = sum(1 for tile in cls.tiles if tile["status"] == 'FAILED')
+        if failed:
+            self.report({'WARNING'}, "%d tiles failed, render them again "
+                                     "to finish the image" % failed)
+            return {'FINISHED'}
+
+        try:
+            render_tiles_stitch(context.scene, cls.tiles, cls.canvas, cls.output)
+        except (IOError, OSError, ValueError) as e:
+            self.report({'ERROR'}, "Could not stitch the tiles: %s" % e)
+            return {'CANCELLED'}
+
+        self.report({'INFO'}, "Saved %s" % cls.output)
+        return {'FINISHED'}
+
+class AMTH_RENDER_OT_render_tiles_stop(Operator):
+    '''Stop rendering tiles, unfinished tiles are counted as failed'''
+    bl_idname = "render.amaranth_render_tiles_stop"
+    bl_label = "Stop"
+
+    @classmethod
+    def poll(cls, context):
+        return AMTH_RENDER_OT_render_tiles.running
+
+    def execute(self, context):
+        AMTH_RENDER_OT_render_tiles.stop = True
+        return {'FINISHED'}
+
+def render_tiles_ui(self, context):
+    layout = self.layout
+    scene = context.scene
+    render_tiles = AMTH_RENDER_OT_render_tiles
+
+    row = layout.row(align=True)
+    row.prop(scene, "amaranth_tiles_x")
+    row.prop(scene, "amaranth_tiles_y")
+    row.prop(scene, "amaranth_tiles_overlap")
+
+    row = layout.row(align=True)
+    row.prop(scene, "amaranth_tiles_priority", text="")
+    row.prop(scene, "amaranth_tiles_format", text="")
+    if render_tiles.running:
+        row.operator(AMTH_RENDER_OT_render_tiles_stop.bl_idname, icon="CANCEL")
+    else:
+        row.operator(render_tiles.bl_idname, icon="RENDER_STILL").tile = -1
+
+    if not render_tiles.tiles:
+        return
+
+    icons = {'WAITING': "TIME", 'RENDERING': "RENDER_RESULT",
+             'DONE': "FILE_TICK", 'FAILED': "ERROR"}
+
+    # Top row first, as they appear in the image
+    col = layout.column(align=True)
+    columns = render_tiles.columns
+    for start in reversed(range(0, len(render_tiles.tiles), columns)):
+        row = col.row(align=True)
+        for index in range(start, start + columns):
+            status = render_tiles.tiles[index]["status"]
+            if status == 'FAILED' and not render_tiles.running:
+                row.operator(render_tiles.bl_idname, text="%d" % index,
+                             icon="FILE_REFRESH").tile = index
+            else:
+                row.label(text="%d" % index, icon=icons[status])
+
+    if not render_tiles.running and \
+       all(tile["status"] == 'DONE' for tile in render_tiles.tiles):
+        layout.label(text=render_tiles.output, icon="IMAGE_DATA")
+# // FEATURE: Render Tiles
+
+# FEATURE: Render Queue
+# A spool folder holds one <id>.job.json per submitted job, the daemon writes
+# <id>.state.json and <id>.log next to it, plus daemon.json while it runs
+render_queue_cache = {"time": 0.0, "jobs": [], "alive": False}
+
+# Runs in Blender's Python, standalone, after the source of
+# image_file_resolution() and render_chunk_arguments().
+# Arguments: spool folder, Blender binary, threads and memory (GB) budgets
+render_queue_script = '''
+import json, os, subprocess, sys, time
+
+spool, binary = sys.argv[1], sys.argv[2]
+threads_budget, memory_budget = int(sys.argv[3]), float(sys.argv[4])
+
+def json_read(path, default=None):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return default
+
+def json_write(path, data):
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(path + ".tmp", path)
+
+def frame_valid(path, resolution):
+    """Output is there, has the resolution it should and was not cut short"""
+    try:
+        if os.path.getsize(path) == 0:
+            return False
+        with open(path, "rb") as f:
+            f.seek(-12, 2)
+            tail = f.read()
+    except (IOError, OSError):
+        return False
+
+    found = image_file_resolution(path)
+    if found and list(found) != resolution:
+        return False
+    if path.lower().endswith(".png") and b"IEND" not in tail:
+        return False
+    if path.lower().endswith((".jpg", ".jpeg")) and not tail.endswith(b"\\xff\\xd9"):
+        return False
+    return True
+
+def frames_missing(job):
+    return [frame for frame, path in job["outputs"]
+            if not frame_valid(path, job["resolution"])]
+
+# Only one daemon per spool folder
+daemon = json_read(os.path.join(spool, "daemon.json"), {})
+if daemon.get("pid") != os.getpid() and time.time() - daemon.get("time", 0) < 10:
+    sys.exit(0)
+
+running = {}
+
+while not os.path.isfile(os.path.join(spool, "daemon.stop")):
+    json_write(os.path.join(spool, "daemon.json"),
+               {"pid": os.getpid(), "time": time.time()})
+
+    jobs = {}
+    for name in os.listdir(spool):
+        if name.endswith(".job.json"):
+            job = json_read(os.path.join(spool, name))
+            if job:
+                jobs[name[:-len(".job.json")]] = job
+
+    for job_id in list(running):
+        process, log, threads, memory = running[job_id]
+        if job_id not in jobs:
+            process.terminate()
+        elif process.poll() is None:
+            job = jobs[job_id]
+            json_write(os.path.join(spool, job_id + ".state.json"), {
+                "status": "RUNNING",
+                "done": sum(1 for frame, path in job["outputs"] if os.path.isfile(path)),
+                "frames": len(job["outputs"])})
+            continue
+
+        process.wait()
+        log.close()
+        del running[job_id]
+        if job_id in jobs:
+            missing = frames_missing(jobs[job_id])
+            json_write(os.path.join(spool, job_id + ".state.json"), {
+                "status": "FAILED" if missing else "DONE",
+                "done": len(jobs[job_id]["outputs"]) - len(missing),
+                "frames": len(jobs[job_id]["outputs"]),
+                "missing": missing})
+
+    threads_used = sum(entry[2] for entry in running.values())
+    memory_used = sum(entry[3] for entry in running.values())
+
+    for job_id in sorted(jobs, key=lambda job_id: jobs[job_id]["submitted"]):
+        state = json_read(os.path.join(spool, job_id + ".state.json"), {})
+        if job_id in running or state.get("status") in {"DONE", "FAILED"}:
+            continue
+
+        # Resume, frames rendered before a crash or reboot are not done again
+        job = jobs[job_id]
+        missing = frames_missing(job)
+        if not missing:
+            json_write(os.path.join(spool, job_id + ".state.json"), {
+                "status": "DONE", "done": len(job["outputs"]),
+                "frames": len(job["outputs"])})
+            continue
+
+        threads = min(job["threads"] or threads_budget, threads_budget)
+        if running and (threads_used + threads > threads_budget or
+                        memory_budget and memory_used + job["memory"] > memory_budget):
+            continue
+
+        command = [binary, "-b", job["blend"], "-S", job["scene"],
+                   "-o", job["output"], "-t", str(threads)]
+        if job["profile"]:
+            command += ["--python", os.path.join(spool, "profile.py")]
+        command += render_chunk_arguments(missing)
+        if job["profile"]:
+            command += ["--", job["profile"]]
+
+        log = open(os.path.join(spool, job_id + ".log"), "a")
+        running[job_id] = (subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT),
+                           log, threads, job["memory"])
+        threads_used += threads
+        memory_used += job["memory"]
+        json_write(os.path.join(spool, job_id + ".state.json"), {
+            "status": "RUNNING", "done": len(job["outputs"]) - len(missing),
+            "frames": len(job["outputs"])})
+
+    time.sleep(2)
+
+# Stopped, unfinished jobs resume next time
+for job_id, (process, log, threads, memory) in running.items():
+    process.terminate()
+    process.wait()
+    log.close()
+    json_write(os.path.join(spool, job_id + ".state.json"), {"status": "QUEUED"})
+for name in ("daemon.stop", "daemon.json"):
+    try:
+        os.remove(os.path.join(spool, name))
+    except OSError:
+        pass
+'''
+
+# Sets the render profile of a queued job, before its frames are rendered.
+# ADDON, the module name of Amaranth, is written before it. The background
+# Blender may not have Amaranth enabled in its preferences, and the profile
+# needs its property and render handlers: quit without rendering if they
+# can't be had, so the job fails instead of rendering without its profile
+render_queue_profile_script = '''
+import addon_utils, bpy, sys
+
+if not hasattr(bpy.types.Scene, "amaranth_render_profile"):
+    addon_utils.enable(ADDON, default_set=False)
+
+try:
+    bpy.context.scene.amaranth_render_profile = sys.argv[sys.argv.index("--") + 1]
+except AttributeError as e:
+    print("Amaranth: could not set the render profile (%s)" % e)
+    sys.exit(1)
+'''
+
+def render_queue_path():
+    import os
+    import tempfile
+
+    preferences = bpy.context.user_preferences.addons[__name__].preferences
+    if preferences.render_queue_path:
+        return bpy.path.abspath(preferences.render_queue_path)
+    return os.path.join(tempfile.gettempdir(), "amaranth_render_queue")
+
+def render_queue_jobs():
+    """[(job id, job, state)] in the order they were submitted and whether
+    the daemon is running, read from the spool at most every two seconds"""
+    import json
+    import os
+    import time
+
+    if time.time() - render_queue_cache["time"] < 2.0:
+        return render_queue_cache["jobs"], render_queue_cache["alive"]
+
+    def read(path, default=None):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return default
+
+    spool = render_queue_path()
+    jobs = []
+    if os.path.isdir(spool):
+        for name in os.listdir(spool):
+            if name.endswith(".job.json"):
+                job_id = name[:-len(".job.json")]
+                job = read(os.path.join(spool, name))
+                if job:
+                    state = read(os.path.join(spool, job_id + ".state.json"),
+                                 {"status": "QUEUED"})
+                    jobs.append((job_id, job, state))
+    jobs.sort(key=lambda entry: entry[1]["submitted"])
+
+    daemon = read(os.path.join(spool, "daemon.json"), {})
+    render_queue_cache.update({
+        "time": time.time(), "jobs": jobs,
+        "alive": time.time() - daemon.get("time", 0) < 10})
+    return jobs, render_queue_cache["alive"]
+
+def render_queue_refresh():
+    render_queue_cache["time"] = 0.0
+
+class AMTH_RENDER_OT_queue_submit(Operator):
+    '''Add the animation of this scene to the local render queue, rendered from a copy of the file'''
+    bl_idname = "render.amaranth_queue_submit"
+    bl_label = "Submit to Queue"
+
+    threads = IntProperty(
+        name="Threads",
+        description="Threads the job uses, 0 for the whole queue budget",
+        default=0, min=0, max=256)
+
+    memory = FloatProperty(
+        name="Memory (GB)",
+        description="Memory the job needs, other jobs only start next to it "
+                    "while the total stays within the queue budget",
+        default=0.0, min=0.0)
+
+    @classmethod
+    def poll(cls, context):
+        return not context.scene.render.is_movie_format
+
+    def invoke(self, context, event):
+        # Guess from the logged renders of this scene, if any
+        frames = render_log_shot(render_log_records(), bpy.data.filepath,
+                                 context.scene.name)
+        peaks = [runs[-1].get("peak_memory", 0.0) for runs in frames.values()]
+        if peaks:
+            self.memory = round(max(peaks) / 1024.0, 1)
+        return context.window_manager.invoke_props_dialog(self)
+
+    def execute(self, context):
+        import json
+        import os
+        import time
+
+        scene = context.scene
+        rd = scene.render
+        spool = render_queue_path()
+        if not os.path.isdir(spool):
+            os.makedirs(spool)
+
+        job_id = "%s_%s" % (time.strftime("%Y%m%d_%H%M%S"),
+                            bpy.path.clean_name(scene.name))
+        blend = os.path.join(spool, job_id + ".blend")
+        blend_file_copy(blend)
+
+        width = int(rd.resolution_x * rd.resolution_percentage / 100)
+        height = int(rd.resolution_y * rd.resolution_percentage / 100)
+        if rd.use_border and rd.use_crop_to_border:
+            width = int(rd.border_max_x * width) - int(rd.border_min_x * width)
+            height = int(rd.border_max_y * height) - int(rd.border_min_y * height)
+
+        frames = range(scene.frame_start, scene.frame_end + 1, scene.frame_step)
+        job = {
+            "blend": blend,
+            "scene": scene.name,
+            "output": bpy.path.abspath(rd.filepath),
+            "outputs": [[frame, bpy.path.abspath(rd.frame_path(frame=frame))]
+                        for frame in frames],
+            "resolution": [width, height],
+            "profile": scene.amaranth_render_profile,
+            "threads": self.threads,
+            "memory": self.memory,
+            "submitted": time.time(),
+            }
+
+        path = os.path.join(spool, job_id + ".job.json")
+        with open(path + ".tmp", 'w') as f:
+            json.dump(job, f, indent=1)
+        os.replace(path + ".tmp", path)
+        render_queue_refresh()
+
+        self.report({'INFO'}, "Submitted %s, %d frames" % (job_id, len(frames)))
+        return {'FINISHED'}
+
+class AMTH_RENDER_OT_queue_start(Operator):
+    '''Start the render queue in the background, it keeps running after Blender is closed'''
+    bl_idname = "render.amaranth_queue_start"
+    bl_label = "Start Queue"
+
+    def execute(self, context):
+        import inspect
+        import os
+        import subprocess
+
+        preferences = context.user_preferences.addons[__name__].preferences
+        spool = render_queue_path()
+        if not os.path.isdir(spool):
+            os.makedirs(spool)
+
+        # Left behind by a daemon that didn't get to clean up, it would stop
+        # the new one straight away
+        stop = os.path.join(spool, "daemon.stop")
+        if os.path.isfile(stop):
+            os.remove(stop)
+
+        script = os.path.join(spool, "daemon.py")
+        with open(script, 'w') as f:
+            f.write(inspect.getsource(image_file_resolution))
+            f.write(inspect.getsource(render_chunk_arguments))
+            f.write(render_queue_script)
+        with open(os.path.join(spool, "profile.py"), 'w') as f:
+            f.write("ADDON = %r\n" % __name__)
+            f.write(render_queue_profile_script)
+
+        # Detached, so closing Blender leaves it running
+        options = {}
+        if os.name == 'nt':
+            options["creationflags"] = 0x00000008  # DETACHED_PROCESS
+        else:
+            options["start_new_session"] = True
+
+        subprocess.Popen(
+            [bpy.app.binary_path_python, script, spool, bpy.app.binary_path,
+             str(preferences.render_queue_threads or os.cpu_count() or 1),
+             str(preferences.render_queue_memory)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **options)
+        render_queue_refresh()
+        return {'FINISHED'}
+
+class AMTH_RENDER_OT_queue_stop(Operator):
+    '''Stop the render queue, unfinished jobs carry on from their last valid frame next time'''
+    bl_idname = "render.amaranth_queue_stop"
+    bl_label = "Stop Queue"
+
+    def execute(self, context):
+        import os
+
+        open(os.path.join(render_queue_path(), "daemon.stop"), 'w').close()
+        render_queue_refresh()
+        return {'FINISHED'}
+
+class AMTH_RENDER_OT_queue_remove(Operator):
+    '''Remove the job from the queue, stopping it if rendering. Rendered frames are kept'''
+    bl_idname = "render.amaranth_queue_remove"
+    bl_label = "Remove Job"
+
+    job = StringProperty()
+
+    def execute(self, context):
+        import os
+
+        spool = render_queue_path()
+        for extension in (".job.json", ".state.json", ".blend"):
+            path = os.path.join(spool, self.job + extension)
+            if os.path.isfile(path):
+                os.remove(path)
+        render_queue_refresh()
+        return {'FINISHED'}
+
+class AMTH_RENDER_OT_queue_retry(Operator):
+    '''Queue the frames of this job that are missing or invalid again'''
+    bl_idname = "render.amaranth_queue_retry"
+    bl_label = "Retry Job"
+
+    job = StringProperty()
+
+    def execute(self, context):
+        import os
+
+        path = os.path.join(render_queue_path(), self.job + ".state.json")
+        if os.path.isfile(path):
+            os.remove(path)
+        render_queue_refresh()
+        return {'FINISHED'}
+
+def render_queue_ui(self, context):
+    layout = self.layout
+    jobs, alive = render_queue_jobs()
+
+    row = layout.row(align=True)
+    row.operator(AMTH_RENDER_OT_queue_submit.bl_idname, icon="SEQ_SEQUENCER")
+    if alive:
+        row.operator(AMTH_RENDER_OT_queue_stop.bl_idname, icon="PAUSE")
+    else:
+        row.operator(AMTH_RENDER_OT_queue_start.bl_idname, icon="PLAY")
+
+    icons = {"QUEUED": "TIME", "RUNNING": "RENDER_ANIMATION",
+             "DONE": "FILE_TICK", "FAILED": "ERROR"}
+
+    col = layout.column(align=True)
+    for job_id, job, state in jobs:
+        row = col.row(align=True)
+        row.label(text="%s: %d/%d frames" % (
+            job_id, state.get("done", 0), len(job["outputs"])),
+            icon=icons.get(state["status"], "TIME"))
+        if state["status"] == "FAILED":
+            row.operator(AMTH_RENDER_OT_queue_retry.bl_idname, text="",
+                         icon="FILE_REFRESH").job = job_id
+        row.operator(AMTH_RENDER_OT_queue_remove.bl_idname, text="",
+                     icon="X").job = job_id
+# // FEATURE: Render Queue
+
+# FEATURE: Render Changed Frames
+# Hashes of the rendered frames go in a JSON file next to them, by file name
+render_skip_sidecar = "amaranth_frame_hashes.json"
+
+# Frames still to render, by scene: {"frames": {frame: (path, hash)},
+# "stale": {frame: old output moved aside}, "last": frame,
+# "overwrite": use_overwrite before}
+render_skip_pending = {}
+
+# Suffix of old outputs, kept until the frame is rendered again
+render_skip_stale = ".stale"
+
+# Modifiers whose result changes every frame, with no animation to tell
+render_skip_frame_modifiers = {'CLOTH', 'SOFT_BODY', 'FLUID_SIMULATION', 'SMOKE',
+                               'DYNAMIC_PAINT', 'OCEAN', 'PARTICLE_SYSTEM',
+                               'EXPLODE', 'WAVE', 'BUILD'}
+
+# Render settings we change ourselves, or that only say where frames go
+render_skip_render_ignore = {"use_overwrite", "use_placeholder", "filepath"}
+
+# Object properties hashed on each frame, hashed on their own, or that only
+# change the viewport: transforms, selection and display
+render_skip_object_ignore = {p.identifier for p in bpy.types.ID.bl_rna.properties} | {
+    p.identifier for p in bpy.types.Object.bl_rna.properties
+    if p.identifier.startswith(("show_", "matrix_", "delta_", "rotation_",
+                                "empty_draw", "lock_"))} | {
+    "location", "scale", "dimensions", "bound_box", "hide_render", "select",
+    "hide", "hide_select", "mode", "draw_type", "draw_bounds_type", "color",
+    "active_material", "active_material_index", "active_shape_key_index",
+    "data", "modifiers", "material_slots", "dupli_group", "dupli_type",
+    "animation_data"}
+
+def render_skip_collections(scene):
+    """Scene objects, then the objects of each group instanced in it"""
+    collections = [scene.objects]
+    groups = set()
+    for objects in collections:
+        for ob in objects:
+            if ob.dupli_type == 'GROUP' and ob.dupli_group and \
+               ob.dupli_group not in groups:
+                groups.add(ob.dupli_group)
+                collections.append(ob.dupli_group.objects)
+    return collections
+
+def render_skip_static_hash(scene, objects):
+    """Hash of what can change a render but is the same on every frame"""
+    import os
+
+    cache = {}
+    meshes = {}
+    signature = []
+
+    for ob in objects:
+        data = ob.data
+        if ob.type == 'MESH':
+            if data not in meshes:
+                meshes[data] = mesh_hash(data)
+            data_hash = meshes[data]
+        elif ob.type == 'LAMP':
+            data_hash = lamp_hash(data, cache)
+        elif ob.type in {'CURVE', 'SURFACE'}:
+            data_hash = curve_hash(data)
+        else:
+            data_hash = rna_signature(data, depth=1) if data else None
+
+        # Layers, ray visibility and pass index, the keyed ones are hashed
+        # on each frame
+        animated = {fcu.data_path for fcu in idblock_fcurves(ob)}
+        signature.append((
+            ob.name, ob.type, data_hash,
+            rna_signature(ob, render_skip_object_ignore | animated, depth=1),
+            [rna_signature(md, depth=0) for md in ob.modifiers],
+            [material_hash(slot.material, cache)
+             for slot in ob.material_slots if slot.material],
+            ob.dupli_type, ob.dupli_group.name if ob.dupli_group else None))
+
+    world = scene.world
+    if world:
+        signature.append((
+            rna_signature(world, lamp_hash_ignore, depth=1),
+            node_tree_hash(world.node_tree, cache)
+                if world.use_nodes and world.node_tree else None))
+
+    # Repainted or replaced textures
+    for im in bpy.data.images:
+        if im.users and im.source == 'FILE' and not im.packed_file:
+            try:
+                mtime = os.path.getmtime(bpy.path.abspath(im.filepath, library=im.library))
+            except OSError:
+                mtime = None
+            signature.append((im.name, im.filepath, mtime))
+
+    profile = scene.amaranth_render_profile
+    signature.append((
+        tuple(scene.layers),
+        rna_signature(scene.render, render_skip_render_ignore, depth=1),
+        rna_signature(scene.cycles, depth=0) if cycles_exists else None,
+        rna_signature(scene.view_settings, depth=1),
+        profile, render_profiles(scene).get(profile) if profile else None))
+
+    return signature_hash(tuple(signature))
+
+def render_skip_frame_dependent(scene, objects):
+    """Whether the scene changes every frame in ways animation doesn't
+    show: simulations, image sequences, movies or the noise seed"""
+    if cycles_exists and scene.cycles.use_animated_seed:
+        return True
+    if scene.render.use_sequencer and scene.sequence_editor and \
+       scene.sequence_editor.sequences_all:
+        return True
+    if any(im.users and im.source in {'SEQUENCE', 'MOVIE'} for im in bpy.data.images):
+        return True
+    return any(md.type in render_skip_frame_modifiers
+               for ob in objects for md in ob.modifiers)
+
+def render_skip_animated_paths(scene, objects):
+    """(datablock, data path, index) of every animated or driven property
+    of the scene and what it uses"""
+    ids = [scene, scene.world] + list(objects)
+    for ob in objects:
+        ids.append(ob.data)
+        ids.append(getattr(ob.data, "shape_keys", None))
+        ids.extend(slot.material for slot in ob.material_slots)
+    ids += [getattr(idblock, "node_tree", None) for idblock in list(ids)]
+    ids += list(bpy.data.node_groups)
+
+    paths = []
+    for idblock in set(idblock for idblock in ids if idblock):
+        for fcu in idblock_fcurves(idblock):
+            try:
+                idblock.path_resolve(fcu.data_path)
+            except ValueError:
+                continue
+            paths.append((idblock, fcu.data_path, fcu.array_index))
+    return paths
+
+def render_skip_frame_hash(scene, collections, static, paths, frame_dependent):
+    """Hash of the scene at the current frame. Transforms are read in bulk
+    for all objects at once, pose bones for all bones of each armature"""
+    import hashlib
+    import numpy as np
+
+    sha1 = hashlib.sha1(static.encode('utf-8'))
+    if frame_dependent:
+        sha1.update(str(scene.frame_current).encode('utf-8'))
+    sha1.update(repr(scene.camera.name if scene.camera else None).encode('utf-8'))
+
+    for objects in collections:
+        matrices = np.zeros(len(objects) * 16, dtype=np.float32)
+        objects.foreach_get("matrix_world", matrices)
+        hidden = np.zeros(len(objects), dtype=np.int32)
+        objects.foreach_get("hide_render", hidden)
+        sha1.update(np.round(matrices, 5).tobytes())
+        sha1.update(hidden.tobytes())
+
+        for ob in objects:
+            if ob.type == 'ARMATURE' and ob.pose:
+                bones = np.zeros(len(ob.pose.bones) * 16, dtype=np.float32)
+                ob.pose.bones.foreach_get("matrix", bones)
+                sha1.update(np.round(bones, 5).tobytes())
+
+    values = []
+    for idblock, data_path, index in paths:
+        value = idblock.path_resolve(data_path)
+        if hasattr(value, "__len__") and not isinstance(value, str):
+            value = value[index] if index < len(value) else None
+        values.append(rna_round(value))
+    sha1.update(repr(values).encode('utf-8'))
+
+    return sha1.hexdigest()
+
+def render_skip_hashes(path):
+    """{file name: hash} of the frames rendered in the folder of path"""
+    import json
+    import os
+
+    try:
+        with open(os.path.join(os.path.dirname(path), render_skip_sidecar)) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+def render_skip_store(path, frame_hash):
+    import json
+    import os
+
+    hashes = render_skip_hashes(path)
+    hashes[os.path.basename(path)] = frame_hash
+    sidecar = os.path.join(os.path.dirname(path), render_skip_sidecar)
+    with open(sidecar + ".tmp", 'w') as f:
+        json.dump(hashes, f, indent=1, sort_keys=True)
+    os.replace(sidecar + ".tmp", sidecar)
+
+def render_skip_saved(pending, frame):
+    """Store the hashes of the frames up to frame saved since last time,
+    and delete the old outputs they replace"""
+    import os
+
+    for done in [done for done in pending["frames"] if done <= frame]:
+        path, frame_hash = pending["frames"][done]
+        if not os.path.isfile(path):
+            continue
+        render_skip_store(path, frame_hash)
+        del pending["frames"][done]
+        stale = pending["stale"].pop(done, None)
+        if stale:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+@persistent
+def render_skip_render_post(scene):
+    pending = render_skip_pending.get(scene.name)
+    if not pending:
+        return
+
+    # The current frame is saved after render_post, the ones before it are
+    frame = scene.frame_current
+    render_skip_saved(pending, frame - 1)
+
+    # Without render_complete, the last frame to render ends it
+    if not hasattr(bpy.app.handlers, "render_complete") and frame >= pending["last"]:
+        render_skip_render_complete(scene)
+
+@persistent
+def render_skip_render_complete(scene):
+    import os
+
+    pending = render_skip_pending.pop(scene.name, None)
+    if not pending:
+        return
+
+    scene.render.use_overwrite = pending["overwrite"]
+    render_skip_saved(pending, pending["last"])
+
+    # Cancelled, the old outputs of frames not rendered again go back
+    for frame, stale in pending["stale"].items():
+        path = pending["frames"][frame][0]
+        try:
+            if os.path.isfile(path):
+                os.remove(stale)
+            else:
+                os.replace(stale, path)
+        except OSError as e:
+            print("Render Changed Frames: could not restore %s (%s)" % (path, e))
+
+class AMTH_RENDER_OT_render_changed_frames(Operator):
+    '''Render the animation, skipping frames where nothing changed since they were last rendered this way'''
+    bl_idname = "render.amaranth_render_changed_frames"
+    bl_label = "Render Changed Frames"
+
+    @classmethod
+    def poll(cls, context):
+        return not context.scene.render.is_movie_format and \
+               context.scene.name not in render_skip_pending
+
+    def execute(self, context):
+        import os
+        import time
+
+        scene = context.scene
+        start = time.time()
+
+        collections = render_skip_collections(scene)
+        objects = [ob for objects in collections for ob in objects]
+        static = render_skip_static_hash(scene, objects)
+        paths = render_skip_animated_paths(scene, objects)
+        frame_dependent = render_skip_frame_dependent(scene, objects)
+
+        frame_current = scene.frame_current
+        frames = {}
+        stale = {}
+        unchanged = 0
+        for frame in range(scene.frame_start, scene.frame_end + 1, scene.frame_step):
+            scene.frame_set(frame)
+            frame_hash = render_skip_frame_hash(
+                scene, collections, static, paths, frame_dependent)
+            path = bpy.path.abspath(scene.render.frame_path(frame=frame))
+
+            if os.path.isfile(path) and os.path.getsize(path) and \
+               render_skip_hashes(path).get(os.path.basename(path)) == frame_hash:
+                unchanged += 1
+                continue
+
+            # Stale output, out of the way so it renders again
+            if os.path.isfile(path):
+                os.replace(path, path + render_skip_stale)
+                stale[frame] = path + render_skip_stale
+            frames[frame] = (path, frame_hash)
+        scene.frame_set(frame_current)
+
+        print("\n* Scene hashed in %.2f seconds, %d frames changed, %d unchanged\n" % (
+            time.time() - start, len(frames), unchanged))
+
+        if not frames:
+            self.report({'INFO'}, "Nothing changed in the %d frames" % unchanged)
+            return {'FINISHED'}
+
+        render_skip_pending[scene.name] = {
+            "frames": frames, "stale": stale, "last": max(frames),
+            "overwrite": scene.render.use_overwrite}
+        scene.render.use_overwrite = False
+
+        self.report({'INFO'}, "Rendering %d changed frames, skipping %d" % (
+            len(frames), unchanged))
+        bpy.ops.render.render('INVOKE_DEFAULT', animation=True)
+        return {'FINISHED'}
+
+def render_changed_frames_ui(self, context):
+    layout = self.layout
+    layout.operator(AMTH_RENDER_OT_render_changed_frames.bl_idname,
+                    icon="RENDER_ANIMATION")
+# // FEATURE: Render Changed Frames
+
+# FEATURE: Patch Render
+# Objects with something to render, bounding boxes of anything else mean little
+patch_render_types = {'MESH', 'CURVE', 'SURFACE', 'META', 'FONT'}
+
+# Formats losing a little more every time a frame is patched and saved again,
+# or whose layers and passes are not all saved back
+patch_render_refused = {'JPEG', 'JPEG2000', 'OPEN_EXR_MULTILAYER'}
+
+def objects_bounds_instances(objects):
+    """(object, world matrix) of objects with geometry, and of the objects
+    in the groups they instance, nested groups included"""
+    from mathutils import Matrix
+
+    instances = []
+    stack = [(ob, ob.matrix_world, 0) for ob in objects]
+    while stack:
+        ob, matrix, depth = stack.pop()
+        if ob.dupli_type == 'GROUP' and ob.dupli_group and depth < 8:
+            offset = matrix * Matrix.Translation(-ob.dupli_group.dupli_offset)
+            for child in ob.dupli_group.objects:
+                stack.append((child, offset * child.matrix_world, depth + 1))
+        elif ob.type in patch_render_types:
+            instances.append((ob, matrix))
+    return instances
+
+def objects_camera_rect(scene, objects, padding):
+    """Rectangle in pixels (xmin, ymin, xmax, ymax) covered by the bounding
+    boxes of objects in the camera view at the current frame, grown by
+    padding and clamped to the frame. None if they are out of view"""
+    import math
+    import numpy as np
+
+    rd = scene.render
+    width = int(rd.resolution_x * rd.resolution_percentage / 100)
+    height = int(rd.resolution_y * rd.resolution_percentage / 100)
+
+    corners = []
+    for ob, matrix in objects_bounds_instances(objects):
+        matrix = np.array(matrix, dtype=np.float64)
+        corners.append(np.dot(np.array(ob.bound_box, dtype=np.float64),
+                              matrix[:3, :3].T) + matrix[:3, 3])
+    if not corners:
+        return None
+
+    # Corners in camera space, the camera looks down -Z
+    camera = scene.camera
+    view = np.array(camera.matrix_world.normalized().inverted(), dtype=np.float64)
+    points = np.dot(np.concatenate(corners), view[:3, :3].T) + view[:3, 3]
+    frame = np.array([tuple(v) for v in camera.data.view_frame(scene=scene)])
+
+    if camera.data.type == 'ORTHO':
+        xy = points[:, :2]
+    else:
+        depth = -points[:, 2]
+        near = camera.data.clip_start
+        if (depth <= near).all():
+            return None
+        # Crossing the camera plane, can't project it
+        if (depth <= near).any():
+            return (0, 0, width, height)
+        xy = points[:, :2] * (-frame[0, 2] / depth)[:, np.newaxis]
+
+    low = frame[:, :2].min(axis=0)
+    high = frame[:, :2].max(axis=0)
+    view_min = (xy.min(axis=0) - low) / (high - low)
+    view_max = (xy.max(axis=0) - low) / (high - low)
+
+    rect = (max(0, int(math.floor(view_min[0] * width)) - padding),
+            max(0, int(math.floor(view_min[1] * height)) - padding),
+            min(width, int(math.ceil(view_max[0] * width)) + padding),
+            min(height, int(math.ceil(view_max[1] * height)) + padding))
+    if rect[0] >= rect[2] or rect[1] >= rect[3]:
+        return None
+    return rect
+
+def rect_union(a, b):
+    if a is None or b is None:
+        return a or b
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+class AMTH_RENDER_OT_render_patches(Operator):
+    '''Render again only the part of each frame covered by the selected objects, and paste it over the frames already rendered'''
+    bl_idname = "render.amaranth_render_patches"
+    bl_label = "Render Patches"
+
+    running = False
+
+    _timer = None
+
+    @classmethod
+    def poll(cls, context):
+        return not cls.running and context.scene.camera and \
+               not context.scene.render.is_movie_format and \
+               context.selected_objects
+
+    def invoke(self, context, event):
+        import math
+        import os
+        import tempfile
+
+        scene = context.scene
+        rd = scene.render
+        if rd.image_settings.file_format in patch_render_refused:
+            self.report({'WARNING'}, "Patching %s frames would lose quality or "
+                        "passes, use PNG, TIFF or single layer EXR" %
+                        rd.image_settings.file_format)
+            return {'CANCELLED'}
+
+        objects = context.selected_objects
+        padding = scene.amaranth_patch_padding
+        width = int(rd.resolution_x * rd.resolution_percentage / 100)
+        height = int(rd.resolution_y * rd.resolution_percentage / 100)
+
+        settings = {"render.use_sequencer": False}
+        self.tempdir = tempfile.mkdtemp(prefix="amaranth_")
+        self.patches = []
+        skipped = 0
+
+        frame_current = scene.frame_current
+        for frame in range(scene.frame_start, scene.frame_end + 1, scene.frame_step):
+            path = bpy.path.abspath(rd.frame_path(frame=frame))
+            job = {"scene": scene.name, "frame": frame, "settings": settings,
+                   "keep_format": True,
+                   "output": os.path.join(self.tempdir, "%06d%s" % (
+                       frame, os.path.splitext(path)[1]))}
+
+            # Nothing to patch, the whole frame renders
+            if image_file_resolution(path) != (width, height):
+                job["border"] = [0.0, 0.0, 1.0, 1.0]
+                self.patches.append((path, None, job))
+                continue
+
+            # Where the objects are over the shutter time
+            rect = None
+            subframes = (-0.5 * rd.motion_blur_shutter, 0.0, 0.5 * rd.motion_blur_shutter) \
+                        if rd.use_motion_blur else (0.0,)
+            for subframe in subframes:
+                scene.frame_set(int(math.floor(frame + subframe)),
+                                frame + subframe - math.floor(frame + subframe))
+                rect = rect_union(rect, objects_camera_rect(scene, objects, padding))
+
+            if rect is None:
+                skipped += 1
+                continue
+            job["border"] = render_border_pixels(rect, width, height)
+            job["patch"] = {"into": path, "rect": rect}
+            self.patches.append((path, rect, job))
+        scene.frame_set(frame_current)
+
+        if not self.patches:
+            self.report({'INFO'}, "The selected objects are not in view in any frame")
+            return {'CANCELLED'}
+
+        pixels = sum((rect[2] - rect[0]) * (rect[3] - rect[1]) if rect else width * height
+                     for path, rect, job in self.patches)
+        print("\n* Rendering %d patches, %.1f%% of the pixels of the shot, "
+              "%d frames left as they are\n" % (
+              len(self.patches), 100.0 * pixels / (width * height * (len(self.patches) + skipped)),
+              skipped))
+
+        self.filepath = blend_file_copy()
+        self.thread = background_blender_thread(
+            render_jobs_script, [job for path, rect, job in self.patches],
+            scene.amaranth_parallel_workers, self.filepath)
+        self.__class__.running = True
+
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(0.5, context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+        if self.thread.is_alive():
+            return {'RUNNING_MODAL'}
+
+        import json
+        import os
+        import shutil
+
+        context.window_manager.event_timer_remove(self._timer)
+        self.__class__.running = False
+
+        failed = []
+        for path, rect, job in self.patches:
+            if not os.path.isfile(job["output"] + ".json"):
+                failed.append(job["frame"])
+                continue
+            with open(job["output"] + ".json") as f:
+                error = json.load(f).get("error")
+            if error:
+                print("Frame %d: %s" % (job["frame"], error))
+                failed.append(job["frame"])
+                continue
+            try:
+                # Composited by the workers, only moved in place here
+                if rect is None:
+                    if not os.path.isdir(os.path.dirname(path)):
+                        os.makedirs(os.path.dirname(path))
+                    shutil.move(job["output"], path)
+                else:
+                    shutil.move(job["output"] + ".patched", path)
+            except (IOError, OSError) as e:
+                print("Frame %d: %s" % (job["frame"], e))
+                failed.append(job["frame"])
+
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+        shutil.rmtree(os.path.dirname(self.filepath), ignore_errors=True)
+
+        if failed:
+            self.report({'WARNING'}, "Frames failed: %s" % ', '.join(
+                str(frame) for frame in failed))
+        else:
+            self.report({'INFO'}, "Patched %d frames" % len(self.patches))
+        return {'FINISHED'}
+
+def render_patches_ui(self, context):
+    layout = self.layout
+    row = layout.row(align=True)
+    row.operator(AMTH_RENDER_OT_render_patches.bl_idname, icon="RENDER_REGION",
+                 text="Rendering Patches..." if AMTH_RENDER_OT_render_patches.running
+                      else "Render Patches of Selected")
+    row.prop(context.scene, "amaranth_patch_padding")
+# // FEATURE: Patch Render
+
+# FEATURE: Shader Nodes Extra Info
+def node_shader_extra(self, context):
+
+    if context.space_data.tree_type == 'ShaderNodeTree':
+        ob = context.active_object
+        snode = context.space_data
+        layout = self.layout
+
+        if ob and snode.shader_type != 'WORLD':
+            if ob.type == 'LAMP':
+                layout.label(text="%s" % ob.name,
+                             icon="LAMP_%s" % ob.data.type)        
+            else:
+                layout.label(text="%s" % ob.name,
+                             icon="OUTLINER_DATA_%s" % ob.type)
+             
+
+# // FEATURE: Shader Nodes Extra Info
+
+# FEATURE: Scene Debug
+class AMTH_SCENE_OT_cycles_shader_list_nodes(Operator):
+    """List Cycles materials containing a specific shader"""
+    bl_idname = "scene.cycles_list_nodes"
+    bl_label = "List Materials"
+    materials = []
+
+    @classmethod
+    def poll(cls, context):
+        return cycles_exists and context.scene.render.engine == 'CYCLES'
+
+    def execute(self, context):
+        node_type = context.scene.amaranth_cycles_node_types
+        roughness = False
+        self.__class__.materials = []
+        shaders_roughness = ['BSDF_GLOSSY','BSDF_DIFFUSE','BSDF_GLASS']
+
+        print("\n=== Cycles Shader Type: %s === \n" % node_type)
+
+        for ma in bpy.data.materials:
+            if ma.node_tree:
+                nodes = ma.node_tree.nodes
+                
+                print_unconnected = ('Note: \nOutput from "%s" node' % node_type,
+                                        'in material "%s"' % ma.name, 'not connected\n')
+
+                for no in nodes:
+                    if no.type == node_type:
+                        for ou in no.outputs:
+                            if ou.links:
+                                connected = True
+                                if no.type in shaders_roughness:
+                                    roughness = 'R: %.4f' % no.inputs['Roughness'].default_value
+                                else:
+                                    roughness = False
+                            else:
+                                connected = False
+                                print(print_unconnected)
+
+                            if ma.name not in self.__class__.materials:
+                                self.__class__.materials.append('%s%s [%s] %s%s%s' % (
+                                    '[L] ' if ma.library else '',
+                                    ma.name, ma.users,
+                                    '[F]' if ma.use_fake_user else '',
+                                    ' - [%s]' % roughness if roughness else '',
+                                    ' * Output not connected' if not connected else ''))
+
+                    elif no.type == 'GROUP':
+                        if no.node_tree:
+                            for nog in no.node_tree.nodes:
+                                if nog.type == node_type:
+                                    for ou in nog.outputs:
+                                        if ou.links:
+                                            connected = True
+                                            if nog.type in shaders_roughness:
+                                                roughness = 'R: %.4f' % nog.inputs['Roughness'].default_value
+                                            else:
+                                                roughness = False
+                                        else:
+                                            connected = False
+                                            print(print_unconnected)
+
+                                        if ma.name not in self.__class__.materials:
+                                            self.__class__.materials.append('%s%s%s [%s] %s%s%s' % (
+                                                '[L] ' if ma.library else '',
+                                                'Node Group:  %s%s  ->  ' % (
+                                                    '[L] ' if no.node_tree.library else '',
+                                                    no.node_tree.name),
+                                                ma.name, ma.users,
+                                                '[F]' if ma.use_fake_user else '',
+                                                ' - [%s]' % roughness if roughness else '',
+                                                ' * Output not connected' if not connected else ''))
+
+                    self.__class__.materials = sorted(list(set(self.__class__.materials)))
+
+        if len(self.__class__.materials) == 0:
+            self.report({"INFO"}, "No materials with nodes type %s found" % node_type)
+        else:
+            print("* A total of %d %s using %s was found \n" % (
+                    len(self.__class__.materials),
+                    "material" if len(self.__class__.materials) == 1 else "materials",
+                    node_type))
+
+            count = 0
+
+            for mat in self.__class__.materials:
+                print('%02d. %s' % (count+1, self.__class__.materials[count]))
+                count += 1
+            print("\n")
+
+        self.__class__.materials = sorted(list(set(self.__class__.materials)))
+
+        return {'FINISHED'}
+
+class AMTH_SCENE_OT_cycles_shader_list_nodes_clear(Operator):
+    """Clear the list below"""
+    bl_idname = "scene.cycles_list_nodes_clear"
+    bl_label = "Clear Materials List"
+
+    @classmethod
+    def poll(cls, context):
+        return cycles_exists
+
+    def execute(self, context):
+        AMTH_SCENE_OT_cycles_shader_list_nodes.materials[:] = []
+        print("* Cleared Cycles Materials List")
+        return {'FINISHED'}
+
+class AMTH_SCENE_OT_amaranth_object_select(Operator):
+    '''Select object'''
+    bl_idname = "scene.amaranth_object_select"
+    bl_label = "Select Object"
+    object = bpy.props.StringProperty()
+ 
+    def execute(self, context):
+        if self.object:
+            object = bpy.data.objects[self.object]
+
+            bpy.ops.object.select_all(action='DESELECT')
+            object.select = True
+            context.scene.objects.active = object
+
+        return{'FINISHED'}
+
+class AMTH_SCENE_OT_list_missing_node_links(Operator):
+    '''Print a list of missing node links'''
+    bl_idname = "scene.list_missing_node_links"
+    bl_label = "List Missing Node Links"
+
+    count_groups = 0
+    count_images = 0
+    count_image_node_unlinked = 0
+
+    def execute(self, context):
+        missing_groups = []
+        missing_images = []
+        image_nodes_unlinked = []
+        libraries = []
+        self.__class__.count_groups = 0
+        self.__class__.count_images = 0
+        self.__class__.count_image_node_unlinked = 0
+
+        for ma in bpy.data.materials:
+            if ma.node_tree:
+                for no in ma.node_tree.nodes:
+                    if no.type == 'GROUP':
+                        if not no.node_tree:
+                            self.__class__.count_groups += 1
+
+                            users_ngroup = []
+
+                            for ob in bpy.data.objects:
+                                if ob.material_slots and ma.name in ob.material_slots:
+                                    users_ngroup.append("%s%s%s" % (
+                                        "[L] " if ob.library else "",
+                                        "[F] " if ob.use_fake_user else "",
+                                        ob.name))
+
+                            missing_groups.append("MA: %s%s%s [%s]%s%s%s\n" % (
+                                "[L] " if ma.library else "",
+                                "[F] " if ma.use_fake_user else "",
+                                ma.name, ma.users,
+                                " *** No users *** " if ma.users == 0 else "",
+                                "\nLI: %s" % 
+                                ma.library.filepath if ma.library else "",
+                                "\nOB: %s" % ',  '.join(users_ngroup) if users_ngroup else ""))
+
+                            if ma.library:
+                                libraries.append(ma.library.filepath)
+                    if no.type == 'TEX_IMAGE':
+
+                        outputs_empty = not no.outputs['Color'].is_linked and not no.outputs['Alpha'].is_linked
+
+                        if no.image:
+                            import os.path
+                            image_path_exists = os.path.exists(
+                                                    bpy.path.abspath(
+                                                        no.image.filepath, library=no.image.library))
+
+                        if outputs_empty or not \
+                           no.image or not \
+                           image_path_exists:
+
+                            users_images = []
+
+                            for ob in bpy.data.objects:
+                                if ob.material_slots and ma.name in ob.material_slots:
+                                    users_images.append("%s%s%s" % (
+                                        "[L] " if ob.library else "",
+                                        "[F] " if ob.use_fake_user else "",
+                                        ob.name))
+
+                            if outputs_empty:
+                                self.__class__.count_image_node_unlinked += 1
+
+                                image_nodes_unlinked.append("%s%s%s%s%s [%s]%s%s%s%s%s\n" % (
+                                    "NO: %s" % no.name,
+                                    "\nMA: ",
+                                    "[L] " if ma.library else "",
+                                    "[F] " if ma.use_fake_user else "",
+                                    ma.name, ma.users,
+                                    " *** No users *** " if ma.users == 0 else "",
+                                    "\nLI: %s" % 
+                                    ma.library.filepath if ma.library else "",
+                                    "\nIM: %s" % no.image.name if no.image else "",
+                                    "\nLI: %s" % no.image.filepath if no.image and no.image.filepath else "",
+                                    "\nOB: %s" % ',  '.join(users_images) if users_images else ""))
+                            
+
+                            if not no.image or not image_path_exists:
+                                self.__class__.count_images += 1
+
+                                missing_images.append("MA: %s%s%s [%s]%s%s%s%s%s\n" % (
+                                    "[L] " if ma.library else "",
+                                    "[F] " if ma.use_fake_user else "",
+                                    ma.name, ma.users,
+                                    " *** No users *** " if ma.users == 0 else "",
+                                    "\nLI: %s" % 
+                                    ma.library.filepath if ma.library else "",
+                                    "\nIM: %s" % no.image.name if no.image else "",
+                                    "\nLI: %s" % no.image.filepath if no.image and no.image.filepath else "",
+                                    "\nOB: %s" % ',  '.join(users_images) if users_images else ""))
+
+                                if ma.library:
+                                    libraries.append(ma.library.filepath)
+
+        # Remove duplicates and sort
+        missing_groups = sorted(list(set(missing_groups)))
+        missing_images = sorted(list(set(missing_images)))
+        image_nodes_unlinked = sorted(list(set(image_nodes_unlinked)))
+        libraries = sorted(list(set(libraries)))
+
+        print("\n\n== %s missing image %s, %s missing node %s and %s image %s unlinked ==" %
+            ("No" if self.__class__.count_images == 0 else str(self.__class__.count_images),
+            "node" if self.__class__.count_images == 1 else "nodes",
+            "no" if self.__class__.count_groups == 0 else str(self.__class__.count_groups),
+            "group" if self.__class__.count_groups == 1 else "groups",
+            "no" if self.__class__.count_image_node_unlinked == 0 else str(self.__class__.count_image_node_unlinked),
+            "node" if self.__class__.count_groups == 1 else "nodes"))
+
+        # List Missing Node Groups
+        if missing_groups:
+            print("\n* Missing Node Group Links\n")
+            for mig in missing_groups:
+                print(mig)
+
+        # List Missing Image Nodes
+        if missing_images:
+            print("\n* Missing Image Nodes Link\n")
+
+            for mii in missing_images:
+                print(mii)
+
+        # List Image Nodes with its outputs unlinked
+        if image_nodes_unlinked:
+            print("\n* Image Nodes Unlinked\n")
+
+            for nou in image_nodes_unlinked:
+                print(nou)
+
+        if missing_groups or \
+           missing_images or \
+           image_nodes_unlinked:
+            if libraries:
+                print("\nThat's bad, run check on %s:" % (
+                    "this library" if len(libraries) == 1 else "these libraries"))
+                for li in libraries:
+                    print(li)
+        else:
+            self.report({"INFO"}, "Yay! No missing node links")            
+
+        print("\n")
+
+        if missing_groups and missing_images:
+            self.report({"WARNING"}, "%d missing image %s and %d missing node %s found" %
+                (self.__class__.count_images, "node" if self.__class__.count_images == 1 else "nodes",
+                self.__class__.count_groups, "group" if self.__class__.count_groups == 1 else "groups"))
+
+        return{'FINISHED'}
+
+class AMTH_SCENE_OT_list_missing_material_slots(Operator):
+    '''List objects with empty material slots'''
+    bl_idname = "scene.list_missing_material_slots"
+    bl_label = "List Empty Material Slots"
+
+    objects = []
+    libraries = []
+
+    def execute(self, context):
+        self.__class__.objects = []
+        self.__class__.libraries = []
+
+        for ob in bpy.data.objects:
+            for ma in ob.material_slots:
+                if not ma.material:
+                    self.__class__.objects.append('%s%s' % (
+                        '[L] ' if ob.library else '',
+                        ob.name))
+                    if ob.library:
+                        self.__class__.libraries.append(ob.library.filepath)
+
+        self.__class__.objects = sorted(list(set(self.__class__.objects)))
+        self.__class__.libraries = sorted(list(set(self.__class__.libraries)))
+
+        if len(self.__class__.objects) == 0:
+            self.report({"INFO"}, "No objects with empty material slots found")
+        else:
+            print("\n* A total of %d %s with empty material slots was found \n" % (
+                    len(self.__class__.objects),
+                    "object" if len(self.__class__.objects) == 1 else "objects"))
+
+            count = 0
+            count_lib = 0
+
+            for obs in self.__class__.objects:
+                print('%02d. %s' % (
+                    count+1, self.__class__.objects[count]))
+                count += 1
+
+            if self.__class__.libraries:
+                print("\n\n* Check %s:\n" % 
+                    ("this library" if len(self.__class__.libraries) == 1
+                        else "these libraries"))
+
+                for libs in self.__class__.libraries:
+                    print('%02d. %s' % (
+                        count_lib+1, self.__class__.libraries[count_lib]))
+                    count_lib += 1
+            print("\n")
+
+        return{'FINISHED'}
+
+class AMTH_SCENE_OT_list_missing_material_slots_clear(Operator):
+    """Clear the list below"""
+    bl_idname = "scene.list_missing_material_slots_clear"
+    bl_label = "Clear Empty Material Slots List"
+    
+    def execute(self, context):
+        AMTH_SCENE_OT_list_missing_material_slots.objects[:] = []
+        print("* Cleared Empty Material Slots List")
+        return {'FINISHED'}
+
+class AMTH_SCENE_OT_blender_instance_open(Operator):
+    '''Open in a new Blender instance'''
+    bl_idname = "scene.blender_instance_open"
+    bl_label = "Open Blender Instance"
+    filepath = bpy.props.StringProperty()
+
+    def execute(self, context):
+        if self.filepath:
+            import os.path
+            filepath = os.path.normpath(bpy.path.abspath(self.filepath))
+
+            import subprocess
+            try:
+                subprocess.Popen([bpy.app.binary_path, filepath])
+            except:
+                print("Error on the new Blender instance")
+                import traceback
+                traceback.print_exc()
+
+        return{'FINISHED'}
+
+# Orphan Data: datablocks not reachable from any scene
+# (bpy.data collection, icon) in the order they are removed, users first.
+# Only datablocks with no users left are removed
+orphan_data_types = (
+    ("meshes", "MESH_DATA"),
+    ("materials", "MATERIAL"),
+    ("node_groups", "NODETREE"),
+    ("images", "IMAGE_DATA"),
+    ("actions", "ACTION"),
+    )
+
+def orphan_data_roots():
+    roots = list(bpy.data.scenes) + list(bpy.data.brushes)
+
+    # Images displayed in editors are in use too
+    for screen in bpy.data.screens:
+        for area in screen.areas:
+            for space in area.spaces:
+                if space.type == 'IMAGE_EDITOR' and space.image:
+                    roots.append(space.image)
+                elif space.type == 'VIEW_3D':
+                    for bg in space.background_images:
+                        if bg.image:
+                            roots.append(bg.image)
+    return roots
+
+def orphan_data_size(idblock):
+    """Estimated (memory, file size) of a datablock in bytes"""
+    if isinstance(idblock, bpy.types.Image):
+        return (image_memory_size(idblock),
+                idblock.packed_file.size if idblock.packed_file else 0)
+    if isinstance(idblock, bpy.types.Mesh):
+        size = mesh_memory_size(idblock)
+        return size, size
+    if isinstance(idblock, bpy.types.Action):
+        size = sum(len(fcu.keyframe_points) for fcu in idblock.fcurves) * 64
+        return size, size
+
+    tree = idblock if isinstance(idblock, bpy.types.NodeTree) else idblock.node_tree
+    size = len(tree.nodes) * 1024 if tree else 1024
+    return size, size
+
+def orphan_data_find():
+    """Find datablocks not reachable from any scene.
+
+    Returns a dict of {datablock: reason}, the unused libraries and the
+    users graph. Datablocks with more users than the references we know
+    about are considered in use, along with everything they reference.
+    """
+    graph = datablocks_users_graph()
+    references = {}
+
+    for refs in graph.values():
+        for ref in refs:
+            references[ref] = references.get(ref, 0) + 1
+
+    candidates = []
+    for attr, icon in orphan_data_types:
+        for idblock in getattr(bpy.data, attr):
+            if isinstance(idblock, bpy.types.Image) and \
+               idblock.type in {'RENDER_RESULT', 'COMPOSITING'}:
+                continue
+            candidates.append(idblock)
+
+    roots = orphan_data_roots()
+
+    while True:
+        reachable = datablocks_reachable(graph, roots)
+        unknown_users = [idblock for idblock in candidates
+                         if idblock not in reachable and
+                         idblock.users - int(idblock.use_fake_user) >
+                         references.get(idblock, 0)]
+        if not unknown_users:
+            break
+        roots.extend(unknown_users)
+
+    orphans = {}
+    for idblock in candidates:
+        if idblock in reachable:
+            continue
+        if idblock.users == 0:
+            orphans[idblock] = 'NO_USERS'
+        elif idblock.use_fake_user and idblock.users == 1:
+            orphans[idblock] = 'FAKE_USER'
+        else:
+            orphans[idblock] = 'ORPHAN_USERS'
+
+    libraries_used = set()
+    for idblock in reachable:
+        library = getattr(idblock, "library", None)
+        while library and library not in libraries_used:
+            libraries_used.add(library)
+            library = library.parent
+
+    libraries = [li for li in bpy.data.libraries if li not in libraries_used]
+
+    return orphans, libraries, graph
+
+def orphan_data_purge(orphans, graph):
+    """Remove orphans nothing points to anymore, in one pass.
+    Returns (count, kept, memory, file size), kept being the orphans still
+    used by other datablocks, which are left alone"""
+    removed = 0
+    kept = 0
+    memory = 0
+    filesize = 0
+
+    for attr, icon in orphan_data_types:
+        collection = getattr(bpy.data, attr)
+        members = set(collection)
+        idblocks = [idblock for idblock in orphans
+                    if idblock in members and idblock.library is None]
+
+        # Node groups nested in other orphan groups go after their users
+        if attr == "node_groups":
+            ordered = []
+            visited = set()
+            stack = [(group, False) for group in idblocks]
+            while stack:
+                group, done = stack.pop()
+                if done:
+                    ordered.append(group)
+                    continue
+                if group in visited:
+                    continue
+                visited.add(group)
+                stack.append((group, True))
+                stack.extend((ref, False) for ref in graph.get(group, ())
+                             if ref in members and ref in orphans)
+            idblocks = ordered[::-1]
+
+        for idblock in idblocks:
+            # Still pointed to, e.g. by an object in no scene or an orphan
+            # texture: freeing it would leave that pointer dangling
+            if idblock.users > int(idblock.use_fake_user):
+                kept += 1
+                continue
+
+            size = orphan_data_size(idblock)
+            memory += size[0]
+            filesize += size[1]
+
+            idblock.use_fake_user = False
+            collection.remove(idblock)
+            removed += 1
+
+    return removed, kept, memory, filesize
+
+class AMTH_SCENE_OT_list_orphan_data(Operator):
+    '''List datablocks not used by any scene, and what they cost'''
+    bl_idname = "scene.amaranth_list_orphan_data"
+    bl_label = "List Orphan Data"
+
+    orphans = []
+    libraries = []
+    memory = 0
+    filesize = 0
+
+    def execute(self, context):
+        orphans, libraries, graph = orphan_data_find()
+        reasons = {'NO_USERS': "No users",
+                   'FAKE_USER': "Fake user only",
+                   'ORPHAN_USERS': "Used by orphans only"}
+
+        self.__class__.orphans = []
+        self.__class__.libraries = sorted(li.filepath for li in libraries)
+        self.__class__.memory = 0
+        self.__class__.filesize = 0
+
+        for attr, icon in orphan_data_types:
+            members = set(getattr(bpy.data, attr))
+            for idblock in sorted((i for i in orphans if i in members),
+                                  key=lambda i: i.name):
+                memory, filesize = orphan_data_size(idblock)
+                self.__class__.memory += memory
+                self.__class__.filesize += filesize
+                self.__class__.orphans.append((
+                    '%s%s [%s] - %s - %s' % (
+                        '[L] ' if idblock.library else '',
+                        idblock.name, idblock.users,
+                        reasons[orphans[idblock]],
+                        bytes_to_human(memory)),
+                    icon))
+
+        if not self.__class__.orphans and not self.__class__.libraries:
+            self.report({"INFO"}, "No orphan data found")
+            return {'FINISHED'}
+
+        print("\n* A total of %d orphan %s was found (~%s memory, ~%s in file)\n" % (
+                len(self.__class__.orphans),
+                "datablock" if len(self.__class__.orphans) == 1 else "datablocks",
+                bytes_to_human(self.__class__.memory),
+                bytes_to_human(self.__class__.filesize)))
+
+        count = 0
+        for orphan in self.__class__.orphans:
+            count += 1
+            print('%02d. %s' % (count, orphan[0]))
+
+        if self.__class__.libraries:
+            print("\n* Unused %s:\n" % (
+                "library" if len(self.__class__.libraries) == 1 else "libraries"))
+            for li in self.__class__.libraries:
+                print(li)
+        print("\n")
+
+        return {'FINISHED'}
+
+class AMTH_SCENE_OT_list_orphan_data_clear(Operator):
+    """Clear the list below"""
+    bl_idname = "scene.amaranth_list_orphan_data_clear"
+    bl_label = "Clear Orphan Data List"
+
+    def execute(self, context):
+        AMTH_SCENE_OT_list_orphan_data.orphans[:] = []
+        AMTH_SCENE_OT_list_orphan_data.libraries[:] = []
+        AMTH_SCENE_OT_list_orphan_data.memory = 0
+        AMTH_SCENE_OT_list_orphan_data.filesize = 0
+        print("* Cleared Orphan Data List")
+        return {'FINISHED'}
+
+class AMTH_SCENE_OT_orphan_data_purge(Operator):
+    '''Remove all datablocks not used by any scene (linked data is kept)'''
+    bl_idname = "scene.amaranth_orphan_data_purge"
+    bl_label = "Purge Orphan Data"
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_confirm(self, event)
+
+    def execute(self, context):
+        orphans, libraries, graph = orphan_data_find()
+        removed, kept, memory, filesize = orphan_data_purge(orphans, graph)
+
+        bpy.ops.scene.amaranth_list_orphan_data_clear()
+
+        if removed:
+            self.report({'INFO'}, "Purged %d %s (~%s memory, ~%s in file)%s" % (
+                removed, "datablock" if removed == 1 else "datablocks",
+                bytes_to_human(memory), bytes_to_human(filesize),
+                ", %d still used by other orphans kept" % kept if kept else ""))
+        elif kept:
+            self.report({'INFO'}, "%d orphans are still used by other orphans, "
+                                  "save and reload to free them" % kept)
+        else:
+            self.report({'INFO'}, "No orphan data to purge")
+
+        return {'FINISHED'}
+
+# Duplicate Materials: identical materials merged into one
+
+def materials_duplicate_clusters(cache=None):
+    """List of [canonical, duplicate, ...] lists of identical materials"""
+    if cache is None:
+        cache = {}
+    clusters = {}
+
+    for ma in bpy.data.materials:
+        clusters.setdefault(material_hash(ma, cache), []).append(ma)
+
+    return [sorted(cluster, key=datablock_canonical_key)
+            for cluster in clusters.values() if len(cluster) > 1]
+
+def materials_used():
+    """Materials used by objects in any scene"""
+    used = set()
+    for scene in bpy.data.scenes:
+        for ob in scene.objects:
+            for slot in ob.material_slots:
+                if slot.material:
+                    used.add(slot.material)
+    return used
+
+def materials_used_count():
+    """Number of different materials used by objects in any scene"""
+    return len(materials_used())
+
+def material_users_remap(old, new):
+    """Point every local user of old to new, return the number of slots changed"""
+    count = 0
+
+    for ob in bpy.data.objects:
+        if ob.library:
+            continue
+        for slot in ob.material_slots:
+            if slot.link == 'OBJECT' and slot.material == old:
+                slot.material = new
+                count += 1
+
+    for collection in (bpy.data.meshes, bpy.data.curves, bpy.data.metaballs):
+        for data in collection:
+            if data.library:
+                continue
+            for i, ma in enumerate(data.materials):
+                if ma == old:
+                    data.materials[i] = new
+                    count += 1
+    return count
+
+class AMTH_SCENE_OT_list_duplicate_materials(Operator):
+    '''List materials with identical settings and node trees'''
+    bl_idname = "scene.amaranth_list_duplicate_materials"
+    bl_label = "List Duplicate Materials"
+
+    clusters = []
+    duplicates = 0
+    shaders_used = 0
+    shaders_after = 0
+
+    def execute(self, context):
+        import time
+        start = time.time()
+
+        cache = {}
+        clusters = materials_duplicate_clusters(cache)
+        used = materials_used()
+
+        self.__class__.clusters = sorted(
+            (cluster[0].name, [ma.name for ma in cluster[1:]])
+            for cluster in clusters)
+        self.__class__.duplicates = sum(len(c) - 1 for c in clusters)
+        self.__class__.shaders_used = len(used)
+        # Used materials left once identical ones are merged
+        self.__class__.shaders_after = len(
+            set(material_hash(ma, cache) for ma in used))
+
+        if not clusters:
+            self.report({"INFO"}, "No duplicate materials found")
+            return {'FINISHED'}
+
+        print("\n* %d duplicate %s of %d %s found in %.2f seconds\n" % (
+                self.__class__.duplicates,
+                "material" if self.__class__.duplicates == 1 else "materials",
+                len(clusters),
+                "material" if len(clusters) == 1 else "materials",
+                time.time() - start))
+
+        count = 0
+        for canonical, duplicates in self.__class__.clusters:
+            count += 1
+            print('%02d. %s <- %s' % (count, canonical, ', '.join(duplicates)))
+        print("\n")
+
+        return {'FINISHED'}
+
+class AMTH_SCENE_OT_list_duplicate_materials_clear(Operator):
+    """Clear the list below"""
+    bl_idname = "scene.amaranth_list_duplicate_materials_clear"
+    bl_label = "Clear Duplicate Materials List"
+
+    def execute(self, context):
+        AMTH_SCENE_OT_list_duplicate_materials.clusters[:] = []
+        AMTH_SCENE_OT_list_duplicate_materials.duplicates = 0
+        print("* Cleared Duplicate Materials List")
+        return {'FINISHED'}
+
+class AMTH_SCENE_OT_merge_duplicate_materials(Operator):
+    '''Replace identical materials with a single one on all objects and data'''
+    bl_idname = "scene.amaranth_merge_duplicate_materials"
+    bl_label = "Merge Duplicate Materials"
+    bl_options = {'UNDO'}
+
+    def execute(self, context):
+        shaders_before = materials_used_count()
+        merged = 0
+        slots = 0
+
+        for cluster in materials_duplicate_clusters():
+            canonical = cluster[0]
+            for ma in cluster[1:]:
+                count = material_users_remap(ma, canonical)
+                if count:
+                    merged += 1
+                    slots += count
+
+        shaders_after = materials_used_count()
+
+        bpy.ops.scene.amaranth_list_duplicate_materials_clear()
+
+        if merged:
+            self.report({'INFO'}, "Merged %d %s in %d slots, shaders: %d -> %d" % (
+                merged, "material" if merged == 1 else "materials", slots,
+                shaders_before, shaders_after))
+        else:
+            self.report({'INFO'}, "No duplicate materials to merge")
+
+        return {'FINISHED'}
+
+# Duplicate Images: the same file loaded more than once
+# Content hashes by (path, size, modification time), kept between scans
+image_content_hashes = {}
+
+def image_filepath_normalized(im):
+    import os.path
+    filepath = bpy.path.abspath(im.filepath, library=im.library)
+    return os.path.normcase(os.path.realpath(os.path.normpath(filepath)))
+
+def file_content_hash(filepath):
+    """SHA-1 of a file, None if it can't be read"""
+    import hashlib
+
+    sha1 = hashlib.sha1()
+    try:
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha1.update(chunk)
+    except (IOError, OSError):
+        return None
+    return sha1.hexdigest()
+
+def image_interpretation(im):
+    """How the pixels of an image file are read, images only merge when
+    they read them the same way"""
+    return (im.colorspace_settings.name, im.alpha_mode, im.use_alpha,
+            im.use_view_as_render)
+
+def images_duplicate_clusters():
+    """List of [canonical, duplicate, ...] lists of images using the same
+    file, or files with the same content, read with the same color space
+    and alpha settings"""
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+
+    paths = {}
+    for im in bpy.data.images:
+        if im.source != 'FILE' or im.packed_file or \
+           im.type in {'RENDER_RESULT', 'COMPOSITING'}:
+            continue
+        paths.setdefault(image_filepath_normalized(im), []).append(im)
+
+    # Only files sharing their size can have the same content
+    stats = {}
+    sizes = {}
+    for filepath in paths:
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            continue
+        stats[filepath] = (filepath, stat.st_size, stat.st_mtime)
+        sizes.setdefault(stat.st_size, []).append(stats[filepath])
+
+    to_hash = [key for keys in sizes.values() if len(keys) > 1
+               for key in keys if key not in image_content_hashes]
+
+    if to_hash:
+        with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as pool:
+            for key, content_hash in zip(
+                    to_hash, pool.map(file_content_hash, [k[0] for k in to_hash])):
+                # Unreadable files only match themselves, by path
+                if content_hash:
+                    image_content_hashes[key] = content_hash
+
+    clusters = {}
+    for filepath, images in paths.items():
+        key = image_content_hashes.get(stats.get(filepath), filepath)
+        for im in images:
+            clusters.setdefault((key, image_interpretation(im)), []).append(im)
+
+    return [sorted(cluster, key=datablock_canonical_key)
+            for cluster in clusters.values() if len(cluster) > 1]
+
+def image_users_remap(old, new):
+    """Point every local user of old to new, return the number of users changed"""
+    count = 0
+
+    trees = [ng for ng in bpy.data.node_groups if not ng.library]
+    for collection in (bpy.data.materials, bpy.data.lamps, bpy.data.worlds,
+                       bpy.data.textures, bpy.data.scenes):
+        trees.extend(idblock.node_tree for idblock in collection
+                     if not idblock.library and idblock.node_tree)
+
+    for tree in trees:
+        for no in tree.nodes:
+            if getattr(no, "image", None) == old:
+                no.image = new
+                count += 1
+
+    for tex in bpy.data.textures:
+        if not tex.library and getattr(tex, "image", None) == old:
+            tex.image = new
+            count += 1
+
+    for screen in bpy.data.screens:
+        for area in screen.areas:
+            for space in area.spaces:
+                if space.type == 'IMAGE_EDITOR' and space.image == old:
+                    space.image = new
+                elif space.type == 'VIEW_3D':
+                    for bg in space.background_images:
+                        if bg.image == old:
+                            bg.image = new
+
+    # Face images are slow to go through, only if something still uses it
+    if old.users - int(old.use_fake_user) > 0:
+        for me in bpy.data.meshes:
+            if me.library:
+                continue
+            for uvtex in me.uv_textures:
+                for face in uvtex.data:
+                    if face.image == old:
+                        face.image = new
+                        count += 1
+
+    return count
+
+class AMTH_SCENE_OT_list_duplicate_images(Operator):
+    '''List images loaded more than once, by path or file content'''
+    bl_idname = "scene.amaranth_list_duplicate_images"
+    bl_label = "List Duplicate Images"
+
+    clusters = []
+    duplicates = 0
+    memory = 0
+
+    def execute(self, context):
+        clusters = images_duplicate_clusters()
+
+        self.__class__.clusters = []
+        self.__class__.duplicates = 0
+        self.__class__.memory = 0
+
+        for cluster in clusters:
+            memory = sum(image_memory_size(im) for im in cluster[1:])
+            self.__class__.memory += memory
+            self.__class__.duplicates += len(cluster) - 1
+            self.__class__.clusters.append(
+                (cluster[0].name, [im.name for im in cluster[1:]], memory))
+
+        self.__class__.clusters.sort()
+
+        if not clusters:
+            self.report({"INFO"}, "No duplicate images found")
+            return {'FINISHED'}
+
+        print("\n* %d duplicate %s found, ~%s of memory\n" % (
+                self.__class__.duplicates,
+                "image" if self.__class__.duplicates == 1 else "images",
+                bytes_to_human(self.__class__.memory)))
+
+        count = 0
+        for canonical, duplicates, memory in self.__class__.clusters:
+            count += 1
+            print('%02d. %s <- %s (%s)' % (
+                count, canonical, ', '.join(duplicates), bytes_to_human(memory)))
+        print("\n")
+
+        return {'FINISHED'}
+
+class AMTH_SCENE_OT_list_duplicate_images_clear(Operator):
+    """Clear the list below"""
+    bl_idname = "scene.amaranth_list_duplicate_images_clear"
+    bl_label = "Clear Duplicate Images List"
+
+    def execute(self, context):
+        AMTH_SCENE_OT_list_duplicate_images.clusters[:] = []
+        AMTH_SCENE_OT_list_duplicate_images.duplicates = 0
+        AMTH_SCENE_OT_list_duplicate_images.memory = 0
+        print("* Cleared Duplicate Images List")
+        return {'FINISHED'}
+
+class AMTH_SCENE_OT_merge_duplicate_images(Operator):
+    '''Replace images of the same file with a single one everywhere they are used'''
+    bl_idname = "scene.amaranth_merge_duplicate_images"
+    bl_label = "Merge Duplicate Images"
+    bl_options = {'UNDO'}
+
+    def execute(self, context):
+        merged = 0
+        memory = 0
+
+        for cluster in images_duplicate_clusters():
+            canonical = cluster[0]
+            for im in cluster[1:]:
+                if image_users_remap(im, canonical):
+                    merged += 1
+                    memory += image_memory_size(im)
+
+        bpy.ops.scene.amaranth_list_duplicate_images_clear()
+
+        if merged:
+            self.report({'INFO'}, "Merged %d %s, ~%s of memory freed" % (
+                merged, "image" if merged == 1 else "images",
+                bytes_to_human(memory)))
+        else:
+            self.report({'INFO'}, "No duplicate images to merge")
+
+        return {'FINISHED'}
+
+# Duplicate Object Data: identical meshes and lamps that could be shared
+def object_data_duplicate_clusters():
+    """List of (collection name, [canonical, duplicate, ...]) of identical
+    mesh and lamp data used by objects"""
+    users = {}
+    for ob in bpy.data.objects:
+        if ob.type in {'MESH', 'LAMP'} and ob.data:
+            users.setdefault(ob.data, []).append(ob)
+
+    cache = {}
+    clusters = {}
+
+    for data, obs in users.items():
+        if isinstance(data, bpy.types.Mesh):
+            # Weights and shape keys are per mesh, can't share those safely
+            if data.shape_keys or any(ob.vertex_groups for ob in obs):
+                continue
+            key = ('meshes', mesh_hash(data))
+        else:
+            key = ('lamps', lamp_hash(data, cache))
+        clusters.setdefault(key, []).append(data)
+
+    return [(key[0], sorted(cluster, key=datablock_canonical_key))
+            for key, cluster in clusters.items() if len(cluster) > 1]
+
+class AMTH_SCENE_OT_list_duplicate_object_data(Operator):
+    '''List objects with identical mesh or lamp data that could share it'''
+    bl_idname = "scene.amaranth_list_duplicate_object_data"
+    bl_label = "List Duplicate Object Data"
+
+    clusters = []
+    duplicates = 0
+    objects = 0
+    memory = 0
+
+    def execute(self, context):
+        clusters = object_data_duplicate_clusters()
+
+        self.__class__.clusters = []
+        self.__class__.duplicates = 0
+        self.__class__.objects = 0
+        self.__class__.memory = 0
+
+        for collection, cluster in clusters:
+            objects = sum(data.users for data in cluster)
+            memory = sum(mesh_memory_size(data) for data in cluster[1:]) \
+                     if collection == 'meshes' else 0
+
+            self.__class__.duplicates += len(cluster) - 1
+            self.__class__.objects += objects
+            self.__class__.memory += memory
+            self.__class__.clusters.append((
+                "%s <- %d %s, %d %s%s" % (
+                    cluster[0].name, len(cluster) - 1,
+                    "copy" if len(cluster) == 2 else "copies",
+                    objects, "object" if objects == 1 else "objects",
+                    " [%s]" % bytes_to_human(memory) if memory else ""),
+                'MESH_DATA' if collection == 'meshes' else 'LAMP_DATA'))
+
+        self.__class__.clusters.sort()
+
+        if not clusters:
+            self.report({"INFO"}, "No duplicate mesh or lamp data found")
+            return {'FINISHED'}
+
+        print("\n* %d objects could share %d datablocks instead of %d, ~%s of memory\n" % (
+                self.__class__.objects, len(clusters),
+                len(clusters) + self.__class__.duplicates,
+                bytes_to_human(self.__class__.memory)))
+
+        count = 0
+        for cluster in self.__class__.clusters:
+            count += 1
+            print('%02d. %s' % (count, cluster[0]))
+        print("\n")
+
+        return {'FINISHED'}
+
+class AMTH_SCENE_OT_list_duplicate_object_data_clear(Operator):
+    """Clear the list below"""
+    bl_idname = "scene.amaranth_list_duplicate_object_data_clear"
+    bl_label = "Clear Duplicate Object Data List"
+
+    def execute(self, context):
+        AMTH_SCENE_OT_list_duplicate_object_data.clusters[:] = []
+        AMTH_SCENE_OT_list_duplicate_object_data.duplicates = 0
+        AMTH_SCENE_OT_list_duplicate_object_data.objects = 0
+        AMTH_SCENE_OT_list_duplicate_object_data.memory = 0
+        print("* Cleared Duplicate Object Data List")
+        return {'FINISHED'}
+
+class AMTH_SCENE_OT_link_duplicate_object_data(Operator):
+    '''Make objects with identical mesh or lamp data share a single datablock'''
+    bl_idname = "scene.amaranth_link_duplicate_object_data"
+    bl_label = "Share Duplicate Object Data"
+    bl_options = {'UNDO'}
+
+    def execute(self, context):
+        relinked = 0
+        memory = 0
+
+        for collection, cluster in object_data_duplicate_clusters():
+            canonical = cluster[0]
+            duplicates = set(cluster[1:])
+
+            for ob in bpy.data.objects:
+                if not ob.library and ob.data in duplicates:
+                    ob.data = canonical
+                    relinked += 1
+
+            if collection == 'meshes':
+                memory += sum(mesh_memory_size(me) for me in duplicates
+                              if me.users == 0)
+
+        bpy.ops.scene.amaranth_list_duplicate_object_data_clear()
+
+        if relinked:
+            self.report({'INFO'}, "%d %s now share data, ~%s of memory freed" % (
+                relinked, "object" if relinked == 1 else "objects",
+                bytes_to_human(memory)))
+        else:
+            self.report({'INFO'}, "No duplicate object data to share")
+
+        return {'FINISHED'}
+
+# Node Groups Graph: nested node groups and how often they are used
+# Collections whose node trees can use node groups
+node_groups_owners = ("node_groups", "materials", "lamps", "worlds", "scenes")
+
+# Built on demand, then kept up to date by scene_debug_update()
+node_groups_graph = {"trees": None, "report": None}
+
+def datablock_key(attr, idblock):
+    return (attr, idblock.name,
+            idblock.library.filepath if idblock.library else '')
+
+def node_groups_graph_scan(attr, idblock):
+    tree = idblock if attr == "node_groups" else idblock.node_tree
+    groups = {}
+
+    if not tree:
+        return {"nodes": 0, "groups": groups}
+
+    for no in tree.nodes:
+        if no.type == 'GROUP' and no.node_tree:
+            key = datablock_key("node_groups", no.node_tree)
+            groups[key] = groups.get(key, 0) + 1
+
+    return {"nodes": len(tree.nodes), "groups": groups}
+
+def node_groups_graph_build():
+    trees = {}
+    for attr in node_groups_owners:
+        for idblock in getattr(bpy.data, attr):
+            trees[datablock_key(attr, idblock)] = node_groups_graph_scan(attr, idblock)
+
+    node_groups_graph["trees"] = trees
+    node_groups_graph["report"] = None
+
+def node_groups_graph_sync():
+    """Rescan only the trees of datablocks tagged as updated"""
+    trees = node_groups_graph["trees"]
+    if trees is None:
+        return
+
+    changed = False
+
+    for attr in node_groups_owners:
+        collection = getattr(bpy.data, attr)
+        if not collection.is_updated:
+            continue
+
+        keys = set()
+        for idblock in collection:
+            key = datablock_key(attr, idblock)
+            keys.add(key)
+            if key not in trees or idblock.is_updated or idblock.is_updated_data:
+                scan = node_groups_graph_scan(attr, idblock)
+                if trees.get(key) != scan:
+                    trees[key] = scan
+                    changed = True
+
+        for key in [k for k in trees if k[0] == attr and k not in keys]:
+            del trees[key]
+            changed = True
+
+    if changed:
+        node_groups_graph["report"] = None
+
+def node_groups_graph_report():
+    """Node groups sorted by cost (nodes x times evaluated), as a list of
+    dicts with their nesting depth, instances and users"""
+    if node_groups_graph["report"] is not None:
+        return node_groups_graph["report"]
+
+    trees = node_groups_graph["trees"] or {}
+    depths = {}
+    expanded = {}
+
+    def depth(key, visiting=()):
+        if key not in depths:
+            children = trees.get(key, {}).get("groups", {})
+            depths[key] = 1 + max([depth(child, visiting + (key,))
+                                   for child in children
+                                   if child not in visiting] or [0])
+        return depths[key]
+
+    # Instances of every group a tree uses, counting nested ones
+    def expand(key, visiting=()):
+        if key not in expanded:
+            result = {}
+            for group, count in trees.get(key, {}).get("groups", {}).items():
+                result[group] = result.get(group, 0) + count
+                if group not in visiting:
+                    for sub, sub_count in expand(group, visiting + (key,)).items():
+                        result[sub] = result.get(sub, 0) + count * sub_count
+            expanded[key] = result
+        return expanded[key]
+
+    instances = {}
+    users = {}
+    for key in trees:
+        if key[0] == "node_groups":
+            continue
+        for group, count in expand(key).items():
+            instances[group] = instances.get(group, 0) + count
+            users.setdefault(group, {})[key] = count
+
+    report = []
+    for key, tree in trees.items():
+        if key[0] != "node_groups":
+            continue
+        report.append({
+            "name": key[1],
+            "library": key[2],
+            "depth": depth(key),
+            "nodes": tree["nodes"],
+            "instances": instances.get(key, 0),
+            "users": sorted(users.get(key, {}).items(),
+                            key=lambda user: -user[1]),
+            "cost": tree["nodes"] * instances.get(key, 0)})
+
+    report.sort(key=lambda group: (-group["cost"], group["instances"], group["name"]))
+    node_groups_graph["report"] = report
+
+    return report
+
+class AMTH_SCENE_OT_node_groups_graph(Operator):
+    '''List node groups by nesting, reuse and cost (kept up to date once built)'''
+    bl_idname = "scene.amaranth_node_groups_graph"
+    bl_label = "Node Groups Usage"
+
+    def execute(self, context):
+        node_groups_graph_build()
+        report = node_groups_graph_report()
+
+        if not report:
+            self.report({"INFO"}, "No node groups found")
+            return {'FINISHED'}
+
+        print("\n* %d node %s, %d unused\n" % (
+                len(report), "group" if len(report) == 1 else "groups",
+                len([group for group in report if not group["instances"]])))
+
+        count = 0
+        for group in report:
+            count += 1
+            print('%02d. %s%s - depth %d, %d nodes, %d instances, cost %d%s' % (
+                count, '[L] ' if group["library"] else '', group["name"],
+                group["depth"], group["nodes"], group["instances"],
+                group["cost"], ' *** Unused ***' if not group["instances"] else ''))
+            for user, instances in group["users"]:
+                print('      %s: %s x%d' % (user[0][:-1].upper(), user[1], instances))
+        print("\n")
+
+        return {'FINISHED'}
+
+class AMTH_SCENE_OT_node_groups_graph_clear(Operator):
+    """Clear the list below and stop keeping it up to date"""
+    bl_idname = "scene.amaranth_node_groups_graph_clear"
+    bl_label = "Clear Node Groups Usage"
+
+    def execute(self, context):
+        node_groups_graph["trees"] = None
+        node_groups_graph["report"] = None
+        print("* Cleared Node Groups Usage")
+        return {'FINISHED'}
+
+# Material Complexity: estimated shading cost of each material
+# Score weights, per reachable node, image megapixel, nesting level and feature
+shader_complexity_weights = {
+    'NODE': 1.0,
+    'IMAGE': 1.0,
+    'MEGAPIXEL': 0.5,
+    'DEPTH': 2.0,
+    'TRANSPARENT': 5.0,
+    'SUBSURFACE': 10.0,
+    'VOLUME': 20.0,
+    }
+
+# Built on demand, then kept up to date by scene_debug_update()
+material_complexity = {"materials": None, "report": None}
+
+def node_tree_complexity(tree, starts, groups, resolutions):
+    """Reachable nodes, images, nesting depth and features of a tree,
+    groups and resolutions are caches shared by the whole pass"""
+    result = {"nodes": 0, "images": 0, "megapixels": 0.0, "depth": 0,
+              "features": set(), "groups": set()}
+
+    for no in nodes_upstream(tree, starts):
+        result["nodes"] += 1
+        result["features"] |= shader_node_features.get(no.type, set())
+
+        if no.type in {'TEX_IMAGE', 'TEX_ENVIRONMENT'} and no.image:
+            if no.image not in resolutions:
+                resolutions[no.image] = image_resolution(no.image)
+            width, height = resolutions[no.image]
+            result["images"] += 1
+            result["megapixels"] += width * height / 1000000.0
+
+        elif no.type in {'OUTPUT_MATERIAL', 'OUTPUT_WORLD'}:
+            if no.inputs['Volume'].is_linked:
+                result["features"].add('VOLUME')
+
+        elif no.type == 'GROUP' and no.node_tree:
+            if no.node_tree not in groups:
+                # Guard against groups nested in themselves
+                groups[no.node_tree] = None
+                groups[no.node_tree] = node_tree_complexity(
+                    no.node_tree,
+                    [n for n in no.node_tree.nodes if n.type == 'GROUP_OUTPUT'],
+                    groups, resolutions)
+            group = groups[no.node_tree]
+            if group is None:
+                continue
+
+            result["nodes"] += group["nodes"]
+            result["images"] += group["images"]
+            result["megapixels"] += group["megapixels"]
+            result["depth"] = max(result["depth"], group["depth"] + 1)
+            result["features"] |= group["features"]
+            result["groups"] |= group["groups"]
+            result["groups"].add(datablock_key("node_groups", no.node_tree))
+
+    return result
+
+def material_complexity_score(ma, groups, resolutions):
+    if ma.use_nodes and ma.node_tree:
+        result = node_tree_complexity(
+            ma.node_tree, node_tree_outputs(ma.node_tree), groups, resolutions)
+    else:
+        result = {"nodes": 0, "images": 0, "megapixels": 0.0, "depth": 0,
+                  "features": set(), "groups": set()}
+
+    weights = shader_complexity_weights
+    result["score"] = (result["nodes"] * weights['NODE'] +
+                       result["images"] * weights['IMAGE'] +
+                       result["megapixels"] * weights['MEGAPIXEL'] +
+                       result["depth"] * weights['DEPTH'] +
+                       sum(weights.get(feature, 0.0)
+                           for feature in result["features"]))
+    result["name"] = ma.name
+    result["library"] = ma.library.filepath if ma.library else ''
+
+    return result
+
+def material_complexity_build():
+    groups = {}
+    resolutions = {}
+
+    material_complexity["materials"] = {
+        datablock_key("materials", ma): material_complexity_score(ma, groups, resolutions)
+        for ma in bpy.data.materials}
+    material_complexity["report"] = None
+
+def material_complexity_sync():
+    """Score again only materials tagged as updated or using updated groups"""
+    materials = material_complexity["materials"]
+    if materials is None or not (bpy.data.materials.is_updated or
+                                 bpy.data.node_groups.is_updated):
+        return
+
+    groups_updated = set()
+    if bpy.data.node_groups.is_updated:
+        groups_updated = {datablock_key("node_groups", ng)
+                          for ng in bpy.data.node_groups
+                          if ng.is_updated or ng.is_updated_data}
+
+    groups = {}
+    resolutions = {}
+    keys = set()
+    changed = False
+
+    for ma in bpy.data.materials:
+        key = datablock_key("materials", ma)
+        keys.add(key)
+        entry = materials.get(key)
+        if entry is None or ma.is_updated or ma.is_updated_data or \
+           entry["groups"] & groups_updated:
+            materials[key] = material_complexity_score(ma, groups, resolutions)
+            changed = True
+
+    for key in [k for k in materials if k not in keys]:
+        del materials[key]
+        changed = True
+
+    if changed:
+        material_complexity["report"] = None
+
+def material_complexity_report():
+    if material_complexity["report"] is None:
+        material_complexity["report"] = sorted(
+            (material_complexity["materials"] or {}).values(),
+            key=lambda entry: (-entry["score"], entry["name"]))
+    return material_complexity["report"]
+
+def material_complexity_label(entry):
+    return "%s%s: %.0f (%s nodes, %s %s %.1f MP%s%s)" % (
+        '[L] ' if entry["library"] else '', entry["name"], entry["score"],
+        entry["nodes"], entry["images"],
+        'image' if entry["images"] == 1 else 'images', entry["megapixels"],
+        ', depth %s' % entry["depth"] if entry["depth"] else '',
+        ', %s' % '/'.join(sorted(entry["features"] &
+                                 {'TRANSPARENT', 'SUBSURFACE', 'VOLUME'}))
+            if entry["features"] & {'TRANSPARENT', 'SUBSURFACE', 'VOLUME'} else '')
+
+class AMTH_SCENE_OT_material_complexity(Operator):
+    '''Rank materials by estimated shading cost (kept up to date once built)'''
+    bl_idname = "scene.amaranth_material_complexity"
+    bl_label = "Rank Materials by Cost"
+
+    def execute(self, context):
+        material_complexity_build()
+        report = material_complexity_report()
+
+        if not report:
+            self.report({"INFO"}, "No materials found")
+            return {'FINISHED'}
+
+        print("\n* %d %s ranked by shading cost\n" % (
+                len(report), "material" if len(report) == 1 else "materials"))
 
-        self.__class__.materials = sorted(list(set(self.__class__.materials)))
+        count = 0
+        for entry in report:
+            count += 1
+            print('%02d. %s' % (count, material_complexity_label(entry)))
+        print("\n")
 
         return {'FINISHED'}
 
-class AMTH_SCENE_OT_cycles_shader_list_nodes_clear(Operator):
-    """Clear the list below"""
-    bl_idname = "scene.cycles_list_nodes_clear"
-    bl_label = "Clear Materials List"
+class AMTH_SCENE_OT_material_complexity_clear(Operator):
+    """Clear the list below and stop keeping it up to date"""
+    bl_idname = "scene.amaranth_material_complexity_clear"
+    bl_label = "Clear Materials Cost"
+
+    def execute(self, context):
+        material_complexity["materials"] = None
+        material_complexity["report"] = None
+        print("* Cleared Materials Cost")
+        return {'FINISHED'}
+
+# Image Users: which materials and objects use each image
+# Built on demand, then kept up to date by scene_debug_update()
+images_users_index = {"materials": None, "groups": None,
+                      "objects": None, "images": None}
+
+def node_tree_image_users(tree):
+    """Images and node groups used directly by a node tree"""
+    images = set()
+    groups = set()
+
+    for no in tree.nodes:
+        if no.type in {'TEX_IMAGE', 'TEX_ENVIRONMENT'} and no.image:
+            images.add(datablock_key("images", no.image))
+        elif no.type == 'GROUP' and no.node_tree:
+            groups.add(datablock_key("node_groups", no.node_tree))
+
+    return {"images": images, "groups": groups}
+
+def images_users_index_scan(attr, idblock):
+    if attr == "objects":
+        return {datablock_key("materials", slot.material)
+                for slot in idblock.material_slots if slot.material}
+    tree = idblock if attr == "node_groups" else idblock.node_tree
+    if tree is None:
+        return {"images": set(), "groups": set()}
+    return node_tree_image_users(tree)
+
+def images_users_index_build():
+    for attr, key in (("materials", "materials"), ("node_groups", "groups"),
+                      ("objects", "objects")):
+        images_users_index[key] = {
+            datablock_key(attr, idblock): images_users_index_scan(attr, idblock)
+            for idblock in getattr(bpy.data, attr)}
+    images_users_index["images"] = None
+
+def images_users_index_sync():
+    """Rescan only the materials, groups and objects tagged as updated"""
+    if images_users_index["materials"] is None:
+        return
+
+    changed = False
+
+    for attr, key in (("materials", "materials"), ("node_groups", "groups"),
+                      ("objects", "objects")):
+        collection = getattr(bpy.data, attr)
+        if not collection.is_updated:
+            continue
+
+        index = images_users_index[key]
+        keys = set()
+        for idblock in collection:
+            idblock_key = datablock_key(attr, idblock)
+            keys.add(idblock_key)
+            if idblock_key not in index or idblock.is_updated or \
+               idblock.is_updated_data:
+                scan = images_users_index_scan(attr, idblock)
+                if index.get(idblock_key) != scan:
+                    index[idblock_key] = scan
+                    changed = True
+
+        for idblock_key in [k for k in index if k not in keys]:
+            del index[idblock_key]
+            changed = True
+
+    if changed:
+        images_users_index["images"] = None
+
+def image_users(im):
+    """(materials, objects) names using an image, from the cached index"""
+    if images_users_index["materials"] is None:
+        images_users_index_build()
+
+    if images_users_index["images"] is None:
+        groups = images_users_index["groups"]
+        expanded = {}
+
+        def group_images(key, visiting=()):
+            if key not in expanded:
+                entry = groups.get(key, {"images": set(), "groups": set()})
+                result = set(entry["images"])
+                for group in entry["groups"]:
+                    if group not in visiting:
+                        result |= group_images(group, visiting + (key,))
+                expanded[key] = result
+            return expanded[key]
+
+        materials = {}
+        for key, entry in images_users_index["materials"].items():
+            images = set(entry["images"])
+            for group in entry["groups"]:
+                images |= group_images(group)
+            for image in images:
+                materials.setdefault(image, set()).add(key)
+
+        objects = {}
+        for key, slots in images_users_index["objects"].items():
+            for material in slots:
+                objects.setdefault(material, set()).add(key)
+
+        images_users_index["images"] = {
+            image: (sorted(ma[1] for ma in users),
+                    sorted({ob[1] for ma in users for ob in objects.get(ma, ())}),
+                    {ob for ma in users for ob in objects.get(ma, ())})
+            for image, users in materials.items()}
+
+    return images_users_index["images"].get(
+        datablock_key("images", im), ([], [], set()))[:2]
+
+def image_users_objects(im):
+    """datablock_key() of the objects using an image"""
+    image_users(im)
+    return images_users_index["images"].get(
+        datablock_key("images", im), ([], [], set()))[2]
+
+class AMTH_SCENE_OT_image_select_users(Operator):
+    '''Select the objects using this image'''
+    bl_idname = "scene.amaranth_image_select_users"
+    bl_label = "Select Users"
+    bl_options = {'UNDO'}
+
+    image = bpy.props.StringProperty()
+    library = bpy.props.StringProperty()
 
     @classmethod
     def poll(cls, context):
-        return cycles_exists
+        return context.mode == 'OBJECT'
 
     def execute(self, context):
-        AMTH_SCENE_OT_cycles_shader_list_nodes.materials[:] = []
-        print("* Cleared Cycles Materials List")
+        im = None
+        for image in bpy.data.images:
+            if image.name == self.image and \
+               (image.library.filepath if image.library else '') == self.library:
+                im = image
+                break
+
+        if not im:
+            return {'CANCELLED'}
+
+        objects = image_users_objects(im)
+
+        selected = 0
+        for ob in context.scene.objects:
+            ob.select = datablock_key("objects", ob) in objects
+            if ob.select:
+                context.scene.objects.active = ob
+                selected += 1
+
+        if not selected:
+            self.report({'INFO'}, "No objects in this scene use %s" % im.name)
+
         return {'FINISHED'}
 
-class AMTH_SCENE_OT_amaranth_object_select(Operator):
-    '''Select object'''
-    bl_idname = "scene.amaranth_object_select"
-    bl_label = "Select Object"
-    object = bpy.props.StringProperty()
- 
-    def execute(self, context):
-        if self.object:
-            object = bpy.data.objects[self.object]
+# Mesh Health: geometry that slows down BVH builds or shades badly
+# (kind, label, element) of the problems we look for
+mesh_health_kinds = (
+    ('DEGENERATE', "Degenerate", 'FACE'),
+    ('ZERO_AREA', "Zero Area", 'FACE'),
+    ('NGONS', "N-gons", 'FACE'),
+    ('LOOSE', "Loose Verts", 'VERT'),
+    ('DOUBLES', "Doubles", 'VERT'),
+    )
 
-            bpy.ops.object.select_all(action='DESELECT')
-            object.select = True
-            context.scene.objects.active = object
+def mesh_health(me, ngon_limit, distance, chunk_size=1000000):
+    """Masks of problematic faces and vertices, keyed by kind.
 
-        return{'FINISHED'}
+    Arrays are read in bulk with foreach_get, per loop work is done on
+    chunks of chunk_size faces so huge meshes don't need huge temporaries.
+    """
+    import numpy as np
 
-class AMTH_SCENE_OT_list_missing_node_links(Operator):
-    '''Print a list of missing node links'''
-    bl_idname = "scene.list_missing_node_links"
-    bl_label = "List Missing Node Links"
+    co = np.empty(len(me.vertices) * 3, dtype=np.float32)
+    me.vertices.foreach_get("co", co)
+    co.shape = (-1, 3)
 
-    count_groups = 0
-    count_images = 0
-    count_image_node_unlinked = 0
+    edge_verts = np.empty(len(me.edges) * 2, dtype=np.int32)
+    me.edges.foreach_get("vertices", edge_verts)
 
-    def execute(self, context):
-        missing_groups = []
-        missing_images = []
-        image_nodes_unlinked = []
-        libraries = []
-        self.__class__.count_groups = 0
-        self.__class__.count_images = 0
-        self.__class__.count_image_node_unlinked = 0
+    loop_verts = np.empty(len(me.loops), dtype=np.int32)
+    me.loops.foreach_get("vertex_index", loop_verts)
 
-        for ma in bpy.data.materials:
-            if ma.node_tree:
-                for no in ma.node_tree.nodes:
-                    if no.type == 'GROUP':
-                        if not no.node_tree:
-                            self.__class__.count_groups += 1
+    starts = np.empty(len(me.polygons), dtype=np.int32)
+    totals = np.empty(len(me.polygons), dtype=np.int32)
+    me.polygons.foreach_get("loop_start", starts)
+    me.polygons.foreach_get("loop_total", totals)
 
-                            users_ngroup = []
+    degenerate = np.zeros(len(starts), dtype=bool)
+    zero_area = np.zeros(len(starts), dtype=bool)
 
-                            for ob in bpy.data.objects:
-                                if ob.material_slots and ma.name in ob.material_slots:
-                                    users_ngroup.append("%s%s%s" % (
-                                        "[L] " if ob.library else "",
-                                        "[F] " if ob.use_fake_user else "",
-                                        ob.name))
+    for first in range(0, len(starts), chunk_size):
+        chunk_starts = starts[first:first + chunk_size]
+        chunk_totals = totals[first:first + chunk_size]
 
-                            missing_groups.append("MA: %s%s%s [%s]%s%s%s\n" % (
-                                "[L] " if ma.library else "",
-                                "[F] " if ma.use_fake_user else "",
-                                ma.name, ma.users,
-                                " *** No users *** " if ma.users == 0 else "",
-                                "\nLI: %s" % 
-                                ma.library.filepath if ma.library else "",
-                                "\nOB: %s" % ',  '.join(users_ngroup) if users_ngroup else ""))
+        # Loop indices of every face in the chunk, and the loop after each
+        bounds = np.cumsum(chunk_totals) - chunk_totals
+        poly = np.repeat(np.arange(len(chunk_starts)), chunk_totals)
+        offset = np.arange(chunk_totals.sum()) - bounds[poly]
+        loop = chunk_starts[poly] + offset
+        loop_next = chunk_starts[poly] + (offset + 1) % chunk_totals[poly]
 
-                            if ma.library:
-                                libraries.append(ma.library.filepath)
-                    if no.type == 'TEX_IMAGE':
+        v1 = co[loop_verts[loop]]
+        v2 = co[loop_verts[loop_next]]
 
-                        outputs_empty = not no.outputs['Color'].is_linked and not no.outputs['Alpha'].is_linked
+        # Faces with collapsed edges
+        short = (np.sum((v2 - v1) ** 2, axis=1) <= distance ** 2).astype(np.int32)
+        degenerate[first:first + chunk_size] = np.add.reduceat(short, bounds) > 0
 
-                        if no.image:
-                            import os.path
-                            image_path_exists = os.path.exists(
-                                                    bpy.path.abspath(
-                                                        no.image.filepath, library=no.image.library))
+        # Newell's area, works for n-gons too
+        area = np.add.reduceat(np.cross(v1, v2), bounds, axis=0)
+        area = 0.5 * np.sqrt(np.sum(area ** 2, axis=1))
+        zero_area[first:first + chunk_size] = area <= distance ** 2
 
-                        if outputs_empty or not \
-                           no.image or not \
-                           image_path_exists:
+    loose = np.bincount(edge_verts, minlength=len(co)) == 0
 
-                            users_images = []
+    # Vertices falling in the same cell of a distance sized grid
+    cells = np.ascontiguousarray(np.floor(co / distance).astype(np.int64))
+    cells = cells.view(np.dtype((np.void, cells.dtype.itemsize * 3))).ravel()
+    inverse = np.unique(cells, return_inverse=True)[1]
+    doubles = np.bincount(inverse)[inverse] > 1
 
-                            for ob in bpy.data.objects:
-                                if ob.material_slots and ma.name in ob.material_slots:
-                                    users_images.append("%s%s%s" % (
-                                        "[L] " if ob.library else "",
-                                        "[F] " if ob.use_fake_user else "",
-                                        ob.name))
+    return {'DEGENERATE': degenerate,
+            'ZERO_AREA': zero_area & ~degenerate,
+            'NGONS': totals > ngon_limit,
+            'LOOSE': loose,
+            'DOUBLES': doubles}
 
-                            if outputs_empty:
-                                self.__class__.count_image_node_unlinked += 1
+class AMTH_SCENE_OT_list_mesh_health(Operator):
+    '''List meshes with degenerate or zero area faces, huge n-gons, loose or duplicate vertices'''
+    bl_idname = "scene.amaranth_list_mesh_health"
+    bl_label = "List Mesh Problems"
 
-                                image_nodes_unlinked.append("%s%s%s%s%s [%s]%s%s%s%s%s\n" % (
-                                    "NO: %s" % no.name,
-                                    "\nMA: ",
-                                    "[L] " if ma.library else "",
-                                    "[F] " if ma.use_fake_user else "",
-                                    ma.name, ma.users,
-                                    " *** No users *** " if ma.users == 0 else "",
-                                    "\nLI: %s" % 
-                                    ma.library.filepath if ma.library else "",
-                                    "\nIM: %s" % no.image.name if no.image else "",
-                                    "\nLI: %s" % no.image.filepath if no.image and no.image.filepath else "",
-                                    "\nOB: %s" % ',  '.join(users_images) if users_images else ""))
-                            
+    objects = []
+    polygons = 0
 
-                            if not no.image or not image_path_exists:
-                                self.__class__.count_images += 1
+    def execute(self, context):
+        import time
+        start = time.time()
 
-                                missing_images.append("MA: %s%s%s [%s]%s%s%s%s%s\n" % (
-                                    "[L] " if ma.library else "",
-                                    "[F] " if ma.use_fake_user else "",
-                                    ma.name, ma.users,
-                                    " *** No users *** " if ma.users == 0 else "",
-                                    "\nLI: %s" % 
-                                    ma.library.filepath if ma.library else "",
-                                    "\nIM: %s" % no.image.name if no.image else "",
-                                    "\nLI: %s" % no.image.filepath if no.image and no.image.filepath else "",
-                                    "\nOB: %s" % ',  '.join(users_images) if users_images else ""))
+        scene = context.scene
+        if context.object and context.object.mode == 'EDIT':
+            bpy.ops.object.mode_set(mode='OBJECT')
 
-                                if ma.library:
-                                    libraries.append(ma.library.filepath)
+        self.__class__.objects = []
+        self.__class__.polygons = 0
+        meshes = {}
 
-        # Remove duplicates and sort
-        missing_groups = sorted(list(set(missing_groups)))
-        missing_images = sorted(list(set(missing_images)))
-        image_nodes_unlinked = sorted(list(set(image_nodes_unlinked)))
-        libraries = sorted(list(set(libraries)))
+        for ob in scene.objects:
+            if ob.type != 'MESH' or not ob.data.vertices:
+                continue
+            me = ob.data
+            if me not in meshes:
+                masks = mesh_health(me, scene.amaranth_debug_mesh_ngon_limit,
+                                    scene.amaranth_debug_mesh_distance)
+                meshes[me] = {kind: int(mask.sum()) for kind, mask in masks.items()}
+                self.__class__.polygons += len(me.polygons)
+
+            counts = meshes[me]
+            if any(counts.values()):
+                self.__class__.objects.append((ob.name, me.name, counts))
+
+        self.__class__.objects.sort()
+
+        if not self.__class__.objects:
+            self.report({"INFO"}, "No mesh problems found")
+            return {'FINISHED'}
+
+        print("\n* %d %s with problems found, %d faces checked in %.2f seconds\n" % (
+                len(self.__class__.objects),
+                "object" if len(self.__class__.objects) == 1 else "objects",
+                self.__class__.polygons, time.time() - start))
+
+        count = 0
+        for ob, me, counts in self.__class__.objects:
+            count += 1
+            print('%02d. %s (%s): %s' % (count, ob, me, ', '.join(
+                '%d %s' % (counts[kind], label)
+                for kind, label, element in mesh_health_kinds if counts[kind])))
+        print("\n")
 
-        print("\n\n== %s missing image %s, %s missing node %s and %s image %s unlinked ==" %
-            ("No" if self.__class__.count_images == 0 else str(self.__class__.count_images),
-            "node" if self.__class__.count_images == 1 else "nodes",
-            "no" if self.__class__.count_groups == 0 else str(self.__class__.count_groups),
-            "group" if self.__class__.count_groups == 1 else "groups",
-            "no" if self.__class__.count_image_node_unlinked == 0 else str(self.__class__.count_image_node_unlinked),
-            "node" if self.__class__.count_groups == 1 else "nodes"))
+        return {'FINISHED'}
 
-        # List Missing Node Groups
-        if missing_groups:
-            print("\n* Missing Node Group Links\n")
-            for mig in missing_groups:
-                print(mig)
+class AMTH_SCENE_OT_list_mesh_health_clear(Operator):
+    """Clear the list below"""
+    bl_idname = "scene.amaranth_list_mesh_health_clear"
+    bl_label = "Clear Mesh Problems List"
 
-        # List Missing Image Nodes
-        if missing_images:
-            print("\n* Missing Image Nodes Link\n")
+    def execute(self, context):
+        AMTH_SCENE_OT_list_mesh_health.objects[:] = []
+        AMTH_SCENE_OT_list_mesh_health.polygons = 0
+        print("* Cleared Mesh Problems List")
+        return {'FINISHED'}
 
-            for mii in missing_images:
-                print(mii)
+class AMTH_MESH_OT_health_select(Operator):
+    '''Select these faces or vertices in Edit Mode'''
+    bl_idname = "mesh.amaranth_health_select"
+    bl_label = "Select in Edit Mode"
+    bl_options = {'UNDO'}
 
-        # List Image Nodes with its outputs unlinked
-        if image_nodes_unlinked:
-            print("\n* Image Nodes Unlinked\n")
+    object = StringProperty()
+    kind = EnumProperty(
+        items=[(kind, label, "") for kind, label, element in mesh_health_kinds],
+        name="Kind")
 
-            for nou in image_nodes_unlinked:
-                print(nou)
+    def execute(self, context):
+        import numpy as np
 
-        if missing_groups or \
-           missing_images or \
-           image_nodes_unlinked:
-            if libraries:
-                print("\nThat's bad, run check on %s:" % (
-                    "this library" if len(libraries) == 1 else "these libraries"))
-                for li in libraries:
-                    print(li)
+        scene = context.scene
+        ob = bpy.data.objects.get(self.object)
+
+        if not ob or ob.type != 'MESH' or ob.name not in scene.objects:
+            self.report({'WARNING'}, "Object not found in this scene")
+            return {'CANCELLED'}
+
+        if context.object and context.object.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+        me = ob.data
+        mask = mesh_health(me, scene.amaranth_debug_mesh_ngon_limit,
+                           scene.amaranth_debug_mesh_distance)[self.kind]
+        is_face = dict((k, e) for k, l, e in mesh_health_kinds)[self.kind] == 'FACE'
+
+        if is_face:
+            loop_verts = np.empty(len(me.loops), dtype=np.int32)
+            me.loops.foreach_get("vertex_index", loop_verts)
+            totals = np.empty(len(me.polygons), dtype=np.int32)
+            me.polygons.foreach_get("loop_total", totals)
+
+            # Loops are stored face after face
+            verts = np.zeros(len(me.vertices), dtype=bool)
+            verts[loop_verts[np.repeat(mask, totals)]] = True
+            me.polygons.foreach_set("select", mask)
         else:
-            self.report({"INFO"}, "Yay! No missing node links")            
-
-        print("\n")
+            verts = mask
+            me.polygons.foreach_set("select", np.zeros(len(me.polygons), dtype=bool))
 
-        if missing_groups and missing_images:
-            self.report({"WARNING"}, "%d missing image %s and %d missing node %s found" %
-                (self.__class__.count_images, "node" if self.__class__.count_images == 1 else "nodes",
-                self.__class__.count_groups, "group" if self.__class__.count_groups == 1 else "groups"))
+        edge_verts = np.empty(len(me.edges) * 2, dtype=np.int32)
+        me.edges.foreach_get("vertices", edge_verts)
+        me.edges.foreach_set("select", verts[edge_verts].reshape(-1, 2).all(axis=1))
+        me.vertices.foreach_set("select", verts)
 
-        return{'FINISHED'}
+        bpy.ops.object.select_all(action='DESELECT')
+        ob.select = True
+        scene.objects.active = ob
+        scene.tool_settings.mesh_select_mode = (not is_face, False, is_face)
+        bpy.ops.object.mode_set(mode='EDIT')
 
-class AMTH_SCENE_OT_list_missing_material_slots(Operator):
-    '''List objects with empty material slots'''
-    bl_idname = "scene.list_missing_material_slots"
-    bl_label = "List Empty Material Slots"
+        return {'FINISHED'}
 
+# Evaluated Geometry: faces each object turns into at render time
+# Confirmed face counts, keyed by object, kept while its settings match
+evaluated_geometry = {}
+
+def modifiers_polygons(ob, polys, loops, edges):
+    """Estimated faces and loops after the render settings of each modifier"""
+    for md in ob.modifiers:
+        if not md.show_render:
+            continue
+
+        if md.type in {'SUBSURF', 'MULTIRES'} and md.render_levels:
+            # First level turns every loop into a quad, next ones split quads
+            polys = loops * 4 ** (md.render_levels - 1)
+            loops = polys * 4
+            continue
+
+        factor = 1.0
+        if md.type == 'ARRAY':
+            factor = md.count
+            if md.fit_type == 'FIT_LENGTH':
+                step = sum(abs(offset * size) for offset, size in
+                           zip(md.relative_offset_displace, ob.dimensions))
+                step += md.constant_offset_displace.length
+                if step > 0:
+                    factor = max(1, int(md.fit_length / step) + 1)
+            for cap in (md.start_cap, md.end_cap):
+                if cap and cap.type == 'MESH':
+                    polys += len(cap.data.polygons) / factor
+                    loops += len(cap.data.loops) / factor
+        elif md.type == 'MIRROR':
+            factor = 2 ** sum((md.use_x, md.use_y, md.use_z))
+        elif md.type == 'SOLIDIFY':
+            factor = 2
+        elif md.type == 'SCREW':
+            polys = loops = max(polys, edges)
+            loops *= 4
+            factor = md.render_steps * md.iterations
+        elif md.type == 'DECIMATE':
+            if md.decimate_type == 'COLLAPSE':
+                factor = md.ratio
+            elif md.decimate_type == 'UNSUBDIV':
+                factor = 0.25 ** md.iterations
+        elif md.type == 'PARTICLE_INSTANCE' and md.object:
+            factor = sum(particle_system_count(psys)
+                         for psys in md.object.particle_systems) or 1
+
+        polys *= factor
+        loops *= factor
+        edges *= factor
+
+    return int(polys), int(loops)
+
+def particle_system_count(psys):
+    settings = psys.settings
+    count = settings.count
+    if settings.child_type != 'NONE':
+        count *= max(1, settings.rendered_child_count)
+    return count
+
+def objects_polygons(objects, stack):
+    return sum(object_polygons(ob, stack) for ob in objects)
+
+def object_polygons(ob, stack=None):
+    """Estimated render faces of an object, its own and the instanced ones"""
+    if stack is None:
+        stack = set()
+    if ob in stack:
+        return 0
+    stack.add(ob)
+
+    polys = 0
+    if ob.type == 'MESH':
+        me = ob.data
+        polys = modifiers_polygons(ob, len(me.polygons), len(me.loops),
+                                   len(me.edges))[0]
+    instanced = object_instanced_polygons(ob, stack)
+
+    stack.discard(ob)
+    return polys + instanced
+
+def object_instanced_polygons(ob, stack):
+    polys = 0
+
+    for psys in ob.particle_systems:
+        settings = psys.settings
+        if settings.render_type == 'OBJECT' and settings.dupli_object:
+            each = object_polygons(settings.dupli_object, stack)
+        elif settings.render_type == 'GROUP' and settings.dupli_group:
+            objects = settings.dupli_group.objects
+            each = objects_polygons(objects, stack)
+            if not settings.use_whole_group and objects:
+                each /= len(objects)
+        else:
+            continue
+        polys += each * particle_system_count(psys)
+
+    if ob.dupli_type == 'GROUP' and ob.dupli_group:
+        polys += objects_polygons(ob.dupli_group.objects, stack)
+    elif ob.dupli_type in {'VERTS', 'FACES'} and ob.type == 'MESH':
+        elements = ob.data.vertices if ob.dupli_type == 'VERTS' else ob.data.polygons
+        polys += objects_polygons(ob.children, stack) * len(elements)
+
+    return int(polys)
+
+def evaluated_geometry_signature(ob):
+    """Changes whenever the evaluated face count of the object may change"""
+    signature = [rna_signature(md, depth=0) for md in ob.modifiers]
+    if ob.type == 'MESH':
+        signature.append((ob.data.name, len(ob.data.vertices),
+                          len(ob.data.polygons)))
+    return signature_hash(signature)
+
+def evaluated_geometry_cached(ob):
+    key = datablock_key("objects", ob)
+    if key in evaluated_geometry:
+        signature, polys = evaluated_geometry[key]
+        if signature == evaluated_geometry_signature(ob):
+            return polys
+    return None
+
+def evaluated_geometry_evaluate(scene, ob):
+    me = ob.to_mesh(scene, True, 'RENDER')
+    polys = len(me.polygons)
+    bpy.data.meshes.remove(me)
+
+    evaluated_geometry[datablock_key("objects", ob)] = (
+        evaluated_geometry_signature(ob), polys)
+    return polys
+
+class AMTH_SCENE_OT_list_evaluated_geometry(Operator):
+    '''List the objects with the most faces at render time, estimated from their modifiers and instances'''
+    bl_idname = "scene.amaranth_list_evaluated_geometry"
+    bl_label = "List Heaviest Objects"
+
+    # [object, base faces, faces, instanced faces, memory, evaluated faces]
     objects = []
-    libraries = []
 
     def execute(self, context):
+        scene = context.scene
         self.__class__.objects = []
-        self.__class__.libraries = []
 
-        for ob in bpy.data.objects:
-            for ma in ob.material_slots:
-                if not ma.material:
-                    self.__class__.objects.append('%s%s' % (
-                        '[L] ' if ob.library else '',
-                        ob.name))
-                    if ob.library:
-                        self.__class__.libraries.append(ob.library.filepath)
+        for ob in scene.objects:
+            if ob.type == 'MESH':
+                me = ob.data
+                polys, loops = modifiers_polygons(
+                    ob, len(me.polygons), len(me.loops), len(me.edges))
+                # Keep the proportions of the original mesh
+                size = mesh_memory_size(me) * polys / max(1, len(me.polygons))
+                base = len(me.polygons)
+            else:
+                polys = size = base = 0
 
-        self.__class__.objects = sorted(list(set(self.__class__.objects)))
-        self.__class__.libraries = sorted(list(set(self.__class__.libraries)))
+            instanced = object_instanced_polygons(ob, {ob})
+            if not polys and not instanced:
+                continue
 
-        if len(self.__class__.objects) == 0:
-            self.report({"INFO"}, "No objects with empty material slots found")
-        else:
-            print("\n* A total of %d %s with empty material slots was found \n" % (
-                    len(self.__class__.objects),
-                    "object" if len(self.__class__.objects) == 1 else "objects"))
+            self.__class__.objects.append(
+                [ob.name, base, polys, instanced, int(size),
+                 evaluated_geometry_cached(ob)])
 
-            count = 0
-            count_lib = 0
+        self.__class__.objects.sort(key=lambda entry: entry[2] + entry[3],
+                                    reverse=True)
 
-            for obs in self.__class__.objects:
-                print('%02d. %s' % (
-                    count+1, self.__class__.objects[count]))
-                count += 1
+        if not self.__class__.objects:
+            self.report({"INFO"}, "No geometry found")
+            return {'FINISHED'}
 
-            if self.__class__.libraries:
-                print("\n\n* Check %s:\n" % 
-                    ("this library" if len(self.__class__.libraries) == 1
-                        else "these libraries"))
+        print("\n* Heaviest objects at render time (estimated)\n")
 
-                for libs in self.__class__.libraries:
-                    print('%02d. %s' % (
-                        count_lib+1, self.__class__.libraries[count_lib]))
-                    count_lib += 1
-            print("\n")
+        count = 0
+        for ob, base, polys, instanced, size, evaluated in self.__class__.objects[:20]:
+            count += 1
+            print('%02d. %s: %s faces (%s in the mesh)%s, %s%s' % (
+                count, ob, polys, base,
+                ', %s instanced' % instanced if instanced else '',
+                bytes_to_human(size),
+                ', %s evaluated' % evaluated if evaluated is not None else ''))
+        print("\n")
+
+        return {'FINISHED'}
+
+class AMTH_SCENE_OT_list_evaluated_geometry_clear(Operator):
+    """Clear the list below"""
+    bl_idname = "scene.amaranth_list_evaluated_geometry_clear"
+    bl_label = "Clear Heaviest Objects List"
+
+    def execute(self, context):
+        AMTH_SCENE_OT_list_evaluated_geometry.objects[:] = []
+        print("* Cleared Heaviest Objects List")
+        return {'FINISHED'}
+
+class AMTH_SCENE_OT_evaluated_geometry_confirm(Operator):
+    '''Evaluate the listed meshes with their render settings to confirm the estimates, one at a time (Esc to stop)'''
+    bl_idname = "scene.amaranth_evaluated_geometry_confirm"
+    bl_label = "Evaluate Heaviest Objects"
+
+    _timer = None
+
+    @classmethod
+    def poll(cls, context):
+        return AMTH_SCENE_OT_list_evaluated_geometry.objects
+
+    def invoke(self, context, event):
+        self.queue = [entry for entry in
+                      AMTH_SCENE_OT_list_evaluated_geometry.objects[:20]
+                      if entry[5] is None and entry[1]]
+        if not self.queue:
+            self.report({"INFO"}, "Listed objects are already evaluated")
+            return {'FINISHED'}
+
+        self.total = len(self.queue)
+        wm = context.window_manager
+        wm.progress_begin(0, self.total)
+        self._timer = wm.event_timer_add(0.1, context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self.finish(context)
+            return {'CANCELLED'}
+
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        entry = self.queue.pop(0)
+        ob = context.scene.objects.get(entry[0])
+        if ob:
+            entry[5] = evaluated_geometry_evaluate(context.scene, ob)
+            print("* Evaluated %s: %s faces, %s estimated" % (
+                entry[0], entry[5], entry[2]))
+
+        context.window_manager.progress_update(self.total - len(self.queue))
+        for area in context.screen.areas:
+            if area.type == 'PROPERTIES':
+                area.tag_redraw()
+
+        if not self.queue:
+            self.finish(context)
+            return {'FINISHED'}
+
+        return {'RUNNING_MODAL'}
+
+    def finish(self, context):
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+
+# Texture Memory: what images cost once loaded, per material
+def texture_memory_report(scene):
+    """(materials, total) where materials is a list of
+    (material, size, [(image, size), ...]) used in the scene, biggest first,
+    and total the size of the scene's images, each counted once"""
+    objects = {ob.name for ob in scene.objects}
+    materials = {}
+    used = {}
+
+    for im in bpy.data.images:
+        if im.type in {'RENDER_RESULT', 'COMPOSITING'}:
+            continue
+        users_materials, users_objects = image_users(im)
+        if not objects.intersection(users_objects):
+            continue
+        used[im] = image_memory_size(im)
+        for ma in users_materials:
+            materials.setdefault(ma, []).append(im)
+
+    if scene.world and scene.world.node_tree:
+        images = {datablock_key("images", im): im for im in bpy.data.images}
+        for key in node_tree_image_users(scene.world.node_tree)["images"]:
+            im = images.get(key)
+            if im:
+                used[im] = image_memory_size(im)
+                materials.setdefault("World", []).append(im)
+
+    report = []
+    for ma, images in materials.items():
+        images = sorted(((im.name, used[im]) for im in images),
+                        key=lambda entry: entry[1], reverse=True)
+        report.append((ma, sum(size for name, size in images), images))
+
+    report.sort(key=lambda entry: entry[1], reverse=True)
+    return report, sum(used.values())
+
+texture_proxy_script = '''
+import bpy, json, sys
+
+scene = bpy.context.scene
+settings = scene.render.image_settings
+
+for source, target, width, height, file_format, depth, raw in json.load(
+        open(sys.argv[sys.argv.index("--") + 1])):
+    try:
+        im = bpy.data.images.load(source)
+        if raw:
+            im.colorspace_settings.name = "Non-Color"
+        if (width, height) != tuple(im.size):
+            im.scale(width, height)
+        scene.view_settings.view_transform = "Raw" if raw else "Default"
+        settings.file_format = file_format
+        settings.color_depth = depth
+        im.save_render(target, scene)
+        bpy.data.images.remove(im)
+    except Exception as e:
+        print("Amaranth: could not write %s (%s)" % (target, e))
+'''
+
+def texture_proxy_filepath(im, scale, eight_bit):
+    """Where the proxy of an image goes, next to the blend file"""
+    import hashlib
+    import os
+
+    source = image_filepath_normalized(im)
+    name = os.path.splitext(os.path.basename(source))[0]
+    float_buffer = image_is_float(im) and not eight_bit
+    extension = ".exr" if float_buffer else \
+                ".jpg" if im.file_format == 'JPEG' else ".png"
+
+    directory = os.path.join(os.path.dirname(bpy.data.filepath) or
+                             bpy.app.tempdir, "textures_proxy")
+    return os.path.join(directory, "%s_%s_%s%s%s" % (
+        name, hashlib.md5(source.encode('utf-8')).hexdigest()[:8],
+        "full" if scale == 1 else "1-%d" % scale,
+        "_8bit" if eight_bit and image_is_float(im) else "",
+        extension))
+
+def texture_proxy_job(im, scale, eight_bit):
+    """Arguments for texture_proxy_script to write the proxy of an image"""
+    width, height = image_resolution(im)
+    float_buffer = image_is_float(im) and not eight_bit
+    raw = im.colorspace_settings.name == 'Non-Color'
+
+    if float_buffer:
+        file_format, depth = 'OPEN_EXR', '16'
+    else:
+        file_format = 'JPEG' if im.file_format == 'JPEG' else 'PNG'
+        depth = '8'
+
+    return (image_filepath_normalized(im),
+            texture_proxy_filepath(im, scale, eight_bit),
+            max(1, width // scale), max(1, height // scale),
+            file_format, depth, raw)
+
+def texture_proxy_cached(job):
+    """The proxy was already written, after the last change to its source"""
+    import os
+    source, target = job[:2]
+    return os.path.isfile(target) and \
+           os.path.getmtime(target) >= os.path.getmtime(source)
+
+def texture_proxy_use(im, filepath, eight_bit, viewport=False):
+    """Point an image to its proxy, remembering the original file"""
+    im["amth_proxy_original"] = im.filepath
+    im["amth_proxy_viewport"] = viewport
+    im["amth_proxy_colorspace"] = im.colorspace_settings.name
+    # Float images written as 8-bit went through the display transform
+    display = eight_bit and image_is_float(im) and \
+              im.colorspace_settings.name != 'Non-Color'
+
+    im.filepath = bpy.path.relpath(filepath) if bpy.data.filepath else filepath
+    if display:
+        im.colorspace_settings.name = 'sRGB'
+    im.reload()
+
+def texture_proxy_revert(im):
+    im.filepath = im["amth_proxy_original"]
+    im.colorspace_settings.name = im["amth_proxy_colorspace"]
+    del im["amth_proxy_original"]
+    del im["amth_proxy_colorspace"]
+    im.pop("amth_proxy_viewport", None)
+    im.reload()
+
+# Images of viewport proxies back to their original files for the render
+# (image, proxy filepath, proxy colorspace)
+texture_proxies_rendering = []
+
+@persistent
+def texture_proxies_render_pre(scene):
+    if texture_proxies_rendering:
+        return
+
+    for im in bpy.data.images:
+        if im.get("amth_proxy_viewport"):
+            texture_proxies_rendering.append(
+                (im.name, im.filepath, im.colorspace_settings.name))
+            im.filepath = im["amth_proxy_original"]
+            im.colorspace_settings.name = im["amth_proxy_colorspace"]
+            im.reload()
+
+@persistent
+def texture_proxies_render_post(scene):
+    for name, filepath, colorspace in texture_proxies_rendering:
+        im = bpy.data.images.get(name)
+        if im:
+            im.filepath = filepath
+            im.colorspace_settings.name = colorspace
+            im.reload()
+    texture_proxies_rendering[:] = []
+
+class AMTH_SCENE_OT_list_texture_memory(Operator):
+    '''Estimate the memory each image takes once loaded, per material'''
+    bl_idname = "scene.amaranth_list_texture_memory"
+    bl_label = "List Texture Memory"
+
+    materials = []
+    total = 0
+
+    def execute(self, context):
+        images_users_index_build()
+        self.__class__.materials, self.__class__.total = \
+            texture_memory_report(context.scene)
+
+        if not self.__class__.materials:
+            self.report({"INFO"}, "No images used in this scene")
+            return {'FINISHED'}
+
+        print("\n* Texture memory: %s in scene %s\n" % (
+                bytes_to_human(self.__class__.total), context.scene.name))
+
+        count = 0
+        for ma, size, images in self.__class__.materials:
+            count += 1
+            print('%02d. %s: %s' % (count, ma, bytes_to_human(size)))
+            for name, size in images:
+                print('\t%s: %s' % (name, bytes_to_human(size)))
+        print("\n")
+
+        return {'FINISHED'}
+
+class AMTH_SCENE_OT_list_texture_memory_clear(Operator):
+    """Clear the list below"""
+    bl_idname = "scene.amaranth_list_texture_memory_clear"
+    bl_label = "Clear Texture Memory List"
+
+    def execute(self, context):
+        AMTH_SCENE_OT_list_texture_memory.materials[:] = []
+        AMTH_SCENE_OT_list_texture_memory.total = 0
+        print("* Cleared Texture Memory List")
+        return {'FINISHED'}
+
+class AMTH_SCENE_OT_texture_proxies_make(Operator):
+    '''Write smaller copies of the biggest images used in this scene and use them instead'''
+    bl_idname = "scene.amaranth_texture_proxies_make"
+    bl_label = "Use Texture Proxies"
+    bl_options = {'UNDO'}
+
+    scale = EnumProperty(
+        items=(('1', "Full", "Keep the resolution"),
+               ('2', "Half", "Half the resolution, a quarter of the memory"),
+               ('4', "Quarter", "Quarter resolution, a sixteenth of the memory")),
+        name="Resolution",
+        default='2')
+    eight_bit = BoolProperty(
+        name="8-bit",
+        description="Write float images as 8-bit, a quarter of the memory",
+        default=False)
+    min_size = IntProperty(
+        name="Bigger than (MB)",
+        description="Only images taking more memory than this",
+        default=64, min=0)
+    viewport = BoolProperty(
+        name="Viewport Only",
+        description="Use the original files for final renders, "
+                    "and the proxies everywhere else",
+        default=False)
+
+    running = False
+
+    _timer = None
+
+    @classmethod
+    def poll(cls, context):
+        return not cls.running
 
-        return{'FINISHED'}
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
 
-class AMTH_SCENE_OT_list_missing_material_slots_clear(Operator):
-    """Clear the list below"""
-    bl_idname = "scene.list_missing_material_slots_clear"
-    bl_label = "Clear Empty Material Slots List"
-    
     def execute(self, context):
-        AMTH_SCENE_OT_list_missing_material_slots.objects[:] = []
-        print("* Cleared Empty Material Slots List")
+        import os
+        scale = int(self.scale)
+
+        images_users_index_build()
+        objects = {ob.name for ob in context.scene.objects}
+        images = [im for im in bpy.data.images
+                  if im.source == 'FILE' and not im.packed_file and
+                  not im.library and
+                  "amth_proxy_original" not in im and
+                  (scale > 1 or self.eight_bit and image_is_float(im)) and
+                  image_memory_size(im) >= self.min_size * 1024 * 1024 and
+                  os.path.isfile(image_filepath_normalized(im)) and
+                  objects.intersection(image_users(im)[1])]
+
+        if not images:
+            self.report({"INFO"}, "No images to make proxies of")
+            return {'FINISHED'}
+
+        jobs = [texture_proxy_job(im, scale, self.eight_bit) for im in images]
+        missing = [job for job in jobs if not texture_proxy_cached(job)]
+        for job in missing:
+            os.makedirs(os.path.dirname(job[1]), exist_ok=True)
+
+        print("\n* Writing %d texture proxies, %d already written\n" % (
+                len(missing), len(jobs) - len(missing)))
+        self.jobs = [(datablock_key("images", im), job) for im, job in zip(images, jobs)]
+        self.thread = background_blender_thread(texture_proxy_script, missing)
+        self.__class__.running = True
+
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(0.5, context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+        if self.thread.is_alive():
+            return {'RUNNING_MODAL'}
+
+        import os
+
+        context.window_manager.event_timer_remove(self._timer)
+        self.__class__.running = False
+
+        images = {datablock_key("images", im): im for im in bpy.data.images}
+        count = 0
+        saved = 0
+        for key, job in self.jobs:
+            im = images.get(key)
+            if im is None:
+                continue
+            if not os.path.isfile(job[1]):
+                print("Missing proxy for %s" % im.name)
+                continue
+            size = image_memory_size(im)
+            texture_proxy_use(im, job[1], self.eight_bit, self.viewport)
+            saved += size - image_memory_size(im)
+            count += 1
+            print('%02d. %s: %s' % (count, im.name, bpy.path.basename(job[1])))
+        print("\n")
+
+        self.report({"INFO"}, "%d %s using proxies, %s saved" % (
+            count, "image" if count == 1 else "images", bytes_to_human(saved)))
         return {'FINISHED'}
 
-class AMTH_SCENE_OT_blender_instance_open(Operator):
-    '''Open in a new Blender instance'''
-    bl_idname = "scene.blender_instance_open"
-    bl_label = "Open Blender Instance"
-    filepath = bpy.props.StringProperty()
+class AMTH_SCENE_OT_texture_proxies_revert(Operator):
+    '''Use the original files of all images again'''
+    bl_idname = "scene.amaranth_texture_proxies_revert"
+    bl_label = "Revert Texture Proxies"
+    bl_options = {'UNDO'}
 
-    def execute(self, context):
-        if self.filepath:
-            import os.path
-            filepath = os.path.normpath(bpy.path.abspath(self.filepath))
+    @classmethod
+    def poll(cls, context):
+        return any("amth_proxy_original" in im for im in bpy.data.images)
 
-            import subprocess
-            try:
-                subprocess.Popen([bpy.app.binary_path, filepath])
-            except:
-                print("Error on the new Blender instance")
-                import traceback
-                traceback.print_exc()
+    def execute(self, context):
+        count = 0
+        for im in bpy.data.images:
+            if "amth_proxy_original" in im:
+                texture_proxy_revert(im)
+                count += 1
 
-        return{'FINISHED'}
+        self.report({"INFO"}, "%d %s using their original files" % (
+            count, "image" if count == 1 else "images"))
+        return {'FINISHED'}
 
 class AMTH_SCENE_PT_scene_debug(Panel):
     '''Scene Debug'''
@@ -1849,7 +8088,8 @@ class AMTH_SCENE_PT_scene_debug(Panel):
                             im.name, im.users,
                             ' [F]' if im.use_fake_user else ''),
                             im.filepath if im.filepath else 'No Filepath',
-                            im.library.filepath if im.library else ''])
+                            im.library.filepath if im.library else '',
+                            im])
 
             if images_missing:
                 row = col.row(align=True)
@@ -1879,6 +8119,20 @@ class AMTH_SCENE_PT_scene_debug(Panel):
                                          text=mis[2],
                                          icon="LINK_BLEND",
                                          emboss=False).filepath=mis[2]
+
+                        users_materials, users_objects = image_users(mis[3])
+                        if users_materials:
+                            col.label(text="MA: %s" % ', '.join(users_materials),
+                                      icon="MATERIAL")
+                        if users_objects:
+                            row = col.row(align=True)
+                            row.label(text="OB: %s" % ', '.join(users_objects),
+                                      icon="OBJECT_DATA")
+                            props = row.operator(
+                                AMTH_SCENE_OT_image_select_users.bl_idname,
+                                icon="RESTRICT_SELECT_OFF")
+                            props.image = mis[3].name
+                            props.library = mis[2]
                         col.separator()
             else:
                 row = col.row(align=True)
@@ -1928,6 +8182,40 @@ class AMTH_SCENE_PT_scene_debug(Panel):
                         count += 1
                         col.label(text='%s' % (materials[count-1]), icon="MATERIAL")
 
+            # Rank Materials by Cost
+            list_material_complexity = scene.amaranth_debug_scene_list_material_complexity
+
+            box = layout.box()
+            split = box.split()
+            col = split.column(align=True)
+            col.label(text="Materials Cost")
+
+            row = split.row(align=True)
+            row.operator(AMTH_SCENE_OT_material_complexity.bl_idname,
+                            icon="SORTSIZE",
+                            text="Rank Materials by Cost")
+            if material_complexity["materials"] is not None:
+                row.operator(AMTH_SCENE_OT_material_complexity_clear.bl_idname,
+                                icon="X", text="")
+
+                ranking = material_complexity_report()
+
+                col = box.column(align=True)
+                row = col.row(align=True)
+                row.alignment = 'LEFT'
+                row.prop(scene, 'amaranth_debug_scene_list_material_complexity',
+                            icon="%s" % 'TRIA_DOWN' if list_material_complexity else 'TRIA_RIGHT',
+                            emboss=False)
+                row.label(text="%s %s ranked%s" % (
+                    len(ranking), 'material' if len(ranking) == 1 else 'materials',
+                    ', top 20 below (full list in console)' if len(ranking) > 20 else ''),
+                    icon="INFO")
+
+                if list_material_complexity:
+                    for entry in ranking[:20]:
+                        col.label(text=material_complexity_label(entry),
+                                  icon="MATERIAL")
+
         # List Missing Node Trees
         box = layout.box()
         row = box.row(align=True)
@@ -2013,6 +8301,394 @@ class AMTH_SCENE_PT_scene_debug(Panel):
                                      text=missing_material_slots_lib[count_lib-1],
                                      icon="LINK_BLEND",
                                      emboss=False).filepath=missing_material_slots_lib[count_lib-1]
+        # List Orphan Data
+        orphans = AMTH_SCENE_OT_list_orphan_data.orphans
+        orphans_libraries = AMTH_SCENE_OT_list_orphan_data.libraries
+        list_orphan_data = scene.amaranth_debug_scene_list_orphan_data
+
+        box = layout.box()
+        split = box.split()
+        col = split.column(align=True)
+        col.label(text="Orphan Data")
+
+        row = split.row(align=True)
+        row.operator(AMTH_SCENE_OT_list_orphan_data.bl_idname,
+                        icon="ORPHAN_DATA",
+                        text="List Orphan Data")
+        if orphans or orphans_libraries:
+            row.operator(AMTH_SCENE_OT_list_orphan_data_clear.bl_idname,
+                            icon="X", text="")
+
+            col = box.column(align=True)
+            row = col.row(align=True)
+            row.alignment = 'LEFT'
+            row.prop(scene, 'amaranth_debug_scene_list_orphan_data',
+                        icon="%s" % 'TRIA_DOWN' if list_orphan_data else 'TRIA_RIGHT',
+                        emboss=False)
+            row.label(text="%s orphan %s, ~%s memory, ~%s in file" % (
+                len(orphans), 'datablock' if len(orphans) == 1 else 'datablocks',
+                bytes_to_human(AMTH_SCENE_OT_list_orphan_data.memory),
+                bytes_to_human(AMTH_SCENE_OT_list_orphan_data.filesize)),
+                icon="INFO")
+
+            if list_orphan_data:
+                for orphan in orphans:
+                    col.label(text=orphan[0], icon=orphan[1])
+
+                if orphans_libraries:
+                    col.separator()
+                    col.label(text="Unused %s:" % (
+                        "library" if len(orphans_libraries) == 1 else "libraries"))
+                    for li in orphans_libraries:
+                        row = col.row(align=True)
+                        row.alignment = "LEFT"
+                        row.operator(AMTH_SCENE_OT_blender_instance_open.bl_idname,
+                                     text=li,
+                                     icon="LINK_BLEND",
+                                     emboss=False).filepath=li
+
+            if orphans:
+                col.separator()
+                col.operator(AMTH_SCENE_OT_orphan_data_purge.bl_idname,
+                             icon="CANCEL")
+
+        # List Duplicate Materials
+        duplicate_materials = AMTH_SCENE_OT_list_duplicate_materials.clusters
+        duplicate_materials_count = AMTH_SCENE_OT_list_duplicate_materials.duplicates
+        list_duplicate_materials = scene.amaranth_debug_scene_list_duplicate_materials
+
+        box = layout.box()
+        split = box.split()
+        col = split.column(align=True)
+        col.label(text="Duplicate Materials")
+
+        row = split.row(align=True)
+        row.operator(AMTH_SCENE_OT_list_duplicate_materials.bl_idname,
+                        icon="MATERIAL",
+                        text="List Duplicate Materials")
+        if duplicate_materials:
+            row.operator(AMTH_SCENE_OT_list_duplicate_materials_clear.bl_idname,
+                            icon="X", text="")
+
+            col = box.column(align=True)
+            row = col.row(align=True)
+            row.alignment = 'LEFT'
+            row.prop(scene, 'amaranth_debug_scene_list_duplicate_materials',
+                        icon="%s" % 'TRIA_DOWN' if list_duplicate_materials else 'TRIA_RIGHT',
+                        emboss=False)
+            row.label(text="%s %s can go, shaders: %s -> %s" % (
+                duplicate_materials_count,
+                'material' if duplicate_materials_count == 1 else 'materials',
+                AMTH_SCENE_OT_list_duplicate_materials.shaders_used,
+                AMTH_SCENE_OT_list_duplicate_materials.shaders_after),
+                icon="INFO")
+
+            if list_duplicate_materials:
+                for canonical, duplicates in duplicate_materials:
+                    col.label(text="%s <- %s" % (canonical, ', '.join(duplicates)),
+                              icon="MATERIAL")
+
+            col.separator()
+            col.operator(AMTH_SCENE_OT_merge_duplicate_materials.bl_idname,
+                         icon="AUTOMERGE_ON")
+
+        # List Duplicate Images
+        duplicate_images = AMTH_SCENE_OT_list_duplicate_images.clusters
+        duplicate_images_count = AMTH_SCENE_OT_list_duplicate_images.duplicates
+        list_duplicate_images = scene.amaranth_debug_scene_list_duplicate_images
+
+        box = layout.box()
+        split = box.split()
+        col = split.column(align=True)
+        col.label(text="Duplicate Images")
+
+        row = split.row(align=True)
+        row.operator(AMTH_SCENE_OT_list_duplicate_images.bl_idname,
+                        icon="IMAGE_DATA",
+                        text="List Duplicate Images")
+        if duplicate_images:
+            row.operator(AMTH_SCENE_OT_list_duplicate_images_clear.bl_idname,
+                            icon="X", text="")
+
+            col = box.column(align=True)
+            row = col.row(align=True)
+            row.alignment = 'LEFT'
+            row.prop(scene, 'amaranth_debug_scene_list_duplicate_images',
+                        icon="%s" % 'TRIA_DOWN' if list_duplicate_images else 'TRIA_RIGHT',
+                        emboss=False)
+            row.label(text="%s duplicate %s, ~%s of memory" % (
+                duplicate_images_count,
+                'image' if duplicate_images_count == 1 else 'images',
+                bytes_to_human(AMTH_SCENE_OT_list_duplicate_images.memory)),
+                icon="INFO")
+
+            if list_duplicate_images:
+                for canonical, duplicates, memory in duplicate_images:
+                    col.label(text="%s <- %s [%s]" % (
+                        canonical, ', '.join(duplicates), bytes_to_human(memory)),
+                        icon="IMAGE_DATA")
+
+            col.separator()
+            col.operator(AMTH_SCENE_OT_merge_duplicate_images.bl_idname,
+                         icon="AUTOMERGE_ON")
+
+        # List Duplicate Object Data
+        duplicate_data = AMTH_SCENE_OT_list_duplicate_object_data.clusters
+        duplicate_data_count = AMTH_SCENE_OT_list_duplicate_object_data.duplicates
+        list_duplicate_data = scene.amaranth_debug_scene_list_duplicate_object_data
+
+        box = layout.box()
+        split = box.split()
+        col = split.column(align=True)
+        col.label(text="Instancing")
+
+        row = split.row(align=True)
+        row.operator(AMTH_SCENE_OT_list_duplicate_object_data.bl_idname,
+                        icon="MOD_ARRAY",
+                        text="List Duplicate Mesh/Lamp Data")
+        if duplicate_data:
+            row.operator(AMTH_SCENE_OT_list_duplicate_object_data_clear.bl_idname,
+                            icon="X", text="")
+
+            col = box.column(align=True)
+            row = col.row(align=True)
+            row.alignment = 'LEFT'
+            row.prop(scene, 'amaranth_debug_scene_list_duplicate_object_data',
+                        icon="%s" % 'TRIA_DOWN' if list_duplicate_data else 'TRIA_RIGHT',
+                        emboss=False)
+            row.label(text="%s %s can go, ~%s of memory" % (
+                duplicate_data_count,
+                'datablock' if duplicate_data_count == 1 else 'datablocks',
+                bytes_to_human(AMTH_SCENE_OT_list_duplicate_object_data.memory)),
+                icon="INFO")
+
+            if list_duplicate_data:
+                for cluster in duplicate_data:
+                    col.label(text=cluster[0], icon=cluster[1])
+
+            col.separator()
+            col.operator(AMTH_SCENE_OT_link_duplicate_object_data.bl_idname,
+                         icon="LINKED")
+
+        # Node Groups Usage
+        list_node_groups = scene.amaranth_debug_scene_list_node_groups
+
+        box = layout.box()
+        split = box.split()
+        col = split.column(align=True)
+        col.label(text="Node Groups")
+
+        row = split.row(align=True)
+        row.operator(AMTH_SCENE_OT_node_groups_graph.bl_idname,
+                        icon="NODETREE",
+                        text="Node Groups Usage")
+        if node_groups_graph["trees"] is not None:
+            row.operator(AMTH_SCENE_OT_node_groups_graph_clear.bl_idname,
+                            icon="X", text="")
+
+            node_groups = node_groups_graph_report()
+            node_groups_unused = len([g for g in node_groups if not g["instances"]])
+
+            col = box.column(align=True)
+            row = col.row(align=True)
+            row.alignment = 'LEFT'
+            row.prop(scene, 'amaranth_debug_scene_list_node_groups',
+                        icon="%s" % 'TRIA_DOWN' if list_node_groups else 'TRIA_RIGHT',
+                        emboss=False)
+            row.label(text="%s %s, %s unused, max depth %s" % (
+                len(node_groups), 'group' if len(node_groups) == 1 else 'groups',
+                node_groups_unused,
+                max([g["depth"] for g in node_groups] or [0])),
+                icon="INFO")
+
+            if list_node_groups:
+                for group in node_groups:
+                    name = "%s%s" % ('[L] ' if group["library"] else '', group["name"])
+                    if not group["instances"]:
+                        col.label(text="%s *** Unused ***" % name, icon="ERROR")
+                        continue
+
+                    col.label(text="%s [depth %s] %s nodes x %s = %s" % (
+                        name, group["depth"], group["nodes"],
+                        group["instances"], group["cost"]),
+                        icon="NODETREE")
+                    if group["users"]:
+                        row = col.row(align=True)
+                        row.label(icon="BLANK1")
+                        row.label(text="%s%s" % (
+                            ', '.join('%s x%s' % (user[1], instances)
+                                      for user, instances in group["users"][:4]),
+                            ' (+%s)' % (len(group["users"]) - 4)
+                                if len(group["users"]) > 4 else ''))
+
+        # List Mesh Problems
+        mesh_health_objects = AMTH_SCENE_OT_list_mesh_health.objects
+        list_mesh_health = scene.amaranth_debug_scene_list_mesh_health
+
+        box = layout.box()
+        split = box.split()
+        col = split.column(align=True)
+        col.label(text="Mesh Health")
+
+        row = split.row(align=True)
+        row.operator(AMTH_SCENE_OT_list_mesh_health.bl_idname,
+                        icon="MESH_DATA",
+                        text="List Mesh Problems")
+        if mesh_health_objects:
+            row.operator(AMTH_SCENE_OT_list_mesh_health_clear.bl_idname,
+                            icon="X", text="")
+
+        row = box.row(align=True)
+        row.prop(scene, "amaranth_debug_mesh_distance")
+        row.prop(scene, "amaranth_debug_mesh_ngon_limit")
+
+        if mesh_health_objects:
+            col = box.column(align=True)
+            row = col.row(align=True)
+            row.alignment = 'LEFT'
+            row.prop(scene, 'amaranth_debug_scene_list_mesh_health',
+                        icon="%s" % 'TRIA_DOWN' if list_mesh_health else 'TRIA_RIGHT',
+                        emboss=False)
+            row.label(text="%s %s with problems, %s faces checked" % (
+                len(mesh_health_objects),
+                'object' if len(mesh_health_objects) == 1 else 'objects',
+                AMTH_SCENE_OT_list_mesh_health.polygons),
+                icon="INFO")
+
+            if list_mesh_health:
+                for ob, me, counts in mesh_health_objects:
+                    col.label(text="%s [%s]" % (ob, me), icon="OBJECT_DATA")
+                    row = col.row(align=True)
+                    for kind, label, element in mesh_health_kinds:
+                        if counts[kind]:
+                            props = row.operator(
+                                AMTH_MESH_OT_health_select.bl_idname,
+                                text="%s %s" % (counts[kind], label),
+                                icon="FACESEL" if element == 'FACE' else "VERTEXSEL")
+                            props.object = ob
+                            props.kind = kind
+                    col.separator()
+
+        # List Heaviest Objects
+        evaluated_objects = AMTH_SCENE_OT_list_evaluated_geometry.objects
+        list_evaluated = scene.amaranth_debug_scene_list_evaluated_geometry
+
+        box = layout.box()
+        split = box.split()
+        col = split.column(align=True)
+        col.label(text="Render Geometry")
+
+        row = split.row(align=True)
+        row.operator(AMTH_SCENE_OT_list_evaluated_geometry.bl_idname,
+                        icon="MOD_SUBSURF",
+                        text="List Heaviest Objects")
+        if evaluated_objects:
+            row.operator(AMTH_SCENE_OT_evaluated_geometry_confirm.bl_idname,
+                            icon="FILE_REFRESH", text="")
+            row.operator(AMTH_SCENE_OT_list_evaluated_geometry_clear.bl_idname,
+                            icon="X", text="")
+
+            col = box.column(align=True)
+            row = col.row(align=True)
+            row.alignment = 'LEFT'
+            row.prop(scene, 'amaranth_debug_scene_list_evaluated_geometry',
+                        icon="%s" % 'TRIA_DOWN' if list_evaluated else 'TRIA_RIGHT',
+                        emboss=False)
+            row.label(text="%s faces at render time (estimated)" %
+                sum(entry[2] + entry[3] for entry in evaluated_objects),
+                icon="INFO")
+
+            if list_evaluated:
+                for ob, base, polys, instanced, size, evaluated in evaluated_objects[:20]:
+                    row = col.row(align=True)
+                    split = row.split(percentage=0.4)
+                    split.label(text=ob, icon="OBJECT_DATA")
+                    split = split.split(percentage=0.5)
+                    if evaluated is not None:
+                        split.label(text="%s faces" % evaluated, icon="FILE_TICK")
+                    else:
+                        split.label(text="~%s faces" % polys)
+                    split.label(text="%s%s" % (bytes_to_human(size),
+                        ", ~%s inst." % instanced if instanced else ''))
+
+        # List Texture Memory
+        texture_materials = AMTH_SCENE_OT_list_texture_memory.materials
+        list_texture_memory = scene.amaranth_debug_scene_list_texture_memory
+
+        box = layout.box()
+        split = box.split()
+        col = split.column(align=True)
+        col.label(text="Texture Memory")
+
+        row = split.row(align=True)
+        row.operator(AMTH_SCENE_OT_list_texture_memory.bl_idname,
+                        icon="IMAGE_DATA",
+                        text="List Texture Memory")
+        if texture_materials:
+            row.operator(AMTH_SCENE_OT_list_texture_memory_clear.bl_idname,
+                            icon="X", text="")
+
+        row = box.row(align=True)
+        row.operator(AMTH_SCENE_OT_texture_proxies_make.bl_idname,
+                        icon="IMAGE_COL")
+        row.operator(AMTH_SCENE_OT_texture_proxies_revert.bl_idname,
+                        icon="LOOP_BACK")
+
+        viewport_proxies = sum(1 for im in bpy.data.images
+                               if im.get("amth_proxy_viewport"))
+        if viewport_proxies:
+            box.label(text="%s %s using viewport proxies, "
+                           "full resolution on final renders" % (
+                viewport_proxies,
+                'image' if viewport_proxies == 1 else 'images'),
+                icon="RESTRICT_RENDER_OFF")
+
+        if texture_materials:
+            col = box.column(align=True)
+            row = col.row(align=True)
+            row.alignment = 'LEFT'
+            row.prop(scene, 'amaranth_debug_scene_list_texture_memory',
+                        icon="%s" % 'TRIA_DOWN' if list_texture_memory else 'TRIA_RIGHT',
+                        emboss=False)
+            row.label(text="%s of images in this scene" %
+                bytes_to_human(AMTH_SCENE_OT_list_texture_memory.total),
+                icon="INFO")
+
+            if list_texture_memory:
+                for ma, size, images in texture_materials[:20]:
+                    row = col.row(align=True)
+                    split = row.split(percentage=0.7)
+                    split.label(text=ma, icon="MATERIAL")
+                    split.label(text=bytes_to_human(size))
+                    for name, size in images:
+                        row = col.row(align=True)
+                        split = row.split(percentage=0.7)
+                        split.label(text="    %s" % name, icon="IMAGE_DATA")
+                        split.label(text=bytes_to_human(size))
+
+# Keep Scene Debug caches in sync with the data they were built from
+@persistent
+def scene_debug_update(scene):
+    node_groups_graph_sync()
+    material_complexity_sync()
+    images_users_index_sync()
+
+@persistent
+def scene_debug_load_post(dummy):
+    node_groups_graph["trees"] = None
+    node_groups_graph["report"] = None
+    material_complexity["materials"] = None
+    material_complexity["report"] = None
+    for key in images_users_index:
+        images_users_index[key] = None
+    texture_proxies_rendering[:] = []
+    shader_lod_rendering[:] = []
+    shader_lod_colors.clear()
+    shader_lod_group_hashes.clear()
+    mesh_lod_rendering[:] = []
+    render_memory_estimates.clear()
+    render_memory_parts.clear()
+    evaluated_geometry.clear()
 
 # // FEATURE: Scene Debug
 # FEATURE: Dupli  Group Path
@@ -2373,6 +9049,375 @@ class AMTH_RENDER_OT_cycles_samples_percentage(Operator):
         return{'FINISHED'}
 
 # //FEATURE: Cycles Samples Percentage
+# FEATURE: Cycles Shader Features Audit
+# Branched path samples, in the order they are saved as final render samples,
+# and the feature a scene needs for each of them to be of any use
+cycles_samples_features = (
+    ("diffuse_samples", 'DIFFUSE'),
+    ("glossy_samples", 'GLOSSY'),
+    ("transmission_samples", 'TRANSMISSION'),
+    ("ao_samples", 'AO'),
+    ("mesh_light_samples", 'EMISSION'),
+    ("subsurface_samples", 'SUBSURFACE'),
+    ("volume_samples", 'VOLUME'),
+    )
+
+# Light path bounces that do nothing without any of the features
+cycles_bounces_features = (
+    ("transparent_max_bounces", {'TRANSPARENT'}, "Transparent BSDF"),
+    ("glossy_bounces", {'GLOSSY'}, "glossy shader"),
+    ("transmission_bounces", {'TRANSMISSION'}, "glass or refraction shader"),
+    ("volume_bounces", {'VOLUME'}, "volume"),
+    )
+
+def scene_objects_instanced(scene):
+    """Scene objects, then the objects instanced by groups or particles,
+    nested ones included"""
+    objects = list(scene.objects)
+    seen = set(objects)
+    for ob in objects:
+        instanced = []
+        if ob.dupli_type == 'GROUP' and ob.dupli_group:
+            instanced.extend(ob.dupli_group.objects)
+        for psys in ob.particle_systems:
+            settings = psys.settings
+            if settings.render_type == 'OBJECT' and settings.dupli_object:
+                instanced.append(settings.dupli_object)
+            elif settings.render_type == 'GROUP' and settings.dupli_group:
+                instanced.extend(settings.dupli_group.objects)
+        for child in instanced:
+            if child not in seen:
+                seen.add(child)
+                objects.append(child)
+    return objects
+
+def cycles_scene_features(scene):
+    """Cycles features the materials and world of a scene actually use,
+    instanced objects included"""
+    groups = {}
+    features = set()
+    materials = set()
+    meshlights = False
+
+    for ob in scene_objects_instanced(scene):
+        for slot in ob.material_slots:
+            ma = slot.material
+            if not ma or ma in materials:
+                continue
+            materials.add(ma)
+
+            if ma.use_nodes and ma.node_tree:
+                ma_features = node_tree_features(ma.node_tree, groups)
+            else:
+                ma_features = {'DIFFUSE', 'GLOSSY'}
+            features |= ma_features
+
+            if 'EMISSION' in ma_features and ma.cycles.sample_as_light and \
+               ob.type in {'MESH', 'CURVE', 'SURFACE', 'META', 'FONT'}:
+                meshlights = True
+
+    # Emission only needs mesh light samples when sampled as a light
+    features.discard('EMISSION')
+    if meshlights:
+        features.add('EMISSION')
+
+    world = scene.world
+    if world:
+        if world.use_nodes and world.node_tree:
+            features |= node_tree_features(world.node_tree, groups) & {'VOLUME', 'AO'}
+        if world.light_settings.use_ambient_occlusion:
+            features.add('AO')
+
+    return features
+
+class AMTH_RENDER_OT_cycles_shader_features_audit(Operator):
+    '''Find which shader features the scene uses, and the samples and bounces wasted on the rest'''
+    bl_idname = "scene.amaranth_cycles_shader_features_audit"
+    bl_label = "Audit Shader Features"
+
+    features = []
+    samples_unused = []
+    bounces_wasted = []
+
+    @classmethod
+    def poll(cls, context):
+        return cycles_exists and context.scene.render.engine == 'CYCLES'
+
+    def execute(self, context):
+        cscene = context.scene.cycles
+        features = cycles_scene_features(context.scene)
+
+        self.__class__.features = sorted(features)
+        self.__class__.samples_unused = [
+            attr for attr, feature in cycles_samples_features
+            if feature not in features and
+            getattr(cscene, attr) > cscene.bl_rna.properties[attr].hard_min]
+        self.__class__.bounces_wasted = [
+            "%s: %s with no %s" % (
+                cscene.bl_rna.properties[attr].name, getattr(cscene, attr), label)
+            for attr, needs, label in cycles_bounces_features
+            if hasattr(cscene, attr) and getattr(cscene, attr) > 0 and
+            not needs & features]
+
+        if 'GLOSSY' not in features and 'TRANSMISSION' not in features and \
+           not cscene.no_caustics:
+            self.__class__.bounces_wasted.append(
+                "Caustics enabled with no glossy or glass shaders")
+
+        print("\n* Shader features in use: %s\n" % (
+                ', '.join(self.__class__.features) or "None"))
+
+        for attr in self.__class__.samples_unused:
+            print("Unused: %s (%s)" % (
+                cscene.bl_rna.properties[attr].name, getattr(cscene, attr)))
+        for wasted in self.__class__.bounces_wasted:
+            print("Wasted: %s" % wasted)
+        print("\n")
+
+        if not self.__class__.samples_unused and not self.__class__.bounces_wasted:
+            self.report({'INFO'}, "No samples or bounces wasted on unused features")
+
+        return {'FINISHED'}
+
+class AMTH_RENDER_OT_cycles_samples_unused_zero(Operator):
+    '''Set samples of shader features the scene doesn't use to the minimum'''
+    bl_idname = "scene.amaranth_cycles_samples_unused_zero"
+    bl_label = "Zero Unused Samples"
+    bl_options = {'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        return cycles_exists and context.scene.render.engine == 'CYCLES'
+
+    def execute(self, context):
+        scene = context.scene
+        cscene = scene.cycles
+        features = cycles_scene_features(scene)
+        samples_final = scene.get('amth_cycles_samples_final')
+        changed = []
+
+        for i, (attr, feature) in enumerate(cycles_samples_features):
+            if feature in features:
+                continue
+
+            minimum = cscene.bl_rna.properties[attr].hard_min
+            if getattr(cscene, attr) > minimum:
+                setattr(cscene, attr, minimum)
+                changed.append(cscene.bl_rna.properties[attr].name)
+
+            # So percentages of the final samples don't bring them back
+            if samples_final:
+                samples_final = list(samples_final)
+                samples_final[i] = minimum
+
+        if samples_final:
+            scene['amth_cycles_samples_final'] = samples_final
+
+        AMTH_RENDER_OT_cycles_shader_features_audit.samples_unused[:] = []
+
+        if changed:
+            self.report({'INFO'}, "Lowered unused: %s" % ', '.join(changed))
+        else:
+            self.report({'INFO'}, "No unused samples to lower")
+
+        return {'FINISHED'}
+
+# // FEATURE: Cycles Shader Features Audit
+# FEATURE: Cycles Samples Calibration
+# Samples the crops are rendered at, twice each with different seeds
+cycles_calibration_samples = (8, 16, 32, 64)
+
+def render_crop_borders(scene, count, size):
+    """Up to 5 render borders of about size pixels, spread over the frame"""
+    rd = scene.render
+    width = max(1.0, rd.resolution_x * rd.resolution_percentage / 100.0)
+    height = max(1.0, rd.resolution_y * rd.resolution_percentage / 100.0)
+    size_x = min(1.0, size / width)
+    size_y = min(1.0, size / height)
+
+    borders = []
+    for x, y in ((0.5, 0.5), (0.25, 0.75), (0.75, 0.25),
+                 (0.25, 0.25), (0.75, 0.75))[:count]:
+        x = min(max(x - size_x / 2.0, 0.0), 1.0 - size_x)
+        y = min(max(y - size_y / 2.0, 0.0), 1.0 - size_y)
+        borders.append((x, y, x + size_x, y + size_y))
+    return borders
+
+def render_noise(a, b):
+    """Relative noise of two renders only differing by their seed"""
+    import numpy as np
+
+    a = a[..., :3]
+    b = b[..., :3]
+    # Half the variance of the difference is the variance of each render
+    deviation = np.sqrt(np.mean((a - b) ** 2) / 2.0)
+    return float(deviation / max(np.mean((a + b) / 2.0), 1e-4))
+
+def cycles_samples_attr(scene):
+    return "aa_samples" if scene.cycles.progressive == 'BRANCHED_PATH' \
+           else "samples"
+
+class AMTH_RENDER_OT_cycles_samples_calibrate(Operator):
+    '''Render small crops at increasing samples in the background, and find the samples each render layer needs to reach the target noise'''
+    bl_idname = "scene.amaranth_cycles_samples_calibrate"
+    bl_label = "Calibrate Samples"
+
+    crops = IntProperty(
+        name="Crops",
+        description="Regions of the frame to measure",
+        default=3, min=1, max=5)
+    size = IntProperty(
+        name="Crop Size",
+        description="Width and height of each region, in pixels",
+        default=64, min=16, max=512)
+
+    # [(render layer, recommended samples, noise with the current samples)]
+    results = []
+    running = False
+
+    _timer = None
+
+    @classmethod
+    def poll(cls, context):
+        return not cls.running and context.scene.render.engine == 'CYCLES'
+
+    def invoke(self, context, event):
+        import os
+        import tempfile
+
+        scene = context.scene
+        attr = cycles_samples_attr(scene)
+        layers = [rl.name for rl in scene.render.layers if rl.use]
+        workers = 2
+        settings = {
+            "render.threads_mode": 'FIXED',
+            "render.threads": max(1, (os.cpu_count() or 1) // workers),
+            "render.use_compositing": False,
+            "render.use_sequencer": False,
+            }
+        if getattr(scene.cycles, "use_square_samples", False):
+            settings["cycles.use_square_samples"] = False
+
+        self.tempdir = tempfile.mkdtemp(prefix="amaranth_")
+        self.jobs = {}
+        for layer in layers:
+            for crop, border in enumerate(
+                    render_crop_borders(scene, self.crops, self.size)):
+                for samples in cycles_calibration_samples:
+                    for seed in (0, 1):
+                        job_settings = dict(settings)
+                        job_settings["cycles." + attr] = samples
+                        job_settings["cycles.seed"] = seed
+                        job_settings['render.layers["%s"].samples' % layer] = 0
+                        self.jobs[layer, crop, samples, seed] = {
+                            "scene": scene.name,
+                            "frame": scene.frame_current,
+                            "border": border,
+                            "layer": layer,
+                            "settings": job_settings,
+                            "output": os.path.join(self.tempdir, "%d_%d_%d_%d.exr" % (
+                                layers.index(layer), crop, samples, seed))}
+
+        self.filepath = blend_file_copy()
+        self.thread = background_blender_thread(
+            render_jobs_script, list(self.jobs.values()), workers, self.filepath)
+
+        self.__class__.running = True
+        print("\n* Calibrating samples: %d crops rendered in the background\n" % len(self.jobs))
+
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(0.5, context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+        if self.thread.is_alive():
+            return {'RUNNING_MODAL'}
+
+        import math
+        import os
+        import shutil
+
+        context.window_manager.event_timer_remove(self._timer)
+        self.__class__.running = False
+
+        scene = context.scene
+        attr = cycles_samples_attr(scene)
+        target = scene.amaranth_cycles_noise_target
+        self.__class__.results = []
+
+        for layer in [rl for rl in scene.render.layers if rl.use]:
+            # Noise goes down with the square root of the samples, so
+            # noise * sqrt(samples) is about constant for each crop
+            constants = []
+            for crop in range(self.crops):
+                measures = []
+                for samples in cycles_calibration_samples:
+                    renders = [render_job_result(self.jobs[layer.name, crop, samples, seed])
+                               for seed in (0, 1)
+                               if (layer.name, crop, samples, seed) in self.jobs]
+                    if len(renders) == 2 and None not in renders:
+                        measures.append(render_noise(renders[0][0], renders[1][0]) *
+                                        math.sqrt(samples))
+                if measures:
+                    measures.sort()
+                    constants.append(measures[len(measures) // 2])
+
+            if not constants:
+                print("Could not measure the noise of %s" % layer.name)
+                continue
+
+            # The noisiest crop has to meet the target
+            constant = max(constants)
+            recommended = max(8, int(math.ceil((constant / target) ** 2 / 8.0)) * 8)
+            current = layer.samples or getattr(scene.cycles, attr)
+            self.__class__.results.append(
+                (layer.name, recommended, constant / math.sqrt(max(1, current))))
+
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+        shutil.rmtree(os.path.dirname(self.filepath), ignore_errors=True)
+
+        if not self.__class__.results:
+            self.report({'WARNING'}, "Calibration renders failed, see the console")
+            return {'CANCELLED'}
+
+        count = 0
+        for layer, recommended, noise in self.__class__.results:
+            count += 1
+            print('%02d. %s: %d samples for %.1f%% noise (%.1f%% now)' % (
+                count, layer, recommended, target * 100.0, noise * 100.0))
+        print("\n")
+
+        for area in context.screen.areas:
+            if area.type == 'PROPERTIES':
+                area.tag_redraw()
+
+        return {'FINISHED'}
+
+class AMTH_RENDER_OT_cycles_samples_calibrated_set(Operator):
+    '''Use the calibrated samples, on the scene or on each render layer'''
+    bl_idname = "scene.amaranth_cycles_samples_calibrated_set"
+    bl_label = "Use Calibrated Samples"
+
+    @classmethod
+    def poll(cls, context):
+        return AMTH_RENDER_OT_cycles_samples_calibrate.results
+
+    def execute(self, context):
+        scene = context.scene
+        results = AMTH_RENDER_OT_cycles_samples_calibrate.results
+
+        if len(results) == 1 and not scene.render.layers[results[0][0]].samples:
+            setattr(scene.cycles, cycles_samples_attr(scene), results[0][1])
+        else:
+            for layer, recommended, noise in results:
+                if layer in scene.render.layers:
+                    scene.render.layers[layer].samples = recommended
+
+        return {'FINISHED'}
+# // FEATURE: Cycles Samples Calibration
 # FEATURE: Jump forward/backward every N frames
 class AMTH_SCREEN_OT_frame_jump(Operator):
     '''Jump a number of frames forward/backwards'''
@@ -3020,6 +10065,44 @@ classes = (AMTH_SCENE_MT_color_management_presets,
            AMTH_SCENE_OT_list_missing_node_links,
            AMTH_SCENE_OT_list_missing_material_slots,
            AMTH_SCENE_OT_list_missing_material_slots_clear,
+           AMTH_SCENE_OT_list_orphan_data,
+           AMTH_SCENE_OT_list_orphan_data_clear,
+           AMTH_SCENE_OT_orphan_data_purge,
+           AMTH_SCENE_OT_list_duplicate_materials,
+           AMTH_SCENE_OT_list_duplicate_materials_clear,
+           AMTH_SCENE_OT_merge_duplicate_materials,
+           AMTH_SCENE_OT_list_duplicate_images,
+           AMTH_SCENE_OT_list_duplicate_images_clear,
+           AMTH_SCENE_OT_merge_duplicate_images,
+           AMTH_SCENE_OT_list_duplicate_object_data,
+           AMTH_SCENE_OT_list_duplicate_object_data_clear,
+           AMTH_SCENE_OT_link_duplicate_object_data,
+           AMTH_SCENE_OT_node_groups_graph,
+           AMTH_SCENE_OT_node_groups_graph_clear,
+           AMTH_SCENE_OT_material_complexity,
+           AMTH_SCENE_OT_material_complexity_clear,
+           AMTH_SCENE_OT_image_select_users,
+           AMTH_SCENE_OT_list_mesh_health,
+           AMTH_SCENE_OT_list_mesh_health_clear,
+           AMTH_MESH_OT_health_select,
+           AMTH_SCENE_OT_list_evaluated_geometry,
+           AMTH_SCENE_OT_list_evaluated_geometry_clear,
+           AMTH_SCENE_OT_evaluated_geometry_confirm,
+           AMTH_SCENE_OT_list_texture_memory,
+           AMTH_SCENE_OT_list_texture_memory_clear,
+           AMTH_SCENE_OT_texture_proxies_make,
+           AMTH_SCENE_OT_texture_proxies_revert,
+           AMTH_OBJECT_OT_mesh_lod_make,
+           AMTH_OBJECT_OT_mesh_lod_set,
+           AMTH_OBJECT_OT_mesh_lod_remove,
+           AMTH_OBJECT_PT_mesh_lod,
+           AMTH_RENDER_OT_frustum_cull_analyse,
+           AMTH_RENDER_OT_profile_add,
+           AMTH_RENDER_OT_profile_remove,
+           AMTH_RENDER_OT_profile_activate,
+           AMTH_RENDER_OT_profile_override_add,
+           AMTH_RENDER_OT_profile_override_remove,
+           AMTH_RENDER_PT_profiles,
            AMTH_SCENE_OT_blender_instance_open,
            AMTH_SCENE_OT_layers_render_save,
            AMTH_SCENE_OT_layers_render_view,
@@ -3049,12 +10132,61 @@ classes = (AMTH_SCENE_MT_color_management_presets,
            AMTH_POSE_OT_paths_frame_match,
            AMTH_RENDER_OT_cycles_samples_percentage,
            AMTH_RENDER_OT_cycles_samples_percentage_set,
+           AMTH_RENDER_OT_cycles_shader_features_audit,
+           AMTH_RENDER_OT_cycles_samples_unused_zero,
+           AMTH_RENDER_OT_cycles_samples_calibrate,
+           AMTH_RENDER_OT_cycles_samples_calibrated_set,
+           AMTH_RENDER_OT_render_time_estimate,
+           AMTH_RENDER_PT_render_log,
+           AMTH_RENDER_OT_render_parallel,
+           AMTH_RENDER_OT_render_parallel_stop,
+           AMTH_RENDER_OT_render_tiles,
+           AMTH_RENDER_OT_render_tiles_stop,
+           AMTH_RENDER_OT_queue_submit,
+           AMTH_RENDER_OT_queue_start,
+           AMTH_RENDER_OT_queue_stop,
+           AMTH_RENDER_OT_queue_remove,
+           AMTH_RENDER_OT_queue_retry,
+           AMTH_RENDER_OT_render_changed_frames,
+           AMTH_RENDER_OT_render_patches,
            AMTH_FILE_PT_libraries,
            AMTH_SCREEN_OT_frame_jump,
            AMTH_SCREEN_OT_keyframe_jump_inbetween)
 
 addon_keymaps = []
 
+# Features swapping settings for final renders only: (render_pre, restore).
+# render_pre runs on every frame of an animation, so each one swaps once and
+# keeps track of it. Restore runs when the render completes or is cancelled,
+# or after each frame on Blender versions without those handlers
+render_swap_handlers = (
+    (texture_proxies_render_pre, texture_proxies_render_post),
+    (shader_lod_render_pre, shader_lod_render_post),
+    (mesh_lod_render_pre, mesh_lod_render_post),
+    (frustum_culling_render_pre, frustum_culling_render_post),
+    (render_profile_render_pre, render_profile_render_post),
+    )
+
+def render_swap_handlers_register():
+    handlers = bpy.app.handlers
+    for pre, restore in render_swap_handlers:
+        handlers.render_pre.append(pre)
+        if hasattr(handlers, "render_complete"):
+            handlers.render_complete.append(restore)
+            handlers.render_cancel.append(restore)
+        else:
+            handlers.render_post.append(restore)
+
+def render_swap_handlers_unregister():
+    handlers = bpy.app.handlers
+    for pre, restore in render_swap_handlers:
+        handlers.render_pre.remove(pre)
+        if hasattr(handlers, "render_complete"):
+            handlers.render_complete.remove(restore)
+            handlers.render_cancel.remove(restore)
+        else:
+            handlers.render_post.remove(restore)
+
 def register():
 
     bpy.utils.register_class(AmaranthToolsetPreferences)
@@ -3085,14 +10217,23 @@ def register():
     if check_cycles_exists():
         bpy.types.CyclesRender_PT_sampling.append(render_cycles_scene_samples)
         bpy.types.CyclesScene_PT_simplify.append(unsimplify_ui)
+        bpy.types.CyclesScene_PT_simplify.append(shader_lod_ui)
+        bpy.types.CyclesScene_PT_simplify.append(frustum_culling_ui)
 
     bpy.types.FILEBROWSER_HT_header.append(button_directory_current_blend)
 
     bpy.types.SCENE_PT_simplify.append(unsimplify_ui)
+    bpy.types.SCENE_PT_simplify.append(frustum_culling_ui)
+    bpy.types.OBJECT_PT_relations.append(frustum_culling_object_ui)
 
     bpy.types.DATA_PT_display.append(pose_motion_paths_ui)
 
     bpy.types.RENDER_PT_dimensions.append(render_final_resolution_ui)
+    bpy.types.RENDER_PT_render.append(render_parallel_ui)
+    bpy.types.RENDER_PT_render.append(render_tiles_ui)
+    bpy.types.RENDER_PT_render.append(render_changed_frames_ui)
+    bpy.types.RENDER_PT_render.append(render_patches_ui)
+    bpy.types.RENDER_PT_render.append(render_queue_ui)
     bpy.types.RENDER_PT_output.append(ui_render_output_z)
 
     bpy.types.SCENE_PT_color_management.prepend(ui_color_management_presets)
@@ -3115,6 +10256,24 @@ def register():
 
     bpy.app.handlers.render_pre.append(unsimplify_render_pre)
     bpy.app.handlers.render_post.append(unsimplify_render_post)
+    render_swap_handlers_register()
+    bpy.app.handlers.scene_update_post.append(shader_lod_scene_update)
+    bpy.app.handlers.load_post.append(render_profile_load_post)
+    bpy.app.handlers.scene_update_post.append(render_estimate_scene_update)
+    bpy.app.handlers.scene_update_post.append(render_memory_scene_update)
+    bpy.app.handlers.render_pre.append(render_log_render_pre)
+    bpy.app.handlers.render_post.append(render_log_render_post)
+    if hasattr(bpy.app.handlers, "render_cancel"):
+        bpy.app.handlers.render_cancel.append(render_log_render_cancel)
+    if hasattr(bpy.app.handlers, "render_stats"):
+        bpy.app.handlers.render_stats.append(render_log_render_stats)
+    bpy.app.handlers.render_post.append(render_skip_render_post)
+    if hasattr(bpy.app.handlers, "render_complete"):
+        bpy.app.handlers.render_complete.append(render_skip_render_complete)
+        bpy.app.handlers.render_cancel.append(render_skip_render_complete)
+
+    bpy.app.handlers.scene_update_post.append(scene_debug_update)
+    bpy.app.handlers.load_post.append(scene_debug_load_post)
 
     wm = bpy.context.window_manager
     kc = wm.keyconfigs.addon
@@ -3191,14 +10350,23 @@ def unregister():
     if check_cycles_exists():
         bpy.types.CyclesRender_PT_sampling.remove(render_cycles_scene_samples)
         bpy.types.CyclesScene_PT_simplify.remove(unsimplify_ui)
+        bpy.types.CyclesScene_PT_simplify.remove(shader_lod_ui)
+        bpy.types.CyclesScene_PT_simplify.remove(frustum_culling_ui)
 
     bpy.types.FILEBROWSER_HT_header.remove(button_directory_current_blend)
 
     bpy.types.SCENE_PT_simplify.remove(unsimplify_ui)
+    bpy.types.SCENE_PT_simplify.remove(frustum_culling_ui)
+    bpy.types.OBJECT_PT_relations.remove(frustum_culling_object_ui)
 
     bpy.types.DATA_PT_display.remove(pose_motion_paths_ui)
 
     bpy.types.RENDER_PT_dimensions.remove(render_final_resolution_ui)
+    bpy.types.RENDER_PT_render.remove(render_parallel_ui)
+    bpy.types.RENDER_PT_render.remove(render_tiles_ui)
+    bpy.types.RENDER_PT_render.remove(render_changed_frames_ui)
+    bpy.types.RENDER_PT_render.remove(render_patches_ui)
+    bpy.types.RENDER_PT_render.remove(render_queue_ui)
     bpy.types.RENDER_PT_output.remove(ui_render_output_z)
 
     bpy.types.SCENE_PT_color_management.remove(ui_color_management_presets)
@@ -3221,6 +10389,24 @@ def unregister():
 
     bpy.app.handlers.render_pre.remove(unsimplify_render_pre)
     bpy.app.handlers.render_post.remove(unsimplify_render_post)
+    render_swap_handlers_unregister()
+    bpy.app.handlers.scene_update_post.remove(shader_lod_scene_update)
+    bpy.app.handlers.load_post.remove(render_profile_load_post)
+    bpy.app.handlers.scene_update_post.remove(render_estimate_scene_update)
+    bpy.app.handlers.scene_update_post.remove(render_memory_scene_update)
+    bpy.app.handlers.render_pre.remove(render_log_render_pre)
+    bpy.app.handlers.render_post.remove(render_log_render_post)
+    if hasattr(bpy.app.handlers, "render_cancel"):
+        bpy.app.handlers.render_cancel.remove(render_log_render_cancel)
+    if hasattr(bpy.app.handlers, "render_stats"):
+        bpy.app.handlers.render_stats.remove(render_log_render_stats)
+    bpy.app.handlers.render_post.remove(render_skip_render_post)
+    if hasattr(bpy.app.handlers, "render_complete"):
+        bpy.app.handlers.render_complete.remove(render_skip_render_complete)
+        bpy.app.handlers.render_cancel.remove(render_skip_render_complete)
+
+    bpy.app.handlers.scene_update_post.remove(scene_debug_update)
+    bpy.app.handlers.load_post.remove(scene_debug_load_post)
 
     for km, kmi in addon_keymaps:
         km.keymap_items.remove(kmi)